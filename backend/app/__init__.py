@@ -2,8 +2,18 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from .config import Config
+from .tools.expression_pool import ExpressionPool
+from .tools.answer_log import AnswerLog
+from .tools.stats_cache import StatsCache
+from .tools.export_jobs import ExportJobs
+from .tools.export_cache import ExportCache
 
 db = SQLAlchemy()
+expression_pool = ExpressionPool()
+answer_log = AnswerLog()
+stats_cache = StatsCache()
+export_jobs = ExportJobs()
+export_cache = ExportCache()
 
 def create_app():
     app = Flask(__name__)
@@ -13,8 +23,13 @@ def create_app():
     CORS(app, supports_credentials=True)
     
     db.init_app(app)
+    expression_pool.init_app(app)
+    stats_cache.init_app(app)
+    export_jobs.init_app(app)
+    export_cache.init_app(app)
     
-    from .routes import main
+    from .routes import main, apply_answer_log_segment
     app.register_blueprint(main)
+    answer_log.init_app(app, apply_answer_log_segment)
     
     return app 
\ No newline at end of file
@@ -1,5 +1,6 @@
 from . import db
 from datetime import datetime
+from sqlalchemy.dialects.mysql import LONGTEXT
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(db.Model):
@@ -26,6 +27,9 @@ class User(db.Model):
         return check_password_hash(self._password, password)
     
     __table_args__ = (
+        # 注册和修改信息时按身份证号、手机号查重；手机号为空时存 NULL，不参与唯一约束
+        db.Index('uq_user_id_card', 'id_card', unique=True),
+        db.Index('uq_user_phone', 'phone', unique=True),
         {'comment': '用户信息表'}
     )
 
@@ -42,6 +46,7 @@ class ExerciseSet(db.Model):
     operator_count = db.Column(db.Integer, nullable=False, comment='运算符数量')
     min_number = db.Column(db.Integer, nullable=False, comment='最小值')
     max_number = db.Column(db.Integer, nullable=False, comment='最大值')
+    content_hash = db.Column(db.String(64), nullable=True, comment='题目内容哈希(指定种子时)')
     
     expressions = db.relationship('Expression', backref='exercise_set', lazy=True)
     practice_records = db.relationship('PracticeRecord', backref='exercise_set', lazy=True)
@@ -50,6 +55,8 @@ class ExerciseSet(db.Model):
         db.CheckConstraint('total_expressions > 0', name='check_total_expressions'),
         db.CheckConstraint('bracket_expressions >= 0', name='check_bracket_expressions'),
         db.CheckConstraint('time_limit > 0', name='check_time_limit'),
+        # 指定种子时按 (用户, 内容哈希) 查找可复用的练习集
+        db.Index('idx_exercise_set_user_hash', 'user_id', 'content_hash'),
         {'comment': '习题集信息表'}
     )
 
@@ -61,6 +68,7 @@ class PracticeRecord(db.Model):
     user_id = db.Column(db.String(50), db.ForeignKey('user.user_id'), nullable=False)
     exercise_set_id = db.Column(db.Integer, db.ForeignKey('exercise_set.exercise_set_id'), nullable=False)
     completion_time = db.Column(db.DateTime, nullable=False)
+    local_date = db.Column(db.Date, nullable=True, comment='完成日期(中国时区)')
     duration = db.Column(db.Integer)  # 练习时长（秒）
     is_timeout = db.Column(db.Boolean, default=False)  # 是否超时
     is_completed = db.Column(db.Boolean, default=False)  # 是否完成所有题目
@@ -74,6 +82,11 @@ class PracticeRecord(db.Model):
     max_number = db.Column(db.Integer, nullable=False, comment='最大值')
 
     __table_args__ = (
+        # 练习记录按 (完成时间, 记录ID) 游标分页
+        db.Index('idx_practice_record_user_time', 'user_id', 'completion_time', 'record_id'),
+        db.Index('idx_practice_record_set', 'exercise_set_id'),
+        # 按日期区间统计练习次数
+        db.Index('idx_practice_record_user_date', 'user_id', 'local_date'),
         {'comment': '练习记录表'}
     )
 
@@ -86,11 +99,16 @@ class Expression(db.Model):
     has_brackets = db.Column(db.Boolean, nullable=False, default=False, comment='是否含括号')
     operator_count = db.Column(db.Integer, nullable=False, default=1, comment='运算符数量')
     answer = db.Column(db.Float, nullable=False, comment='正确答案')
+    # 以下特征列在写入时由 arithmetic.expression_features 解析得到
+    difficulty = db.Column(db.String(10), nullable=True, index=True, comment='难度: simple/medium/hard')
+    operator_mask = db.Column(db.Integer, nullable=True, index=True, comment='运算符位掩码: +1 -2 ×4 ÷8')
+    digit_count = db.Column(db.Integer, nullable=True, comment='操作数最大位数')
     
     answer_records = db.relationship('AnswerRecord', backref='expression', lazy=True)
     
     __table_args__ = (
         db.CheckConstraint('operator_count > 0 AND operator_count < 10', name='check_operator_count'),
+        db.Index('idx_expression_set', 'exercise_set_id'),
         {'comment': '算式信息表'}
     )
 
@@ -102,10 +120,13 @@ class AnswerRecord(db.Model):
     user_answer = db.Column(db.Float, nullable=False, comment='用户答案')
     is_correct = db.Column(db.Boolean, nullable=False, comment='是否正确')
     answer_time = db.Column(db.Float, nullable=False, comment='答题时间(秒)')
+    local_date = db.Column(db.Date, nullable=True, comment='答题日期(中国时区)')
     
     error_record = db.relationship('ErrorRecord', backref='answer_record', lazy=True)
     
     __table_args__ = (
+        db.Index('idx_answer_record_expression', 'expression_id'),
+        db.Index('idx_answer_record_date', 'local_date'),
         {'comment': '答题记录表'}
     )
 
@@ -118,5 +139,100 @@ class ErrorRecord(db.Model):
     export_time = db.Column(db.DateTime, nullable=True, comment='导出时间')
     
     __table_args__ = (
+        db.Index('idx_error_record_answer', 'answer_record_id'),
+        db.Index('idx_error_record_exported', 'is_exported', 'error_record_id'),
         {'comment': '错题记录表'}
-    ) 
\ No newline at end of file
+    )
+
+class GeneratedExpressionSet(db.Model):
+    """题目缓存表：按 (配置, 种子) 的内容哈希保存生成结果，相同请求不再重新生成"""
+    __tablename__ = 'generated_expression_set'
+    content_hash = db.Column(db.String(64), primary_key=True, comment='配置与种子的内容哈希')
+    config = db.Column(db.String(200), nullable=False, comment='规范化配置(JSON)')
+    seed = db.Column(db.BigInteger, nullable=False, comment='随机种子')
+    expressions = db.Column(db.Text().with_variant(LONGTEXT, 'mysql'), nullable=False, comment='题目列表(JSON)')
+    create_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, comment='创建时间')
+    
+    __table_args__ = (
+        {'comment': '题目缓存表'}
+    )
+
+class AnswerLogSegment(db.Model):
+    """答题日志分段表：记录已写入数据库的日志分段，崩溃后重放时据此跳过"""
+    __tablename__ = 'answer_log_segment'
+    segment_id = db.Column(db.String(32), primary_key=True, comment='日志分段ID')
+    record_count = db.Column(db.Integer, nullable=False, comment='分段中的答题记录数')
+    applied_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, comment='写入时间')
+    
+    __table_args__ = (
+        {'comment': '答题日志分段表'}
+    )
+
+class UserAnswerRollup(db.Model):
+    """答题统计汇总表：按 (用户, 本地日期, 运算符组合, 难度) 汇总答题情况，随答题写入同步更新"""
+    __tablename__ = 'user_answer_rollup'
+    user_id = db.Column(db.String(15), db.ForeignKey('user.user_id'), primary_key=True, comment='用户ID')
+    local_date = db.Column(db.Date, primary_key=True, comment='答题日期(中国时区)')
+    operators = db.Column(db.String(4), primary_key=True, comment='题目包含的运算符组合，如 +×')
+    difficulty = db.Column(db.String(10), primary_key=True, comment='难度: simple/medium/hard')
+    correct_count = db.Column(db.Integer, nullable=False, default=0, comment='答对题数')
+    total_count = db.Column(db.Integer, nullable=False, default=0, comment='答题总数')
+    total_answer_time = db.Column(db.Float, nullable=False, default=0, comment='答题总用时(秒)')
+    time_0_3 = db.Column(db.Integer, nullable=False, default=0, comment='用时0-3秒题数')
+    time_3_5 = db.Column(db.Integer, nullable=False, default=0, comment='用时3-5秒题数')
+    time_5_10 = db.Column(db.Integer, nullable=False, default=0, comment='用时5-10秒题数')
+    time_10_15 = db.Column(db.Integer, nullable=False, default=0, comment='用时10-15秒题数')
+    time_over_15 = db.Column(db.Integer, nullable=False, default=0, comment='用时15秒以上题数')
+    
+    __table_args__ = (
+        {'comment': '答题统计汇总表'}
+    )
+
+class UserPracticeRollup(db.Model):
+    """练习统计汇总表：按 (用户, 本地日期) 汇总完成的练习次数和时长"""
+    __tablename__ = 'user_practice_rollup'
+    user_id = db.Column(db.String(15), db.ForeignKey('user.user_id'), primary_key=True, comment='用户ID')
+    local_date = db.Column(db.Date, primary_key=True, comment='完成日期(中国时区)')
+    practice_count = db.Column(db.Integer, nullable=False, default=0, comment='完成练习次数')
+    total_duration = db.Column(db.Integer, nullable=False, default=0, comment='练习总时长(秒)')
+    
+    __table_args__ = (
+        {'comment': '练习统计汇总表'}
+    )
+
+class UserMistake(db.Model):
+    """用户错题表：批改时写入的错题冗余副本，按用户直接查询，无需经由练习记录联接"""
+    __tablename__ = 'user_mistake'
+    error_record_id = db.Column(db.Integer, db.ForeignKey('error_record.error_record_id'), primary_key=True, comment='错题记录ID')
+    user_id = db.Column(db.String(15), db.ForeignKey('user.user_id'), nullable=False, comment='用户ID')
+    expression_id = db.Column(db.Integer, db.ForeignKey('expression.expression_id'), nullable=False, comment='算式ID')
+    expression_text = db.Column(db.String(100), nullable=False, comment='算式表达式')
+    correct_answer = db.Column(db.Float, nullable=False, comment='正确答案')
+    user_answer = db.Column(db.Float, nullable=False, comment='用户答案')
+    answer_time = db.Column(db.Float, nullable=False, comment='答题时间(秒)')
+    difficulty = db.Column(db.String(10), nullable=False, comment='难度: simple/medium/hard')
+    operator_count = db.Column(db.Integer, nullable=False, comment='运算符数量')
+    is_exported = db.Column(db.Boolean, nullable=False, default=False, comment='是否已导出')
+    export_time = db.Column(db.DateTime, nullable=True, comment='导出时间')
+    created_at = db.Column(db.DateTime, nullable=False, comment='答错时间(中国时区)')
+    
+    __table_args__ = (
+        db.Index('idx_user_mistake_user_exported_time', 'user_id', 'is_exported', 'created_at'),
+        {'comment': '用户错题表'}
+    )
+
+class UserMistakeFrequency(db.Model):
+    """错题频次表：按 (用户, 规范化算式) 累计答错次数，每次答错时增量更新"""
+    __tablename__ = 'user_mistake_frequency'
+    user_id = db.Column(db.String(15), db.ForeignKey('user.user_id'), primary_key=True, comment='用户ID')
+    expression_key = db.Column(db.String(100), primary_key=True, comment='规范化算式')
+    expression_text = db.Column(db.String(100), nullable=False, comment='最近一次答错的算式原文')
+    correct_answer = db.Column(db.Float, nullable=False, comment='正确答案')
+    error_count = db.Column(db.Integer, nullable=False, default=0, comment='答错次数')
+    last_user_answer = db.Column(db.Float, nullable=False, comment='最近一次的错误答案')
+    last_wrong_time = db.Column(db.DateTime, nullable=False, comment='最近一次答错时间(中国时区)')
+    
+    __table_args__ = (
+        db.Index('idx_mistake_frequency_user_count', 'user_id', 'error_count', 'last_wrong_time'),
+        {'comment': '错题频次表'}
+    )
@@ -1,31 +1,55 @@
-from flask import Blueprint, jsonify, request, current_app, send_file
+from flask import Blueprint, jsonify, request, current_app, send_file, url_for
 from .models import (
     User, 
     ExerciseSet, 
     Expression, 
     AnswerRecord, 
     ErrorRecord,
-    PracticeRecord
+    PracticeRecord,
+    GeneratedExpressionSet,
+    AnswerLogSegment,
+    UserAnswerRollup,
+    UserPracticeRollup,
+    UserMistake,
+    UserMistakeFrequency
 )
-from . import db
+from . import db, expression_pool, answer_log, stats_cache, export_jobs, export_cache
 from datetime import datetime, timedelta
 from sqlalchemy.exc import IntegrityError
 import logging
 from random import randint, choice
 import random
 from .tools.generateExpression import get_expression
-from .tools.expression_generator import ExpressionGenerator
+from .tools.expression_generator import ExpressionGenerator, normalize_config, content_hash
+from .tools.arithmetic import evaluate, expression_features, to_number
+from .tools import vectorized
+from .tools.csv_export import CSV_MIMETYPE, LAYOUT_VERSION as CSV_LAYOUT_VERSION, attachment_response, stream_csv
+from .tools.docx_writer import DOCX_MIMETYPE, LAYOUT_VERSION as DOCX_LAYOUT_VERSION, mistakes_docx, worksheet_docx
+from .tools.xlsx_export import XLSX_MIMETYPE, LAYOUT_VERSION as XLSX_LAYOUT_VERSION, Sheet, stream_xlsx
+from .tools.export_jobs import JobQueueFull
+from .tools.export_cache import export_key
+from .tools.mistakes import (
+    error_records_insert,
+    forget_mistake,
+    insert_user_mistakes,
+    mistake_counts,
+    record_wrong_answers
+)
+from .tools.stats_rollup import (
+    OPERATOR_ORDER,
+    TIME_COLUMNS,
+    local_date_of,
+    today,
+    update_answer_rollups,
+    update_practice_rollup
+)
 # from .tools.generateExpressionController import generateExpressionController
-from sqlalchemy import desc
+from sqlalchemy import and_, case, desc, func, insert, or_, select, text
 from .config import Config  # 导入配置
-from io import BytesIO
-from docx import Document
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
+import base64
+import binascii
 import csv
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
+import json
 from io import StringIO
 
 main = Blueprint('main', __name__)
@@ -85,7 +109,7 @@ def create_user():
             name=data['name'],
             id_card=data['id_card'],
             grade=data['grade'],
-            phone=data.get('phone')
+            phone=data.get('phone') or None
         )
         new_user.password = data['password']
         
@@ -138,7 +162,7 @@ def update_user(user_id):
                 ).first()
                 if existing_phone:
                     return jsonify({"error": "该手机号已被其他用户使用"}), 400
-            user.phone = data['phone']
+            user.phone = data['phone'] or None
             
         # 更新密码
         if 'password' in data:
@@ -151,6 +175,57 @@ def update_user(user_id):
         return jsonify({"error": str(e)}), 400
 
 # 习题集相关接口
+SEED_MAX = 2 ** 63 - 1  # 种子保存在 BIGINT 列中
+
+def _parse_seed(value):
+    """解析请求中的随机种子，返回 (种子, 错误信息)；未指定时种子为 None
+
+    接受整数或十进制整数字符串，范围为 BIGINT 的非负部分。
+    """
+    if value is None:
+        return None, None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None, "seed must be an integer"
+    try:
+        seed = int(value)
+    except ValueError:
+        return None, "seed must be an integer"
+    if not 0 <= seed <= SEED_MAX:
+        return None, f"seed must be between 0 and {SEED_MAX}"
+    return seed, None
+
+def _seeded_expressions(generator, count, bracket_count, seed):
+    """按 (配置, 种子) 的内容哈希取题：首次请求生成并保存，之后直接读取缓存结果
+
+    指定种子时始终走分片生成路径（分片数只由题目数量决定），保证同一哈希对应的题目固定。
+    返回 (内容哈希, 题目列表)。
+    """
+    config_key = normalize_config(generator.selected_operators, generator.max_operators,
+                                  generator.min_number, generator.max_number)
+    digest = content_hash(config_key, count, bracket_count, seed)
+    cached = db.session.get(GeneratedExpressionSet, digest)
+    if cached:
+        return digest, json.loads(cached.expressions)
+    
+    expressions = generator.generate_expressions_parallel(
+        count=count,
+        bracket_count=bracket_count,
+        workers=current_app.config['GENERATION_WORKERS'],
+        seed=seed
+    )
+    try:
+        # 单独提交缓存，不受调用方后续事务回滚影响；并发请求同时写入时以先写入的为准
+        db.session.add(GeneratedExpressionSet(
+            content_hash=digest,
+            config=json.dumps([list(config_key[0]), *config_key[1:], count, bracket_count]),
+            seed=seed,
+            expressions=json.dumps(expressions, ensure_ascii=False)
+        ))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+    return digest, expressions
+
 @main.route('/api/exercise-set', methods=['POST'])
 def create_exercise_set():
     """创建练习集"""
@@ -173,7 +248,66 @@ def create_exercise_set():
                 min_number=1,
                 max_number=100
             )
+            # 直接使用已有的题目
+            expressions = mistakes[:20]  # 限制题目数量
         else:
+            # 先按容量检查配置是否可行，不可行时无需进入生成和数据库写入
+            generator = ExpressionGenerator(
+                selected_operators=data['operators'],
+                operator_count=data['operator_count'],
+                min_number=data['min_number'],
+                max_number=data['max_number'],
+                strategy='auto'
+            )
+            capacity_error = generator.capacity_error(data['total_expressions'], data.get('bracket_expressions', 0))
+            if capacity_error:
+                return jsonify({"error": capacity_error}), 400
+            
+            # 指定种子时同一用户、同一内容且尚未作答的练习集直接复用
+            digest = None
+            seed, seed_error = _parse_seed(data.get('seed'))
+            if seed_error:
+                return jsonify({"error": seed_error}), 400
+            if seed is not None:
+                digest = content_hash(
+                    normalize_config(data['operators'], data['operator_count'],
+                                     data['min_number'], data['max_number']),
+                    data['total_expressions'], data.get('bracket_expressions', 0), seed)
+                existing = ExerciseSet.query.filter(
+                    ExerciseSet.user_id == data['user_id'],
+                    ExerciseSet.content_hash == digest,
+                    ~ExerciseSet.practice_records.any()
+                ).first()
+                if existing:
+                    return jsonify({
+                        "message": "练习集创建成功",
+                        "exercise_set_id": existing.exercise_set_id,
+                        "content_hash": digest
+                    })
+            
+            # 取题在开启事务之前完成：指定种子时读缓存，大批量时并行生成，否则从题目池取题
+            if seed is not None:
+                digest, expressions = _seeded_expressions(
+                    generator, data['total_expressions'], data.get('bracket_expressions', 0), seed)
+            elif data['total_expressions'] >= current_app.config['PARALLEL_MIN_COUNT']:
+                expressions = generator.generate_expressions_parallel(
+                    count=data['total_expressions'],
+                    bracket_count=data.get('bracket_expressions', 0),
+                    workers=current_app.config['GENERATION_WORKERS']
+                )
+            elif expression_pool.enabled:
+                expressions = expression_pool.draw(
+                    normalize_config(data['operators'], data['operator_count'],
+                                     data['min_number'], data['max_number']),
+                    count=data['total_expressions'],
+                    bracket_count=data.get('bracket_expressions', 0)
+                )
+            else:
+                expressions = generator.generate_expressions(
+                    count=data['total_expressions'],
+                    bracket_count=data.get('bracket_expressions', 0)
+                )
+            
             # 正常创建练习集
             exercise_set = ExerciseSet(
                 user_id=data['user_id'],
@@ -183,51 +317,27 @@ def create_exercise_set():
                 operators=','.join(data['operators']),
                 operator_count=data['operator_count'],
                 min_number=data['min_number'],
-                max_number=data['max_number']
+                max_number=data['max_number'],
+                content_hash=digest
             )
             
         db.session.add(exercise_set)
         db.session.flush()
         
-        # 如果是从错题集生成练习，直接使用已有的题目
-        if data.get('from_mistakes'):
-            for mistake in mistakes[:20]:  # 限制题目数量
-                expression = Expression(
-                    exercise_set_id=exercise_set.exercise_set_id,
-                    expression_text=mistake['expression_text'],
-                    answer=mistake['answer'],
-                    has_brackets='(' in mistake['expression_text'],
-                    operator_count=sum(1 for c in mistake['expression_text'] if c in '+-×÷')
-                )
-                db.session.add(expression)
-        else:
-            # 生成新的题目
-            generator = ExpressionGenerator(
-                selected_operators=data['operators'],
-                operator_count=data['operator_count'],
-                min_number=data['min_number'],
-                max_number=data['max_number']
-            )
-            expressions = generator.generate_expressions(
-                count=data['total_expressions'],
-                bracket_count=data.get('bracket_expressions', 0)
-            )
-            
-            for expr in expressions:
-                expression = Expression(
-                    exercise_set_id=exercise_set.exercise_set_id,
-                    expression_text=expr['expression_text'],
-                    answer=expr['answer'],
-                    has_brackets='(' in expr['expression_text'],
-                    operator_count=sum(1 for c in expr['expression_text'] if c in '+-×÷')
-                )
-                db.session.add(expression)
+        # 批量写入题目
+        db.session.bulk_insert_mappings(Expression, [dict(
+            expression_features(expr['expression_text']),
+            exercise_set_id=exercise_set.exercise_set_id,
+            expression_text=expr['expression_text'],
+            answer=expr['answer']
+        ) for expr in expressions])
         
         db.session.commit()
         
         return jsonify({
             "message": "练习集创建成功",
-            "exercise_set_id": exercise_set.exercise_set_id
+            "exercise_set_id": exercise_set.exercise_set_id,
+            "content_hash": exercise_set.content_hash
         })
         
     except Exception as e:
@@ -235,6 +345,45 @@ def create_exercise_set():
         current_app.logger.error(f"Error creating exercise set: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@main.route('/api/exercise-set/capacity')
+def get_exercise_set_capacity():
+    """统计练习配置能生成的不同题目数量"""
+    try:
+        operators = [op for op in request.args.get('operators', '').split(',') if op]
+        operator_count = request.args.get('operator_count', type=int)
+        min_number = request.args.get('min_number', type=int)
+        max_number = request.args.get('max_number', type=int)
+        total_expressions = request.args.get('total_expressions', type=int)
+        bracket_expressions = request.args.get('bracket_expressions', 0, type=int)
+        
+        if not operators or None in (operator_count, min_number, max_number):
+            return jsonify({"error": "缺少必要参数: operators, operator_count, min_number, max_number"}), 400
+        
+        generator = ExpressionGenerator(
+            selected_operators=operators,
+            operator_count=operator_count,
+            min_number=min_number,
+            max_number=max_number
+        )
+        capacity = generator.capacity()
+        result = {
+            "capacity": capacity['total'],
+            "plain_capacity": capacity['plain'],
+            "bracket_capacity": capacity['bracket']
+        }
+        if total_expressions is not None:
+            capacity_error = generator.capacity_error(total_expressions, bracket_expressions)
+            result["feasible"] = not capacity_error
+            if capacity_error:
+                result["error"] = capacity_error
+        return jsonify(result)
+        
+    except KeyError as e:
+        return jsonify({"error": f"不支持的运算符: {e}"}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error estimating capacity: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @main.route('/api/exercise-set/<int:exercise_set_id>')
 def get_exercise_set(exercise_set_id):
     """获取习题集信息"""
@@ -297,11 +446,14 @@ def create_practice_record():
             operator_count=data['operator_count'],
             min_number=data['min_number'],
             max_number=data['max_number'],
-            completion_time=now  # 使用中国时区的时间
+            completion_time=now,  # 使用中国时区的时间
+            local_date=now.date()
         )
         
         db.session.add(practice_record)
+        update_practice_rollup(practice_record.user_id, practice_record.local_date, practice_record.duration)
         db.session.commit()
+        stats_cache.bump(practice_record.user_id)
         
         return jsonify({"message": "练习记录创建成功"}), 201
         
@@ -313,6 +465,12 @@ def create_practice_record():
 # 获取错题记录
 @main.route('/api/error-records/<user_id>')
 def get_error_records(user_id):
+    """获取错题记录
+
+    直接读取用户错题表（按 user_id, is_exported, created_at 索引）。
+    默认按 page/per_page 分页；传入 cursor 参数（首页传空字符串）时按 (答错时间, 错题ID) 游标分页，
+    响应中的 next_cursor 用于获取下一页。总数按用户写入版本号缓存，with_total=false 时不统计总数。
+    """
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -320,93 +478,162 @@ def get_error_records(user_id):
         search = request.args.get('search', '')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        cursor = request.args.get('cursor')
+        with_total = request.args.get('with_total', 'true').lower() != 'false'
         
         # 构建基础查询
-        query = db.session.query(
-            ErrorRecord,
-            AnswerRecord,
-            Expression,
-            PracticeRecord
-        ).select_from(ErrorRecord).join(
-            AnswerRecord,
-            ErrorRecord.answer_record_id == AnswerRecord.answer_record_id
-        ).join(
-            Expression,
-            AnswerRecord.expression_id == Expression.expression_id
-        ).join(
-            PracticeRecord,
-            Expression.exercise_set_id == PracticeRecord.exercise_set_id
-        ).filter(
-            PracticeRecord.user_id == user_id
-        )
+        query = UserMistake.query.filter(UserMistake.user_id == user_id)
 
         # 根据导出状态过滤
         if not show_exported:
-            query = query.filter(ErrorRecord.is_exported == False)
+            query = query.filter(UserMistake.is_exported == False)
             
         # 搜索过滤
         if search:
-            query = query.filter(Expression.expression_text.ilike(f'%{search}%'))
+            query = query.filter(UserMistake.expression_text.ilike(f'%{search}%'))
             
         # 日期范围过滤
         if start_date and end_date:
             query = query.filter(
-                PracticeRecord.completion_time.between(
+                UserMistake.created_at.between(
                     datetime.strptime(start_date, '%Y-%m-%d'),
                     datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
                 )
             )
         
-        # 获取总数
-        total = query.count()
+        # 获取总数：同样的筛选条件在用户数据变化前直接使用缓存的结果
+        total = None
+        if with_total:
+            cache_key = stats_cache.versioned_key(
+                user_id, f"error-total:{show_exported}:{search}:{start_date}:{end_date}")
+            cached = stats_cache.get(user_id, cache_key) if cache_key else None
+            if cached is not None:
+                total = cached['total']
+            else:
+                total = query.count()
+                if cache_key:
+                    stats_cache.set(user_id, cache_key, {'total': total})
         
         # 应用分页
-        records = query.order_by(PracticeRecord.completion_time.desc()).offset((page - 1) * per_page).limit(per_page).all()
+        query = query.order_by(UserMistake.created_at.desc(), UserMistake.error_record_id.desc())
+        next_cursor = None
+        if cursor is not None:
+            if cursor:
+                try:
+                    query = query.filter(_keyset_before(UserMistake.created_at,
+                                                        UserMistake.error_record_id, cursor))
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+            records = query.limit(per_page + 1).all()
+            if len(records) > per_page:
+                records = records[:per_page]
+                next_cursor = _encode_cursor(records[-1].created_at, records[-1].error_record_id)
+        else:
+            records = query.offset((page - 1) * per_page).limit(per_page).all()
         
-        # 格式化结果
+        # 格式化结果，答错次数取自错题频次表
+        error_counts = mistake_counts(user_id, {mistake.expression_text for mistake in records})
         items = []
-        for error, answer, expr, practice in records:
-            difficulty = 'simple'
-            if expr.has_brackets:
-                difficulty = 'hard'
-            elif expr.operator_count == 2:
-                difficulty = 'medium'
-            elif expr.operator_count >= 3:
-                difficulty = 'hard'
-                
+        for mistake in records:
             items.append({
-                'id': error.error_record_id,
-                'expression': expr.expression_text,
-                'correct_answer': expr.answer,
-                'user_answer': answer.user_answer,
-                'answer_time': answer.answer_time,
-                'completion_time': practice.completion_time,
-                'difficulty': difficulty,
-                'error_count': 1,
-                'is_exported': error.is_exported,
-                'export_time': error.export_time.isoformat() if error.export_time else None
+                'id': mistake.error_record_id,
+                'expression': mistake.expression_text,
+                'correct_answer': mistake.correct_answer,
+                'user_answer': mistake.user_answer,
+                'answer_time': mistake.answer_time,
+                'completion_time': mistake.created_at,
+                'difficulty': mistake.difficulty,
+                'error_count': error_counts[mistake.expression_text],
+                'is_exported': mistake.is_exported,
+                'export_time': mistake.export_time.isoformat() if mistake.export_time else None
             })
         
         return jsonify({
             'items': items,
             'total': total,
-            'has_exported': False
+            'has_exported': False,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
         current_app.logger.error(f"Error getting error records: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@main.route('/api/error-records/<user_id>/summary')
+def get_error_records_summary(user_id):
+    """错题汇总：按导出状态和难度分组计数（按用户写入版本号缓存）"""
+    try:
+        cache_key = stats_cache.versioned_key(user_id, 'error-summary')
+        cached = stats_cache.get(user_id, cache_key) if cache_key else None
+        if cached is not None:
+            return jsonify(cached)
+        
+        rows = db.session.query(UserMistake.is_exported, UserMistake.difficulty, func.count(UserMistake.error_record_id))\
+            .filter(UserMistake.user_id == user_id)\
+            .group_by(UserMistake.is_exported, UserMistake.difficulty)\
+            .all()
+        
+        summary = {
+            'total': 0,
+            'exported': 0,
+            'not_exported': 0,
+            'by_difficulty': {level: {'exported': 0, 'not_exported': 0} for level in ('simple', 'medium', 'hard')}
+        }
+        for row_exported, row_difficulty, count in rows:
+            status = 'exported' if row_exported else 'not_exported'
+            summary['total'] += count
+            summary[status] += count
+            summary['by_difficulty'][row_difficulty][status] += count
+        
+        if cache_key:
+            stats_cache.set(user_id, cache_key, summary)
+        return jsonify(summary)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error getting error records summary: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@main.route('/api/error-records/<user_id>/frequent')
+def get_frequent_mistakes(user_id):
+    """按答错次数排列的错题本：同一算式只出现一次，附带答错次数、最近答错时间和最近的错误答案"""
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        frequencies = UserMistakeFrequency.query\
+            .filter(UserMistakeFrequency.user_id == user_id)\
+            .order_by(UserMistakeFrequency.error_count.desc(), UserMistakeFrequency.last_wrong_time.desc())\
+            .limit(limit)\
+            .all()
+        return jsonify({
+            'items': [{
+                'expression': frequency.expression_text,
+                'correct_answer': frequency.correct_answer,
+                'error_count': frequency.error_count,
+                'last_user_answer': frequency.last_user_answer,
+                'last_wrong_time': frequency.last_wrong_time.strftime('%Y-%m-%d %H:%M:%S')
+            } for frequency in frequencies]
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Error getting frequent mistakes: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 # 删除错题记录
 @main.route('/api/error-records/<error_id>', methods=['DELETE'])
 def delete_error_record(error_id):
     try:
-        error_record = ErrorRecord.query.get(error_id)
+        error_record = db.session.get(ErrorRecord, error_id)
         if not error_record:
             return jsonify({"error": "记录不存在"}), 404
             
+        mistake = db.session.get(UserMistake, error_record.error_record_id)
+        user_id = mistake.user_id if mistake else None
+        if mistake:
+            forget_mistake(mistake.user_id, mistake.expression_text)
+            db.session.delete(mistake)
+            db.session.flush()
         db.session.delete(error_record)
         db.session.commit()
+        stats_cache.bump(user_id)
         return jsonify({"message": "删除成功"})
         
     except Exception as e:
@@ -422,26 +649,23 @@ def create_practice_from_mistakes():
         user_id = data.get('user_id')
         mistake_ids = data.get('mistake_ids', [])
 
-        # 获取错题对应的原始表达式
-        expressions = db.session.query(Expression).join(
-            AnswerRecord
-        ).join(
-            ErrorRecord
-        ).filter(
-            ErrorRecord.error_record_id.in_(mistake_ids)
+        # 从用户错题表读取错题
+        mistakes = UserMistake.query.filter(
+            UserMistake.user_id == user_id,
+            UserMistake.error_record_id.in_(mistake_ids)
         ).all()
 
-        if not expressions:
+        if not mistakes:
             return jsonify({"error": "未找到指定的错题"}), 404
 
         # 创建新的练习集
         exercise_set = ExerciseSet(
             user_id=user_id,
-            total_expressions=len(expressions),
-            bracket_expressions=sum(1 for e in expressions if e.has_brackets),
+            total_expressions=len(mistakes),
+            bracket_expressions=sum(1 for m in mistakes if '(' in m.expression_text),
             time_limit=30,  # 默认30分钟
-            operators=','.join(set(''.join(e.expression_text.split()) for e in expressions)),
-            operator_count=max(e.operator_count for e in expressions),
+            operators=','.join(set(''.join(m.expression_text.split()) for m in mistakes)),
+            operator_count=max(m.operator_count for m in mistakes),
             min_number=0,
             max_number=100
         )
@@ -449,15 +673,12 @@ def create_practice_from_mistakes():
         db.session.flush()
 
         # 复制错题到新练习集
-        for expr in expressions:
-            new_expr = Expression(
-                exercise_set_id=exercise_set.exercise_set_id,
-                expression_text=expr.expression_text,
-                answer=expr.answer,
-                has_brackets=expr.has_brackets,
-                operator_count=expr.operator_count
-            )
-            db.session.add(new_expr)
+        db.session.bulk_insert_mappings(Expression, [dict(
+            expression_features(m.expression_text),
+            exercise_set_id=exercise_set.exercise_set_id,
+            expression_text=m.expression_text,
+            answer=m.correct_answer
+        ) for m in mistakes])
 
         db.session.commit()
         return jsonify({
@@ -494,52 +715,129 @@ def login():
     except Exception as e:
         return jsonify({"error": "登录失败，请稍后重试"}), 400 
 
+# MySQL 的自增设置（auto_increment_increment, innodb_autoinc_lock_mode），按数据库地址缓存
+_mysql_autoinc_settings = {}
+
+def _mysql_autoinc():
+    """读取 MySQL 的自增步长和自增锁模式"""
+    key = str(db.engine.url)
+    if key not in _mysql_autoinc_settings:
+        increment, lock_mode = db.session.execute(
+            text('SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode')).one()
+        _mysql_autoinc_settings[key] = (int(increment), int(lock_mode))
+    return _mysql_autoinc_settings[key]
+
+def _insert_answer_records(values):
+    """写入答题记录，返回只匹配本次写入的记录的查询条件
+
+    支持 RETURNING 的数据库（SQLite、MariaDB 等）用一条多行 INSERT 直接取回写入的ID。
+    MySQL 不支持 RETURNING：自增锁模式为 0 或 1 时，一条多行 INSERT 分配的自增值按 auto_increment_increment
+    的步长连续，由 lastrowid（本条语句写入的第一行ID）推算出每一行的ID；交错模式（2，Galera 和组复制要求使用）
+    不保证同一条语句的自增值连续，与其他数据库一样逐行写入并取回ID。
+    """
+    statement = insert(AnswerRecord).values(values)
+    if db.engine.dialect.insert_returning:
+        answer_ids = db.session.execute(statement.returning(AnswerRecord.answer_record_id)).scalars().all()
+        return AnswerRecord.answer_record_id.in_(answer_ids)
+    if db.engine.dialect.name == 'mysql':
+        increment, lock_mode = _mysql_autoinc()
+        if lock_mode in (0, 1):
+            first_id = db.session.execute(statement).lastrowid
+            return AnswerRecord.answer_record_id.in_(
+                [first_id + index * increment for index in range(len(values))])
+    answer_ids = [db.session.execute(insert(AnswerRecord).values(value)).inserted_primary_key[0]
+                  for value in values]
+    return AnswerRecord.answer_record_id.in_(answer_ids)
+
+def _insert_answer_rows(rows):
+    """写入已批改的答题记录，答错的同时生成错题记录和用户错题，并更新统计汇总表（不提交事务），返回涉及的用户ID"""
+    if not rows:
+        return set()
+    inserted = _insert_answer_records([{
+        'expression_id': row['expression_id'],
+        'user_answer': row['user_answer'],
+        'is_correct': row['is_correct'],
+        'answer_time': row['answer_time'],
+        'local_date': local_date_of(row.get('local_date'))
+    } for row in rows])
+    
+    # 答错的题目直接由本次写入的答题记录生成错题记录
+    if any(not row['is_correct'] for row in rows):
+        db.session.execute(error_records_insert(inserted))
+        insert_user_mistakes(inserted)
+        record_wrong_answers(rows)
+    return update_answer_rollups(rows)
+
+def apply_answer_log_segment(segment_id, rows):
+    """把预写日志的一个分段写入数据库，与分段标记在同一事务中提交，已写入过的分段直接跳过"""
+    if db.session.get(AnswerLogSegment, segment_id):
+        return
+    try:
+        user_ids = _insert_answer_rows(rows)
+        db.session.add(AnswerLogSegment(segment_id=segment_id, record_count=len(rows)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    stats_cache.bump(*user_ids)
+
 @main.route('/api/answer-records/batch', methods=['POST'])
 def create_answer_records_batch():
-    """批量创建答题记录"""
+    """批量创建答题记录
+
+    一次 IN 查询取出全部算式，在内存中批改，再用一条多行 INSERT 写入答题记录、
+    一条 INSERT ... SELECT 写入错题记录，语句数与提交的题目数量无关。
+    开启预写日志时，批改结果写入本地日志后立即返回，由后台线程写入数据库。
+    """
     try:
         data = request.get_json()
         answers = data.get('answers', [])
         results = []
         
+        # 一次取出本次提交涉及的全部算式
+        expression_ids = {answer.get('expression_id') for answer in answers}
+        expressions = {
+            expression_id: answer for expression_id, answer in db.session.query(
+                Expression.expression_id, Expression.answer
+            ).filter(Expression.expression_id.in_(expression_ids))
+        } if expression_ids else {}
+        
+        rows = []
+        answered_date = today().isoformat()
         for answer in answers:
             expression_id = answer.get('expression_id')
             user_answer = answer.get('user_answer')
             answer_time = answer.get('answer_time', 0)
             
-            # 获取表达式信息
-            expression = Expression.query.get(expression_id)
-            if not expression:
+            correct_answer = expressions.get(expression_id)
+            if correct_answer is None:
                 continue
                 
             # 判断答案是否正确（允许0.01的误差）
-            is_correct = abs(float(user_answer) - expression.answer) < 0.01
-            
-            # 创建答题记录
-            answer_record = AnswerRecord(
-                expression_id=expression_id,
-                user_answer=user_answer,
-                is_correct=is_correct,
-                answer_time=answer_time
-            )
-            db.session.add(answer_record)
-            db.session.flush()
-            
-            # 如果答错了，创建错题记录
-            if not is_correct:
-                error_record = ErrorRecord(
-                    answer_record_id=answer_record.answer_record_id,
-                    is_exported=False
-                )
-                db.session.add(error_record)
+            is_correct = abs(float(user_answer) - correct_answer) < 0.01
             
+            rows.append({
+                'expression_id': expression_id,
+                'user_answer': user_answer,
+                'is_correct': is_correct,
+                'answer_time': answer_time,
+                'local_date': answered_date
+            })
             results.append({
                 "expression_id": expression_id,
                 "is_correct": is_correct,
-                "correct_answer": expression.answer
+                "correct_answer": correct_answer
             })
         
+        if answer_log.enabled:
+            db.session.rollback()
+            if rows:
+                answer_log.append(rows)
+            return jsonify({"results": results}), 200
+        
+        user_ids = _insert_answer_rows(rows)
         db.session.commit()
+        stats_cache.bump(*user_ids)
         return jsonify({"results": results}), 200
         
     except Exception as e:
@@ -547,69 +845,213 @@ def create_answer_records_batch():
         current_app.logger.error(f"Error creating answer records: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _encode_cursor(sort_time, row_id):
+    """把排序键 (时间, ID) 编码为不透明的分页游标"""
+    payload = json.dumps([sort_time.strftime('%Y-%m-%d %H:%M:%S.%f'), row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    """解析分页游标，格式不正确时抛出 ValueError"""
+    try:
+        sort_time, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.strptime(sort_time, '%Y-%m-%d %H:%M:%S.%f'), int(row_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _keyset_before(time_column, id_column, cursor):
+    """按 (时间, ID) 倒序分页时，排在游标之后的记录"""
+    sort_time, row_id = _decode_cursor(cursor)
+    return or_(time_column < sort_time,
+               and_(time_column == sort_time, id_column < row_id))
+
+def _practice_answer_stats(set_ids):
+    """一次分组查询统计若干练习集的 (答对数, 答题数, 答题总用时)"""
+    if not set_ids:
+        return {}
+    return {
+        exercise_set_id: (int(correct_count or 0), total_count, answer_time or 0)
+        for exercise_set_id, correct_count, total_count, answer_time in db.session.query(
+            Expression.exercise_set_id,
+            func.sum(case((AnswerRecord.is_correct, 1), else_=0)),
+            func.count(AnswerRecord.answer_record_id),
+            func.sum(AnswerRecord.answer_time)
+        ).join(AnswerRecord, AnswerRecord.expression_id == Expression.expression_id)
+         .filter(Expression.exercise_set_id.in_(set_ids))
+         .group_by(Expression.exercise_set_id)
+    }
+
 @main.route('/api/practice-records', methods=['GET'])
 def get_practice_records():
+    """获取练习记录
+
+    默认按 page/size 分页；传入 cursor 参数（首页传空字符串）时按 (完成时间, 记录ID) 游标分页，
+    响应中的 next_cursor 用于获取下一页。with_total=false 时不统计总数。
+    本页各练习集的答题数、答对数和用时由一次分组查询得到。
+    """
     try:
         page = request.args.get('page', 1, type=int)
         size = request.args.get('size', 10, type=int)
         user_id = request.args.get('user_id')
+        cursor = request.args.get('cursor')
+        with_total = request.args.get('with_total', 'true').lower() != 'false'
         
         if not user_id:
             return jsonify({"error": "Missing user_id parameter"}), 400
             
         # 获取练习记录
-        records = PracticeRecord.query\
+        query = PracticeRecord.query\
             .filter_by(user_id=user_id)\
-            .order_by(PracticeRecord.completion_time.desc())\
-            .paginate(page=page, per_page=size)
+            .order_by(PracticeRecord.completion_time.desc(), PracticeRecord.record_id.desc())
+        next_cursor = None
+        if cursor is not None:
+            total = query.order_by(None).count() if with_total else None
+            if cursor:
+                try:
+                    query = query.filter(_keyset_before(PracticeRecord.completion_time,
+                                                        PracticeRecord.record_id, cursor))
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+            records = query.limit(size + 1).all()
+            if len(records) > size:
+                records = records[:size]
+                next_cursor = _encode_cursor(records[-1].completion_time, records[-1].record_id)
+        else:
+            pagination = query.paginate(page=page, per_page=size, count=with_total)
+            records = pagination.items
+            total = pagination.total
+        
+        # 一次分组查询统计本页所有练习集的答题情况
+        answer_stats = _practice_answer_stats({record.exercise_set_id for record in records})
             
         records_data = []
-        for record in records.items:
-            try:
-                # 获取该练习集的所有答题记录
-                answer_records = db.session.query(AnswerRecord)\
-                    .join(Expression, Expression.expression_id == AnswerRecord.expression_id)\
-                    .filter(Expression.exercise_set_id == record.exercise_set_id)\
-                    .all()
-                    
-                # 计算总用时（如果原来的duration为空）
-                total_duration = record.duration
-                if total_duration is None or total_duration == 0:
-                    total_duration = sum(ar.answer_time for ar in answer_records if ar.answer_time is not None)
-                
-                # 计算正确题数
-                correct_count = sum(1 for ar in answer_records if ar.is_correct)
-                total_count = len(answer_records)
-                
-                records_data.append({
-                    'id': record.record_id,  # 使用 record_id 而不是 id
-                    'exercise_set_id': record.exercise_set_id,
-                    'completion_time': record.completion_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    'duration': total_duration,  # 使用计算后的总用时
-                    'total_expressions': record.total_expressions,
-                    'bracket_expressions': record.bracket_expressions,
-                    'time_limit': record.time_limit,
-                    'operators': record.operators,
-                    'operator_count': record.operator_count,
-                    'min_number': record.min_number,
-                    'max_number': record.max_number,
-                    'correct_count': correct_count,
-                    'total_count': total_count,
-                    'is_timeout': record.is_timeout,
-                    'accuracy': f"{(correct_count / total_count * 100):.1f}" if total_count > 0 else "0.0"
-                })
-            except Exception as e:
-                current_app.logger.error(f"Error processing record {record.record_id}: {str(e)}")
-                continue
+        for record in records:
+            correct_count, total_count, answer_time = answer_stats.get(record.exercise_set_id, (0, 0, 0))
+            
+            # 计算总用时（如果原来的duration为空）
+            total_duration = record.duration
+            if total_duration is None or total_duration == 0:
+                total_duration = answer_time
+            
+            records_data.append({
+                'id': record.record_id,  # 使用 record_id 而不是 id
+                'exercise_set_id': record.exercise_set_id,
+                'completion_time': record.completion_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'duration': total_duration,  # 使用计算后的总用时
+                'total_expressions': record.total_expressions,
+                'bracket_expressions': record.bracket_expressions,
+                'time_limit': record.time_limit,
+                'operators': record.operators,
+                'operator_count': record.operator_count,
+                'min_number': record.min_number,
+                'max_number': record.max_number,
+                'correct_count': correct_count,
+                'total_count': total_count,
+                'is_timeout': record.is_timeout,
+                'accuracy': f"{(correct_count / total_count * 100):.1f}" if total_count > 0 else "0.0"
+            })
             
         return jsonify({
             'records': records_data,
-            'total': records.total
+            'total': total,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         current_app.logger.error(f"Error getting practice records: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _practice_history_rows(user_id):
+    """按完成时间倒序逐批读取用户的全部练习记录，每批一次分组查询统计答题情况"""
+    statement = select(
+        PracticeRecord.exercise_set_id, PracticeRecord.completion_time, PracticeRecord.duration,
+        PracticeRecord.is_timeout, PracticeRecord.total_expressions, PracticeRecord.bracket_expressions,
+        PracticeRecord.time_limit, PracticeRecord.operators, PracticeRecord.min_number, PracticeRecord.max_number
+    ).where(PracticeRecord.user_id == user_id)\
+     .order_by(PracticeRecord.completion_time.desc(), PracticeRecord.record_id.desc())
+    index = 0
+    for batch in _streamed_batches(statement, current_app.config['EXPORT_BATCH_SIZE']):
+        answer_stats = _practice_answer_stats({record.exercise_set_id for record in batch})
+        for record in batch:
+            correct_count, total_count, answer_time = answer_stats.get(record.exercise_set_id, (0, 0, 0))
+            index += 1
+            yield [
+                index,
+                record.completion_time.strftime('%Y-%m-%d %H:%M:%S'),
+                record.operators,
+                record.total_expressions,
+                record.bracket_expressions,
+                f'{record.min_number} - {record.max_number}',
+                record.time_limit,
+                record.duration or answer_time,
+                '是' if record.is_timeout else '否',
+                correct_count,
+                total_count,
+                round(correct_count / total_count * 100, 1) if total_count > 0 else 0.0
+            ]
+
+def _render_practice_history(user_id, format_type, job=None):
+    """渲染练习记录导出文件，返回 (文件内容的分块, MIME 类型, 下载文件名)"""
+    header = ['序号', '完成时间', '运算符', '题目数', '括号题数', '数值范围', '时间限制(分钟)',
+              '用时(秒)', '是否超时', '答对数', '答题数', '正确率(%)']
+    rows = _practice_history_rows(user_id)
+    if job:
+        rows = job.track(rows)
+    download_name = f'练习记录_{datetime.now(Config.CHINA_TZ).strftime("%Y%m%d")}'
+    if format_type == 'csv':
+        return (stream_csv(header, rows, current_app.config['EXPORT_CSV_CHUNK_SIZE']),
+                CSV_MIMETYPE, f'{download_name}.csv')
+    return (stream_xlsx([Sheet('练习记录', header, [8, 20, 12, 8, 10, 12, 14, 10, 10, 8, 8, 10], rows)]),
+            XLSX_MIMETYPE, f'{download_name}.xlsx')
+
+def _cached_export(key, render, mimetype, download_name):
+    """导出缓存命中时返回缓存文件的路径，跳过渲染；未命中时调用 render，输出的同时写入缓存
+
+    key 为 None 表示内容不可复现，直接渲染，不写入缓存。
+    """
+    if key is None:
+        return render(), mimetype, download_name
+    path = export_cache.get(key)
+    if path is not None:
+        return path, mimetype, download_name
+    return export_cache.store(key, render()), mimetype, download_name
+
+def _export_response(source, mimetype, download_name):
+    """返回导出文件：缓存文件直接从磁盘发送（支持 Range），否则以流式响应边渲染边输出"""
+    if isinstance(source, str):
+        return send_file(source, mimetype=mimetype, as_attachment=True,
+                         download_name=download_name, conditional=True)
+    return attachment_response(source, mimetype, download_name)
+
+def _export_job_response(render, total=None):
+    """把导出提交为后台任务，返回 202 和查询任务状态的地址；任务过多时返回 503"""
+    try:
+        job = export_jobs.submit(render, total)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    status = job.to_dict()
+    status['status_url'] = url_for('main.get_export_job', job_id=job.job_id)
+    return jsonify(status), 202
+
+@main.route('/api/practice-records/export', methods=['GET'])
+def export_practice_records():
+    """导出用户的全部练习记录
+
+    format 为 xlsx（默认）或 csv，练习记录用服务端游标分批读取并以流式响应输出；
+    async=true 时提交为后台任务，通过 /api/jobs/<job_id> 查询进度并下载。
+    """
+    try:
+        user_id = request.args.get('user_id')
+        format_type = request.args.get('format', 'xlsx')
+        if not user_id:
+            return jsonify({"error": "Missing user_id parameter"}), 400
+        
+        if request.args.get('async', '').lower() == 'true':
+            total = PracticeRecord.query.filter_by(user_id=user_id).count()
+            return _export_job_response(lambda job: _render_practice_history(user_id, format_type, job), total)
+        return _export_response(*_render_practice_history(user_id, format_type))
+    except Exception as e:
+        current_app.logger.error(f"Error exporting practice records: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @main.route('/api/exercise-set/<int:exercise_set_id>/answers')
 def get_exercise_set_answers(exercise_set_id):
     """获取练习集答题记录"""
@@ -662,119 +1104,104 @@ def get_exercise_set_answers(exercise_set_id):
         current_app.logger.error(f"Error getting exercise set answers: {str(e)}")
         return jsonify({"error": str(e)}), 500 
 
+def _statistics_response(statistics, etag):
+    """统计结果响应：带 ETag，要求浏览器每次都重新验证"""
+    response = jsonify(statistics)
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @main.route('/api/user/<user_id>/statistics')
 def get_user_statistics(user_id):
-    """获取用户练习统计数据"""
+    """获取用户练习统计数据
+
+    读取按 (日期, 运算符组合, 难度) 汇总的统计表，查询的行数与历史记录多少无关。
+    汇总表随答题、完成练习和导入同步更新，可用 rebuild_stats.py 由已有数据重建。
+    days 参数指定每日趋势覆盖的天数（默认近7天），趋势和总正确率按这段时间统计。
+    与改用汇总表之前相比，各项统计的口径有以下变化：
+    - 正确率、每日题数和用时分布统计全部答题记录，同一算式重复作答时每次都计入（原先只计第一次作答）；
+    - total_practices 为完成练习的次数，同一练习集完成多次时各计一次（原先为练习过的练习集个数）；
+    - 每日趋势按答题当天的日期归属（原先按所属练习的完成时间）。
+    结果按用户的写入版本号缓存并带 ETag，数据未变化时直接返回 304，不访问数据库。
+    """
     try:
-        # 获取用户所有练习记录
-        practice_records = PracticeRecord.query.filter_by(user_id=user_id).all()
+        days = request.args.get('days', 7, type=int)
+        days = min(max(days, 1), current_app.config['STATS_TREND_MAX_DAYS'])
+        today_date = today()
+        etag = stats_cache.etag(user_id, f"{today_date.isoformat()}:{days}")
+        if etag:
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+            cached = stats_cache.get(user_id, etag)
+            if cached is not None:
+                return _statistics_response(cached, etag)
         
-        # 计算总练习次数（每个练习集只算一次）
-        unique_sets = set(record.exercise_set_id for record in practice_records)
-        total_practices = len(unique_sets)
+        # 计算总练习次数和总练习时间（total_duration 为秒数）
+        total_practices, total_seconds = db.session.query(
+            func.coalesce(func.sum(UserPracticeRollup.practice_count), 0),
+            func.coalesce(func.sum(UserPracticeRollup.total_duration), 0)
+        ).filter(UserPracticeRollup.user_id == user_id).one()
+        total_minutes = total_seconds / 60
         
-        # 计算总练习时间（分钟）- 修改时间计算逻辑
-        total_minutes = 0
-        for record in practice_records:
-            # duration 字段存储的是秒数，需要转换为分钟
-            if record.duration:
-                total_minutes += record.duration / 60
+        # 使用中国时区的当前日期
+        window_start = today_date - timedelta(days=days - 1)
         
-        # 获取所有答题记录算正确率
+        # 每日趋势按 days 天统计，用时分布和运算符正确率按全部历史统计
+        in_window = UserAnswerRollup.local_date >= window_start
+        day = case((in_window, UserAnswerRollup.local_date))
+        rows = db.session.query(
+            day, UserAnswerRollup.operators, UserAnswerRollup.difficulty,
+            func.sum(UserAnswerRollup.correct_count), func.sum(UserAnswerRollup.total_count),
+            *[func.sum(getattr(UserAnswerRollup, column)) for column in TIME_COLUMNS]
+        ).filter(UserAnswerRollup.user_id == user_id)\
+         .group_by(day, UserAnswerRollup.operators, UserAnswerRollup.difficulty)\
+         .all()
+        
+        day_totals = {}
+        time_distribution = {
+            'simple': [0, 0, 0, 0, 0],    # 0-3秒, 3-5秒, 5-10秒, 10-15秒, >15秒
+            'medium': [0, 0, 0, 0, 0],
+            'hard': [0, 0, 0, 0, 0]
+        }
+        operator_stats = dict.fromkeys(OPERATOR_ORDER, 0)
+        operator_totals = dict.fromkeys(OPERATOR_ORDER, 0)
+        for row_day, row_operators, row_difficulty, row_correct, row_total, *row_times in rows:
+            row_correct, row_total = int(row_correct or 0), int(row_total or 0)
+            if row_day is not None:
+                # MySQL 返回 date，SQLite 返回字符串
+                key = str(row_day)[:10]
+                day_total, day_correct = day_totals.get(key, (0, 0))
+                day_totals[key] = (day_total + row_total, day_correct + row_correct)
+            for i, count in enumerate(row_times):
+                time_distribution[row_difficulty][i] += int(count or 0)
+            for op in row_operators:
+                operator_totals[op] += row_total
+                operator_stats[op] += row_correct
+        
+        # 每日趋势与总正确率（近 days 天）
         total_correct = 0
         total_questions = 0
-        
-        # 使用中国时区的当前时间
-        today = datetime.now(Config.CHINA_TZ).date()
         week_stats = []
-        
-        for i in range(7):
-            date = today - timedelta(days=i)
-            # 获取当天的所有记录，注意时区转换
-            day_records = [r for r in practice_records 
-                         if r.completion_time.astimezone(Config.CHINA_TZ).date() == date]
-            
-            day_correct = 0
-            day_total = 0
-            day_count = 0
-            
-            for record in day_records:
-                expressions = Expression.query.filter_by(exercise_set_id=record.exercise_set_id).all()
-                for expr in expressions:
-                    answer_record = AnswerRecord.query.filter_by(expression_id=expr.expression_id).first()
-                    if answer_record:
-                        day_total += 1
-                        day_count += 1
-                        if answer_record.is_correct:
-                            day_correct += 1
-                            total_correct += 1
-                        total_questions += 1
-            
+        for i in range(days - 1, -1, -1):
+            date = today_date - timedelta(days=i)
+            day_total, day_correct = day_totals.get(date.isoformat(), (0, 0))
+            total_correct += day_correct
+            total_questions += day_total
             day_accuracy = (day_correct / day_total * 100) if day_total > 0 else 0
-            
             week_stats.append({
                 'date': date.strftime('%m-%d'),
                 'accuracy': round(day_accuracy, 1),
-                'count': day_count
+                'count': day_total
             })
         
-        week_stats.reverse()
-        
         # 计算总正确率
         average_accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
         
-        # 修改答题用分布计算逻辑
-        time_distribution = {
-            'simple': [0, 0, 0, 0, 0],    # 0-3秒, 3-5秒, 5-10秒, 10-15秒, >15秒
-            'medium': [0, 0, 0, 0, 0],
-            'hard': [0, 0, 0, 0, 0]
-        }
-        
-        # 获取所有答题记录
-        for record in practice_records:
-            expressions = Expression.query.filter_by(exercise_set_id=record.exercise_set_id).all()
-            for expr in expressions:
-                answer_record = AnswerRecord.query.filter_by(expression_id=expr.expression_id).first()
-                if answer_record and answer_record.answer_time:
-                    # 确定题目难度
-                    difficulty = 'simple'
-                    if expr.has_brackets:
-                        difficulty = 'hard'
-                    elif expr.operator_count == 2:
-                        difficulty = 'medium'
-                    elif expr.operator_count >= 3:
-                        difficulty = 'hard'
-                    
-                    # 使用实际答题时间进行分类
-                    time = answer_record.answer_time
-                    if time <= 3:
-                        time_distribution[difficulty][0] += 1
-                    elif time <= 5:
-                        time_distribution[difficulty][1] += 1
-                    elif time <= 10:
-                        time_distribution[difficulty][2] += 1
-                    elif time <= 15:
-                        time_distribution[difficulty][3] += 1
-                    else:
-                        time_distribution[difficulty][4] += 1
-        
-        # 获取运算符统计
-        operator_stats = {'+': 0, '-': 0, '×': 0, '÷': 0}
-        operator_totals = {'+': 0, '-': 0, '×': 0, '÷': 0}
-        
-        for record in practice_records:
-            expressions = Expression.query.filter_by(exercise_set_id=record.exercise_set_id).all()
-            for expr in expressions:
-                expr_text = expr.expression_text
-                for op in ['×', '÷', '+', '-']:
-                    if op in expr_text:
-                        operator_totals[op] += 1
-                        answer_record = AnswerRecord.query.filter_by(expression_id=expr.expression_id).first()
-                        if answer_record and answer_record.is_correct:
-                            operator_stats[op] += 1
-        
         operator_accuracy = []
-        for op in operator_stats:
+        for op in OPERATOR_ORDER:
             if operator_totals[op] > 0:
                 accuracy = round(operator_stats[op] / operator_totals[op] * 100, 1)
                 operator_accuracy.append({
@@ -782,120 +1209,156 @@ def get_user_statistics(user_id):
                     'value': accuracy
                 })
         
-        return jsonify({
-            'total_practices': total_practices,
+        statistics = {
+            'total_practices': int(total_practices),
             'total_time': int(total_minutes),
             'average_accuracy': round(average_accuracy, 1),
             'operator_accuracy': operator_accuracy,
             'week_trend': week_stats,
             'time_distribution': time_distribution,
             'time_labels': ['0-3秒', '3-5秒', '5-10秒', '10-15秒', '15秒以上']
-        })
+        }
+        if etag:
+            stats_cache.set(user_id, etag, statistics)
+        return _statistics_response(statistics, etag)
         
     except Exception as e:
         current_app.logger.error(f"Error getting user statistics: {str(e)}")
         return jsonify({"error": str(e)}), 500 
 
+def _mark_mistakes_exported(user_id, mistake_ids):
+    """把本次导出的错题标记为已导出并提交"""
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    # MySQL 的 DATETIME 不保存微秒
+    export_time = datetime.now(Config.CHINA_TZ).replace(microsecond=0, tzinfo=None)
+    try:
+        for start in range(0, len(mistake_ids), batch_size):
+            batch = mistake_ids[start:start + batch_size]
+            UserMistake.query.filter(UserMistake.user_id == user_id, UserMistake.error_record_id.in_(batch))\
+                .update({'is_exported': True, 'export_time': export_time}, synchronize_session=False)
+            ErrorRecord.query.filter(ErrorRecord.error_record_id.in_(
+                select(UserMistake.error_record_id).where(UserMistake.user_id == user_id,
+                                                          UserMistake.error_record_id.in_(batch))
+            )).update({'is_exported': True, 'export_time': export_time}, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    stats_cache.bump(user_id)
+
+def _then(chunks, callback):
+    """原样输出 chunks，全部输出后调用 callback；中途断开（生成器被关闭）或出错时不调用"""
+    yield from chunks
+    callback()
+
+def _streamed_batches(statement, batch_size):
+    """用单独的连接以服务端游标读取查询结果并分批返回
+
+    MySQL 的流式游标在读完之前独占所在连接，放在单独的连接上，读取期间会话仍可执行其他查询。
+    """
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(statement)
+        yield from result.partitions(batch_size)
+
+def _ordered_mistake_batches(user_id, mistake_ids, batch_size):
+    """按提交的顺序分批取出错题，每批一次 IN 查询"""
+    for start in range(0, len(mistake_ids), batch_size):
+        batch = mistake_ids[start:start + batch_size]
+        mistakes = {mistake.error_record_id: mistake for mistake in UserMistake.query.filter(
+            UserMistake.user_id == user_id, UserMistake.error_record_id.in_(batch))}
+        yield [mistakes[mistake_id] for mistake_id in batch if mistake_id in mistakes]
+
+def _exported_mistakes(user_id, mistake_ids):
+    """按提交的顺序逐批读取本次导出的错题（附带答错次数），每批一次 IN 查询，内存占用与导出数量无关"""
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    for batch in _ordered_mistake_batches(user_id, mistake_ids, batch_size):
+        error_counts = mistake_counts(user_id, {mistake.expression_text for mistake in batch})
+        for mistake in batch:
+            yield {
+                'expression': mistake.expression_text,
+                'correct_answer': mistake.correct_answer,
+                'user_answer': mistake.user_answer,
+                'answer_time': mistake.answer_time,
+                'error_count': error_counts[mistake.expression_text]
+            }
+
+def _render_mistakes(user_id, mistake_ids, export_type, job=None):
+    """渲染错题本导出文件并在完成后标记错题为已导出，返回 (文件内容的分块或缓存文件路径, MIME 类型, 下载文件名)
+
+    流式输出的文件全部输出（或后台任务全部写入）后才标记，下载中断时错题保持未导出；
+    命中导出缓存时文件已经完整，直接标记。
+    """
+    source, mimetype, download_name = _render_mistake_file(user_id, mistake_ids, export_type, job)
+    mark = lambda: _mark_mistakes_exported(user_id, mistake_ids)
+    if isinstance(source, str):
+        mark()
+        return source, mimetype, download_name
+    return _then(source, mark), mimetype, download_name
+
+def _render_mistake_file(user_id, mistake_ids, export_type, job=None):
+    """渲染错题本导出文件
+
+    Word 格式使用导出缓存；CSV 和 Excel 边读取数据库边输出，不缓存。
+    """
+    mistakes = _exported_mistakes(user_id, mistake_ids)
+    download_name = f'错题本_{datetime.now().strftime("%Y%m%d")}'
+    if export_type == 'word':
+        # 导出时间只精确到日期，同一天重复下载相同的错题时命中导出缓存
+        mistakes = list(mistakes)
+        exported_at = datetime.now(Config.CHINA_TZ).strftime("%Y-%m-%d")
+        key = export_key('docx', DOCX_LAYOUT_VERSION, [exported_at], (
+            [mistake['expression'], mistake['correct_answer'], mistake['user_answer'], mistake['error_count']]
+            for mistake in mistakes))
+        return _cached_export(key, lambda: mistakes_docx(mistakes, exported_at, job.advance if job else None),
+                              DOCX_MIMETYPE, f'{download_name}.docx')
+    if job:
+        mistakes = job.track(mistakes)
+        
+    # 逐行生成，边读取数据库边输出
+    rows = ([
+        idx,
+        mistake['expression'],
+        mistake['correct_answer'],
+        round(mistake['user_answer'],2),
+        # f"{mistake['answer_time']:.1f}",
+        # mistake['completion_time'],
+        mistake['error_count']
+    ] for idx, mistake in enumerate(mistakes, 1))
+    
+    header = ['序号', '算式', '正确答案', '你的答案', '错误次数']
+    
+    if export_type == 'xlsx':
+        return (stream_xlsx([Sheet('错题本', header, [8, 30, 12, 12, 10], rows)]),
+                XLSX_MIMETYPE, f'{download_name}.xlsx')
+    
+    # CSV格式
+    return (stream_csv(header, rows, current_app.config['EXPORT_CSV_CHUNK_SIZE']),
+            CSV_MIMETYPE, f'{download_name}.csv')
+
 @main.route('/api/error-records/<user_id>/export', methods=['POST'])
 def export_error_records(user_id):
+    """导出错题并标记为已导出
+
+    mistakes 为要导出的错题列表（按提交的顺序导出）；传入 all=true 时导出用户全部未导出的错题。
+    type 为 word、xlsx 或 csv（默认）；CSV 和 Excel 以流式响应输出，错题分批从数据库读取。
+    文件完整输出后才标记为已导出，下载中断的错题下次仍可导出。
+    async=true 时文件由后台任务渲染，任务完成时标记，通过 /api/jobs/<job_id> 查询进度并下载。
+    """
     try:
         data = request.get_json()
         export_type = data.get('type')
-        mistakes = data.get('mistakes', [])
-        
-        # 更新错题的导出状态
-        mistake_ids = [m['id'] for m in mistakes]
-        error_records = ErrorRecord.query.filter(
-            ErrorRecord.error_record_id.in_(mistake_ids)
-        ).all()
-        
-        for record in error_records:
-            record.is_exported = True
-            record.export_time = datetime.now(Config.CHINA_TZ)
-        
-        db.session.commit()
+        if data.get('all'):
+            # 先确定本次导出的错题，之后新增或被其他导出标记的错题不影响本次导出的内容
+            mistake_ids = [mistake_id for mistake_id, in db.session.query(UserMistake.error_record_id)
+                           .filter(UserMistake.user_id == user_id, UserMistake.is_exported == False)
+                           .order_by(UserMistake.created_at, UserMistake.error_record_id)]
+        else:
+            mistake_ids = [m['id'] for m in data.get('mistakes', [])]
         
-        if export_type == 'word':
-            doc = Document()
-            
-            # 设置中文字体
-            doc.styles['Normal'].font.name = '宋体'
-            doc.styles['Normal']._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-            
-            # 添加标题
-            title = doc.add_heading('错题记录', 0)
-            title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-            # 添加基本信息
-            doc.add_paragraph(f'导出时间：{datetime.now(Config.CHINA_TZ).strftime("%Y-%m-%d %H:%M:%S")}')
-            doc.add_paragraph(f'错题数量：{len(mistakes)} 道')
-            doc.add_paragraph()  # 添加空行
-            
-            # 添加题目列表
-            for idx, mistake in enumerate(mistakes, 1):
-                # 添加题编号和算式
-                p = doc.add_paragraph()
-                p.add_run(f'{idx}. ').bold = True
-                p.add_run(f'算式：{mistake["expression"]}')
-                
-                # 添加答案信息
-                details = doc.add_paragraph()
-                details.style.font.size = Pt(10)
-                # details.add_run('完成时间：').bold = True
-                # details.add_run(mistake['completion_time'])
-                details.add_run('\n正确答案：').bold = True
-                details.add_run(str(mistake['correct_answer']))
-                details.add_run('   你的答案：').bold = True
-                details.add_run(str(round(mistake['user_answer'],2)))
-                # details.add_run('   用时：').bold = True
-                # details.add_run(f'{mistake["answer_time"]:.1f}秒')
-                details.add_run('   错误次数：').bold = True
-                details.add_run(str(mistake['error_count']))
-                
-                # 添加分隔线
-                if idx < len(mistakes):
-                    doc.add_paragraph('—' * 50)
-            
-            # 保存到内存
-            docx_buffer = BytesIO()
-            doc.save(docx_buffer)
-            docx_buffer.seek(0)
-            
-            return send_file(
-                docx_buffer,
-                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                as_attachment=True,
-                download_name=f'错题本_{datetime.now().strftime("%Y%m%d")}.docx'
-            )
-            
-        else:  # CSV格式
-            output = StringIO()
-            writer = csv.writer(output)
-            
-            # 写入表头
-            writer.writerow(['序号', '算式', '正确答案', '你的答案', '错误次数'])
-            
-            # 写入数据
-            for idx, mistake in enumerate(mistakes, 1):
-                writer.writerow([
-                    idx,
-                    mistake['expression'],
-                    mistake['correct_answer'],
-                    round(mistake['user_answer'],2),
-                    # f"{mistake['answer_time']:.1f}",
-                    # mistake['completion_time'],
-                    mistake['error_count']
-                ])
-            
-            # 获取CSV内容并添加BOM
-            csv_data = output.getvalue().encode('utf-8-sig')
-            
-            return send_file(
-                BytesIO(csv_data),
-                mimetype='text/csv;charset=utf-8',
-                as_attachment=True,
-                download_name=f'错题本_{datetime.now().strftime("%Y%m%d")}.csv'
-            )
+        if data.get('async'):
+            return _export_job_response(
+                lambda job: _render_mistakes(user_id, mistake_ids, export_type, job), len(mistake_ids))
+        return _export_response(*_render_mistakes(user_id, mistake_ids, export_type))
 
     except Exception as e:
         db.session.rollback()
@@ -912,15 +1375,17 @@ def complete_exercise_set(exercise_set_id):
         is_timeout = bool(data.get('is_timeout', False))  # 确保是布尔值
         
         # 获取练习集信息
-        exercise_set = ExerciseSet.query.get(exercise_set_id)
+        exercise_set = db.session.get(ExerciseSet, exercise_set_id)
         if not exercise_set:
             return jsonify({"error": "练习集不存在"}), 404
             
         # 创建练习记录
+        now = datetime.now(Config.CHINA_TZ)
         practice_record = PracticeRecord(
             user_id=str(user_id),  # 确保是字符串
             exercise_set_id=int(exercise_set_id),  # 确保是整数
-            completion_time=datetime.now(Config.CHINA_TZ),
+            completion_time=now,
+            local_date=now.date(),
             duration=int(duration),  # 确保是整数
             is_timeout=is_timeout,
             is_completed=True,
@@ -935,7 +1400,9 @@ def complete_exercise_set(exercise_set_id):
         )
         
         db.session.add(practice_record)
+        update_practice_rollup(practice_record.user_id, practice_record.local_date, practice_record.duration)
         db.session.commit()
+        stats_cache.bump(practice_record.user_id)
         
         return jsonify({"message": "练习完成"}), 200
         
@@ -944,9 +1411,72 @@ def complete_exercise_set(exercise_set_id):
         current_app.logger.error(f"Error completing exercise set: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _render_expressions(generator, config, format_type, job=None):
+    """生成题目并渲染导出文件，返回 (文件内容的分块或缓存文件路径, MIME 类型, 下载文件名)"""
+    # 大批量导出且远未达到容量上限时使用向量化生成（指定种子时保持逐个生成，结果可复现）
+    if (vectorized.numpy_available()
+            and config.get('seed') is None
+            and config['total_expressions'] >= current_app.config['VECTORIZED_MIN_COUNT']
+            and config['total_expressions'] * 2 <= generator.capacity()['total']):
+        generator.engine = 'numpy'
+    
+    if config.get('seed') is not None:
+        _, expressions = _seeded_expressions(
+            generator, config['total_expressions'], config.get('bracket_expressions', 0), config['seed'])
+    elif config['total_expressions'] >= current_app.config['PARALLEL_MIN_COUNT']:
+        expressions = generator.generate_expressions_parallel(
+            count=config['total_expressions'],
+            bracket_count=config.get('bracket_expressions', 0),
+            workers=current_app.config['GENERATION_WORKERS']
+        )
+    else:
+        expressions = generator.generate_expressions(
+            count=config['total_expressions'],
+            bracket_count=config.get('bracket_expressions', 0)
+        )
+    
+    download_name = f'口算练习_{datetime.now(Config.CHINA_TZ).strftime("%Y%m%d")}'
+    # 指定种子重复导出时题目和配置相同，命中导出缓存直接返回已渲染的文件；
+    # 未指定种子时每次生成的题目都不同，缓存不会命中，不计算缓存键也不写入缓存
+    seeded = config.get('seed') is not None
+    settings = [config['total_expressions'], config.get('bracket_expressions', 0), config['operators'],
+                config['min_number'], config['max_number']]
+    answers = ([expr['expression_text'], expr['answer']] for expr in expressions)
+    if format_type == 'docx':
+        # Word格式包含答案页，由预先编排的 WordprocessingML 片段逐块写入压缩包
+        return _cached_export(export_key('docx', DOCX_LAYOUT_VERSION, [settings], answers) if seeded else None,
+                              lambda: worksheet_docx(config, expressions, job.advance if job else None),
+                              DOCX_MIMETYPE, f'{download_name}.docx')
+        
+    questions = enumerate(expressions, 1)
+    if job:
+        questions = job.track(questions)
+    if format_type == 'xlsx':
+        # 题目表的答案列留空供用户填写，参考答案放在第二个工作表
+        return _cached_export(
+            export_key('xlsx', XLSX_LAYOUT_VERSION, answers) if seeded else None,
+            lambda: stream_xlsx([
+                Sheet('口算练习', ['序号', '算式', '答案'], [8, 30, 12],
+                      ([idx, expr['expression_text'], None] for idx, expr in questions)),
+                Sheet('参考答案', ['序号', '算式', '答案'], [8, 30, 12],
+                      ([idx, expr['expression_text'], round(expr['answer'], 2)]
+                       for idx, expr in enumerate(expressions, 1)))
+            ]),
+            XLSX_MIMETYPE, f'{download_name}.xlsx')
+        
+    # CSV 格式：表头添加答案列，答案列留空供用户填写；逐块编码输出，不再保留整份 CSV 的副本
+    rows = ([idx, expr['expression_text'], ''] for idx, expr in questions)
+    return _cached_export(export_key('csv', CSV_LAYOUT_VERSION, answers) if seeded else None,
+                          lambda: stream_csv(['序号', '算式', '答案'], rows,
+                                             current_app.config['EXPORT_CSV_CHUNK_SIZE']),
+                          CSV_MIMETYPE, f'{download_name}.csv')
+
 @main.route('/api/expressions/export', methods=['POST'])
 def export_expressions():
-    """导出题目"""
+    """导出题目
+
+    async=true 时题目生成和文件渲染由后台任务完成，通过 /api/jobs/<job_id> 查询进度并下载。
+    """
     try:
         data = request.get_json()
         format_type = data.get('format', 'csv')
@@ -957,92 +1487,46 @@ def export_expressions():
             selected_operators=config['operators'],
             operator_count=config['operator_count'],
             min_number=config['min_number'],
-            max_number=config['max_number']
-        )
-        expressions = generator.generate_expressions(
-            count=config['total_expressions'],
-            bracket_count=config.get('bracket_expressions', 0)
+            max_number=config['max_number'],
+            strategy='auto'
         )
+        capacity_error = generator.capacity_error(config['total_expressions'], config.get('bracket_expressions', 0))
+        if capacity_error:
+            return jsonify({"error": capacity_error}), 400
+        seed, seed_error = _parse_seed(config.get('seed'))
+        if seed_error:
+            return jsonify({"error": seed_error}), 400
+        config = dict(config, seed=seed)
         
-        if format_type == 'docx':
-            # Word格式保持不变，包含答案页
-            doc = Document()
-            doc.styles['Normal'].font.name = '宋体'
-            doc.styles['Normal']._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
-            
-            title = doc.add_heading('口算练习', 0)
-            title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-            info = doc.add_paragraph()
-            info.add_run('练习配置：\n').bold = True
-            info.add_run(f'题目数量：{config["total_expressions"]} 道\n')
-            if config.get('bracket_expressions', 0) > 0:
-                info.add_run(f'括号题目：{config["bracket_expressions"]} 道\n')
-            info.add_run(f'运算符：{", ".join(config["operators"])}\n')
-            info.add_run(f'数值范围：{config["min_number"]} - {config["max_number"]}\n')
-            
-            doc.add_paragraph()
-            
-            # 题目页
-            for i in range(0, len(expressions), 2):
-                p = doc.add_paragraph()
-                p.add_run(f'{i+1}. {expressions[i]["expression_text"]} = ').bold = True
-                p.add_run('_' * 8)
-                if i + 1 < len(expressions):
-                    p.add_run('\t\t')
-                    p.add_run(f'{i+2}. {expressions[i+1]["expression_text"]} = ').bold = True
-                    p.add_run('_' * 8)
-            
-            # 答案页
-            doc.add_page_break()
-            answer_title = doc.add_heading('参考答案', 0)
-            answer_title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-            for i in range(0, len(expressions), 4):
-                p = doc.add_paragraph()
-                for j in range(4):
-                    if i + j < len(expressions):
-                        p.add_run(f'{i+j+1}. {round(expressions[i+j]["answer"], 2)}\t\t')
-            
-            docx_buffer = BytesIO()
-            doc.save(docx_buffer)
-            docx_buffer.seek(0)
-            
-            return send_file(
-                docx_buffer,
-                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                as_attachment=True,
-                download_name=f'口算练习_{datetime.now(Config.CHINA_TZ).strftime("%Y%m%d")}.docx'
-            )
-            
-        else:  # CSV 格式
-            output = StringIO()
-            writer = csv.writer(output)
-            
-            # 写入表头 - 添加答案列
-            writer.writerow(['序号', '算式', '答案'])
-            
-            # 写入数据 - 答案列留空
-            for idx, expr in enumerate(expressions, 1):
-                writer.writerow([
-                    idx,
-                    expr['expression_text'],
-                    ''  # 空的答案列供用户填写
-                ])
-            
-            csv_data = output.getvalue().encode('utf-8-sig')
-            
-            return send_file(
-                BytesIO(csv_data),
-                mimetype='text/csv;charset=utf-8',
-                as_attachment=True,
-                download_name=f'口算练习_{datetime.now(Config.CHINA_TZ).strftime("%Y%m%d")}.csv'
-            )
+        if data.get('async'):
+            return _export_job_response(
+                lambda job: _render_expressions(generator, config, format_type, job), config['total_expressions'])
+        return _export_response(*_render_expressions(generator, config, format_type))
 
     except Exception as e:
         current_app.logger.error(f"Error exporting expressions: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@main.route('/api/jobs/<job_id>')
+def get_export_job(job_id):
+    """查询导出任务
+
+    排队或执行中返回 202 和进度；失败返回错误信息；完成后直接下载结果文件，支持 Range 断点续传。
+    """
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Export job not found or expired"}), 404
+    if job.status == 'failed':
+        return jsonify(job.to_dict()), 500
+    if job.status != 'done':
+        return jsonify(job.to_dict()), 202
+    try:
+        return send_file(job.path, mimetype=job.mimetype, as_attachment=True,
+                         download_name=job.download_name, conditional=True)
+    except FileNotFoundError:
+        # 结果文件已过期被清理
+        return jsonify({"error": "Export job not found or expired"}), 404
+
 @main.route('/api/expressions/import', methods=['POST'])
 def import_expressions():
     """导入题目及答案"""
@@ -1088,6 +1572,8 @@ def import_expressions():
         db.session.flush()
 
         # 处理每一行数据
+        imported_answers = []
+        imported_date = today()
         for row in rows:
             try:
                 expression_text = row['算式'].strip()
@@ -1097,15 +1583,14 @@ def import_expressions():
                     continue
                     
                 # 计算正确答案
-                correct_answer = eval(expression_text.replace('×', '*').replace('÷', '/'))
+                correct_answer = to_number(evaluate(expression_text))
                 
                 # 创建表达式记录
                 expression = Expression(
                     exercise_set_id=exercise_set.exercise_set_id,
                     expression_text=expression_text,
                     answer=correct_answer,
-                    has_brackets='(' in expression_text,
-                    operator_count=sum(1 for c in expression_text if c in '+-×÷')
+                    **expression_features(expression_text)
                 )
                 db.session.add(expression)
                 db.session.flush()
@@ -1120,10 +1605,18 @@ def import_expressions():
                             expression_id=expression.expression_id,
                             user_answer=user_answer_float,
                             is_correct=is_correct,
-                            answer_time=0
+                            answer_time=0,
+                            local_date=imported_date
                         )
                         db.session.add(answer_record)
                         db.session.flush()
+                        imported_answers.append({
+                            'expression_id': expression.expression_id,
+                            'user_answer': user_answer_float,
+                            'is_correct': is_correct,
+                            'answer_time': 0,
+                            'local_date': imported_date
+                        })
                         
                         # 如果答错了，创建错题记录
                         if not is_correct:
@@ -1139,7 +1632,11 @@ def import_expressions():
                 current_app.logger.error(f"处理行数据失败: {str(e)}")
                 continue  # 跳过处理失败的行
                 
+        insert_user_mistakes(Expression.exercise_set_id == exercise_set.exercise_set_id)
+        record_wrong_answers(imported_answers)
+        update_answer_rollups(imported_answers)
         db.session.commit()
+        stats_cache.bump(user_id)
         
         return jsonify({
             "message": "导入成功",
@@ -0,0 +1,152 @@
+from typing import Callable, Dict, List, Optional
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SegmentHandler = Callable[[str, List[Dict]], None]
+
+
+class AnswerLog:
+    """答题记录的预写日志（write-behind）
+
+    批改后的答题记录先追加到本地日志文件，fsync 之后即可返回结果；并发提交共用同一次 fsync。
+    后台线程定期把日志切分为待写入分段，交给 handler 批量写入数据库，写入成功后删除分段文件。
+    进程崩溃后，重启时先把遗留的日志和分段写入数据库。
+
+    日志在处理第一个请求（或第一次追加）时才打开，遗留日志的切分和重放、后台线程也在这时开始：
+    init_db.py 等脚本和调试模式下的重载监视进程同样会创建应用，但不会改动正在使用的日志。
+    日志文件只能由一个进程使用，WEB_WORKERS 大于1时不启用预写日志。
+    """
+
+    def __init__(self, app=None, handler: Optional[SegmentHandler] = None):
+        self.lock = threading.Condition()
+        self.wakeup = threading.Event()
+        self.enabled = False
+        self.file = None
+        self.thread: Optional[threading.Thread] = None
+        self.written = 0  # 已写入文件的提交数
+        self.synced = 0  # 已 fsync 的提交数
+        self.syncing = False
+        self.start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, handler)
+
+    def init_app(self, app, handler: SegmentHandler):
+        self.enabled = app.config.get('ANSWER_LOG_ENABLED', False)
+        self.path = app.config.get('ANSWER_LOG_PATH')
+        self.flush_interval = app.config.get('ANSWER_LOG_FLUSH_INTERVAL', 1)
+        self.app = app
+        self.handler = handler
+        if self.enabled and app.config.get('WEB_WORKERS', 1) > 1:
+            logger.warning("Answer log disabled: one log file cannot be shared by multiple workers")
+            self.enabled = False
+        if self.enabled:
+            app.before_request(self._start)
+
+    def _start(self):
+        """打开日志并启动后台线程（只执行一次）；上次运行遗留的日志先转为待写入分段，由后台线程重放"""
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is not None:
+                return
+            with self.lock:
+                self._rotate()
+                self.file = open(self.path, 'ab')
+            self.thread = threading.Thread(target=self._flush_loop, name='answer-log', daemon=True)
+            self.thread.start()
+
+    def append(self, rows: List[Dict]):
+        """追加一次提交的答题记录，返回时内容已落盘"""
+        self._start()
+        line = json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.written += 1
+            sequence = self.written
+            # 组提交：由一个线程执行 fsync，等待中的提交都以这次 fsync 为准
+            while self.synced < sequence:
+                if self.syncing:
+                    self.lock.wait()
+                    continue
+                self.syncing = True
+                target, file = self.written, self.file
+                self.lock.release()
+                try:
+                    os.fsync(file.fileno())
+                finally:
+                    self.lock.acquire()
+                    self.syncing = False
+                    self.lock.notify_all()
+                self.synced = max(self.synced, target)
+
+    def flush(self):
+        """把当前日志切分为分段并写入数据库"""
+        self._start()
+        with self.lock:
+            while self.syncing:
+                self.lock.wait()
+            if self.file.tell():
+                # 旧文件中尚未 fsync 的提交随切分一起落盘
+                os.fsync(self.file.fileno())
+                self.synced = self.written
+                self.lock.notify_all()
+                self.file.close()
+                self._rotate()
+                self.file = open(self.path, 'ab')
+        for segment_path in self._pending_segments():
+            self._apply(segment_path)
+
+    def _rotate(self):
+        """把日志文件重命名为待写入分段（调用方持有锁）"""
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return
+        os.replace(self.path, f"{self.path}.{uuid.uuid4().hex}.pending")
+        self._sync_directory()
+
+    def _sync_directory(self):
+        """重命名后同步目录项，保证分段文件名落盘（Windows 不支持，忽略）"""
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _pending_segments(self) -> List[str]:
+        return sorted(glob.glob(f"{glob.escape(self.path)}.*.pending"), key=os.path.getmtime)
+
+    def _apply(self, segment_path: str):
+        """把一个分段写入数据库；handler 以分段ID去重，重复写入同一分段不会产生重复记录"""
+        segment_id = segment_path[len(self.path) + 1:-len('.pending')]
+        rows = []
+        with open(segment_path, 'rb') as f:
+            for line in f:
+                try:
+                    rows.extend(json.loads(line))
+                except ValueError:
+                    # 崩溃时写了一半的最后一行，这次提交没有返回成功，直接丢弃
+                    logger.warning(f"Skipping torn line in answer log segment {segment_id}")
+        with self.app.app_context():
+            self.handler(segment_id, rows)
+        os.remove(segment_path)
+        logger.info(f"Flushed {len(rows)} answer records from answer log segment {segment_id}")
+
+    def _flush_loop(self):
+        while True:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing answer log: {e}")
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
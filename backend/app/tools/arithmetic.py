@@ -0,0 +1,253 @@
+from fractions import Fraction
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import re
+
+# 运算符别名：界面符号和 Python 符号都映射到内部符号
+OPERATOR_ALIASES = {'+': '+', '-': '-', '×': '*', '÷': '/', '*': '*', '/': '/'}
+DISPLAY_OPERATORS = {'+': '+', '-': '-', '*': '×', '/': '÷'}
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2}
+NEGATE = '~'  # 一元负号在 RPN 中的表示
+# 运算符位掩码：题目包含的运算符按位或
+OPERATOR_BITS = {'+': 1, '-': 2, '*': 4, '/': 8}
+
+_TOKEN_RE = re.compile(r'\s*(?:(\d+(?:\.\d+)?)|(\S))')
+
+Number = Union[int, Fraction]
+Token = Union[Number, str]
+
+
+class ExpressionError(ValueError):
+    """表达式无法解析或计算"""
+
+
+def tokenize(text: str) -> List[Token]:
+    """把表达式文本切分为数字和符号，数字转换为 int 或 Fraction"""
+    tokens: List[Token] = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match:
+            break
+        number, symbol = match.groups()
+        if number is not None:
+            tokens.append(Fraction(number) if '.' in number else int(number))
+        elif symbol in OPERATOR_ALIASES:
+            tokens.append(OPERATOR_ALIASES[symbol])
+        elif symbol in '()':
+            tokens.append(symbol)
+        else:
+            raise ExpressionError(f"Unexpected character: {symbol}")
+        position = match.end()
+    return tokens
+
+
+def to_rpn(tokens: Sequence[Token]) -> Tuple[Token, ...]:
+    """调度场算法：把中缀记号序列转换为逆波兰序列"""
+    output: List[Token] = []
+    stack: List[str] = []
+    expect_operand = True
+
+    for token in tokens:
+        if not isinstance(token, str):
+            if not expect_operand:
+                raise ExpressionError("Missing operator between numbers")
+            output.append(token)
+            expect_operand = False
+        elif token == '(':
+            if not expect_operand:
+                raise ExpressionError("Missing operator before '('")
+            stack.append(token)
+        elif token == ')':
+            if expect_operand:
+                raise ExpressionError("Missing number before ')'")
+            while stack and stack[-1] != '(':
+                output.append(stack.pop())
+            if not stack:
+                raise ExpressionError("Unbalanced brackets")
+            stack.pop()
+        elif expect_operand:
+            # 数字或左括号前的负号/正号视为一元运算
+            if token == '-':
+                stack.append(NEGATE)
+            elif token != '+':
+                raise ExpressionError(f"Missing number before '{token}'")
+        else:
+            while stack and stack[-1] != '(' and (
+                    stack[-1] == NEGATE or PRECEDENCE[stack[-1]] >= PRECEDENCE[token]):
+                output.append(stack.pop())
+            stack.append(token)
+            expect_operand = True
+
+    if expect_operand:
+        raise ExpressionError("Expression is incomplete")
+    while stack:
+        token = stack.pop()
+        if token == '(':
+            raise ExpressionError("Unbalanced brackets")
+        output.append(token)
+    return tuple(output)
+
+
+def evaluate_rpn(rpn: Sequence[Token]) -> Number:
+    """按精确分数运算求值，能整除时保持 int 以减少 Fraction 开销"""
+    stack: List[Number] = []
+    for token in rpn:
+        if not isinstance(token, str):
+            stack.append(token)
+            continue
+        if token == NEGATE:
+            stack[-1] = -stack[-1]
+            continue
+        right = stack.pop()
+        left = stack[-1]
+        if token == '+':
+            stack[-1] = left + right
+        elif token == '-':
+            stack[-1] = left - right
+        elif token == '*':
+            stack[-1] = left * right
+        else:
+            if right == 0:
+                raise ExpressionError("Division by zero")
+            if isinstance(left, int) and isinstance(right, int) and left % right == 0:
+                stack[-1] = left // right
+            else:
+                stack[-1] = Fraction(left) / right
+
+    result = stack[0]
+    if isinstance(result, Fraction) and result.denominator == 1:
+        return int(result)
+    return result
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(text: str) -> Tuple[Token, ...]:
+    """解析表达式文本（结果缓存），返回逆波兰序列"""
+    return to_rpn(tokenize(text))
+
+
+def evaluate(text: str) -> Number:
+    """计算表达式文本的精确值"""
+    return evaluate_rpn(compile_expression(text))
+
+
+def chain_tokens(numbers: Sequence[int], operators: Sequence[str],
+                 bracket: Optional[Tuple[int, int]] = None) -> List[Token]:
+    """由数字和运算符直接构建记号序列，bracket 为括号包住的首尾数字下标"""
+    tokens: List[Token] = []
+    for i, number in enumerate(numbers):
+        if bracket and i == bracket[0]:
+            tokens.append('(')
+        tokens.append(number)
+        if bracket and i == bracket[1]:
+            tokens.append(')')
+        if i < len(operators):
+            tokens.append(OPERATOR_ALIASES[operators[i]])
+    return tokens
+
+
+def chain_rpn(numbers: Sequence[int], operators: Sequence[str],
+              bracket: Optional[Tuple[int, int]] = None) -> Tuple[Token, ...]:
+    """不经过文本，直接得到算式的逆波兰序列"""
+    return to_rpn(chain_tokens(numbers, operators, bracket))
+
+
+def format_chain(numbers: Sequence[int], operators: Sequence[str],
+                 bracket: Optional[Tuple[int, int]] = None) -> str:
+    """生成界面使用的算式文本，如 "( 3 + 4 ) × 5" """
+    return ' '.join(
+        DISPLAY_OPERATORS.get(token, token) if isinstance(token, str) else str(token)
+        for token in chain_tokens(numbers, operators, bracket)
+    )
+
+
+def canonical_text(text: str) -> str:
+    """表达式的规范文本：统一空白和运算符写法，如 "3+4*5" 与 "3 + 4 × 5" 得到相同结果"""
+    try:
+        tokens = tokenize(text)
+    except ExpressionError:
+        return ' '.join(text.split())
+    return ' '.join(
+        DISPLAY_OPERATORS.get(token, token) if isinstance(token, str) else str(to_number(token))
+        for token in tokens
+    )
+
+
+def difficulty_of(has_brackets: bool, operator_count: int) -> str:
+    """题目难度：含括号或三个及以上运算符为 hard，两个运算符为 medium，其余为 simple"""
+    if has_brackets or operator_count >= 3:
+        return 'hard'
+    if operator_count == 2:
+        return 'medium'
+    return 'simple'
+
+
+def operator_symbols(operator_mask: int) -> str:
+    """位掩码对应的运算符，按 + - × ÷ 的顺序排列，如 5 -> "+×" """
+    return ''.join(DISPLAY_OPERATORS[op] for op, bit in OPERATOR_BITS.items() if operator_mask & bit)
+
+
+def expression_features(text: str) -> Dict[str, Union[bool, int, str]]:
+    """解析表达式文本，得到写入 Expression 的特征列
+
+    operator_count 只统计二元运算符，operator_mask 为运算符位掩码，digit_count 为操作数的最大位数。
+    """
+    try:
+        tokens = tokenize(text)
+    except ExpressionError:
+        tokens = []
+    operator_count = 0
+    operator_mask = 0
+    digit_count = 0
+    expect_operand = True
+    for token in tokens:
+        if not isinstance(token, str):
+            digit_count = max(digit_count, len(str(abs(int(token)))))
+            expect_operand = False
+        elif token == ')':
+            expect_operand = False
+        elif token != '(' and not expect_operand:
+            operator_count += 1
+            operator_mask |= OPERATOR_BITS[token]
+            expect_operand = True
+    has_brackets = '(' in text
+    return {
+        'has_brackets': has_brackets,
+        'operator_count': operator_count,
+        'operator_mask': operator_mask,
+        'digit_count': digit_count,
+        'difficulty': difficulty_of(has_brackets, operator_count)
+    }
+
+
+def to_number(value: Number) -> Union[int, float]:
+    """把精确结果转换为可写入数据库和 JSON 的数值"""
+    if isinstance(value, Fraction):
+        return int(value) if value.denominator == 1 else float(value)
+    return value
+
+
+if __name__ == "__main__":
+    # 单个候选算式的计算开销对比：原 eval 路径 vs 直接构建逆波兰序列
+    import timeit
+
+    numbers, operators = [12, 3, 4, 6], ['+', '*', '-']
+    display = format_chain(numbers, operators)
+
+    def eval_path():
+        text = ' '.join([str(numbers[0]), '+', str(numbers[1]), '×', str(numbers[2]), '-', str(numbers[3])])
+        return eval(text.replace('×', '*').replace('÷', '/'))
+
+    def compiled_path():
+        return evaluate_rpn(chain_rpn(numbers, operators))
+
+    def parse_path():
+        return evaluate_rpn(to_rpn(tokenize(display)))
+
+    assert eval_path() == compiled_path() == parse_path()
+    rounds = 20000
+    for name, func in [('eval', eval_path), ('chain_rpn', compiled_path), ('parse text', parse_path)]:
+        seconds = min(timeit.repeat(func, number=rounds, repeat=5))
+        print(f"{name:>10}: {seconds / rounds * 1e6:.2f} us/candidate")
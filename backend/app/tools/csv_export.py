@@ -0,0 +1,41 @@
+from io import StringIO
+from typing import Iterable, Iterator, Sequence
+from urllib.parse import quote
+import codecs
+import csv
+
+from flask import Response, stream_with_context
+
+CSV_MIMETYPE = 'text/csv;charset=utf-8'
+# 版式版本号：输出格式有变化时加一，已缓存的导出文件随之失效
+LAYOUT_VERSION = 1
+
+
+def stream_csv(header: Sequence, rows: Iterable[Sequence], chunk_size: int = 65536) -> Iterator[bytes]:
+    """逐块生成 CSV 内容：先输出 UTF-8 BOM（Excel 据此识别编码），之后每积累约 chunk_size 个字符编码输出一次"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    yield codecs.BOM_UTF8
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def attachment_response(chunks: Iterable[bytes], mimetype: str, download_name: str) -> Response:
+    """以流式响应下载文件，chunks 可以是逐行读取数据库的生成器，内存占用与导出大小无关
+
+    生成器在请求上下文中执行，可以继续使用数据库会话。
+    """
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    # 中文文件名按 RFC 5987 编码，旧浏览器使用 ASCII 的备用文件名
+    extension = download_name.rsplit('.', 1)[-1]
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename=export.{extension}; filename*=UTF-8''{quote(download_name)}")
+    return response
+
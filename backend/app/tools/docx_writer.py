@@ -0,0 +1,222 @@
+from io import RawIOBase
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+import re
+import zipfile
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+# 版式版本号：输出格式有变化时加一，已缓存的导出文件随之失效
+LAYOUT_VERSION = 1
+
+# 以下部件与 python-docx 默认模板的版式一致（页面尺寸、页边距、默认制表位、标题样式），
+# 只保留导出文档用到的部分；正文由预先编排好的 WordprocessingML 片段拼接而成。
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '<Override PartName="/word/settings.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.settings+xml"/>'
+    '</Types>'
+)
+_PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/settings" Target="settings.xml"/>'
+    '</Relationships>'
+)
+_SETTINGS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:settings xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:defaultTabStop w:val="720"/>'
+    '<w:characterSpacingControl w:val="doNotCompress"/>'
+    '<w:compat><w:useFELayout/></w:compat>'
+    '</w:settings>'
+)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:docDefaults>'
+    '<w:rPrDefault><w:rPr><w:rFonts w:ascii="Cambria" w:hAnsi="Cambria" w:eastAsia="宋体" w:cs="Times New Roman"/>'
+    '<w:sz w:val="22"/><w:szCs w:val="22"/><w:lang w:val="en-US" w:eastAsia="zh-CN" w:bidi="ar-SA"/></w:rPr>'
+    '</w:rPrDefault>'
+    '<w:pPrDefault><w:pPr><w:spacing w:after="200" w:line="276" w:lineRule="auto"/></w:pPr></w:pPrDefault>'
+    '</w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/>'
+    '<w:rPr><w:rFonts w:ascii="宋体" w:hAnsi="宋体" w:eastAsia="宋体"/>{normal_size}</w:rPr></w:style>'
+    '<w:style w:type="character" w:default="1" w:styleId="DefaultParagraphFont">'
+    '<w:name w:val="Default Paragraph Font"/><w:uiPriority w:val="1"/><w:semiHidden/><w:unhideWhenUsed/>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>'
+    '<w:next w:val="Normal"/><w:uiPriority w:val="10"/><w:qFormat/>'
+    '<w:pPr><w:pBdr><w:bottom w:val="single" w:sz="8" w:space="4" w:color="4F81BD"/></w:pBdr>'
+    '<w:spacing w:after="300" w:line="240" w:lineRule="auto"/><w:contextualSpacing/></w:pPr>'
+    '<w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri" w:eastAsia="宋体" w:cs="Times New Roman"/>'
+    '<w:color w:val="17365D"/><w:spacing w:val="5"/><w:kern w:val="28"/>'
+    '<w:sz w:val="52"/><w:szCs w:val="52"/></w:rPr></w:style>'
+    '</w:styles>'
+)
+_DOCUMENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><w:body>'
+)
+_DOCUMENT_TAIL = (
+    '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/>'
+    '<w:pgMar w:top="1440" w:right="1800" w:bottom="1440" w:left="1800" w:header="720" w:footer="720" w:gutter="0"/>'
+    '<w:cols w:space="720"/><w:docGrid w:linePitch="360"/></w:sectPr>'
+    '</w:body></w:document>'
+)
+
+# 正文片段，{} 处填入已转义的文本
+_TITLE = '<w:p><w:pPr><w:pStyle w:val="Title"/><w:jc w:val="center"/></w:pPr><w:r><w:t>{}</w:t></w:r></w:p>'
+_BOLD = '<w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">{}</w:t></w:r>'
+_TEXT = '<w:r><w:t xml:space="preserve">{}</w:t></w:r>'
+_EMPTY = '<w:p/>'
+_PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+_BLANK = '<w:r><w:t>________</w:t></w:r>'
+_TABS = '<w:r><w:tab/><w:tab/></w:r>'
+_QUESTION = _BOLD.format('{}. {} = ') + _BLANK
+_ANSWER = '<w:r><w:t xml:space="preserve">{}. {}</w:t><w:tab/><w:tab/></w:r>'
+_MISTAKE = (
+    '<w:p>' + _BOLD.format('{}. ') + _TEXT.format('算式：{}') + '</w:p>'
+    '<w:p><w:r><w:rPr><w:b/></w:rPr><w:br/><w:t>正确答案：</w:t></w:r>' + _TEXT
+    + _BOLD.format('   你的答案：') + _TEXT + _BOLD.format('   错误次数：') + _TEXT + '</w:p>'
+)
+_SEPARATOR = '<w:p><w:r><w:t>' + '—' * 50 + '</w:t></w:r></w:p>'
+
+
+class _ChunkSink(RawIOBase):
+    """zipfile 的输出目标：写入的数据暂存起来，由生成器逐块取走（不可 seek，zipfile 会使用数据描述符）"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _runs(text: str, bold: bool = False) -> str:
+    """与 python-docx 的 add_run 相同：换行转为 <w:br/>，制表符转为 <w:tab/>"""
+    parts = []
+    for piece in re.split(r'([\t\n])', text):
+        if piece == '\n':
+            parts.append('<w:br/>')
+        elif piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece:
+            parts.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+    return f"<w:r>{'<w:rPr><w:b/></w:rPr>' if bold else ''}{''.join(parts)}</w:r>"
+
+
+def stream_docx(body: Iterable[str], normal_size: Optional[int] = None,
+                chunk_size: int = 65536) -> Iterator[bytes]:
+    """把正文片段写入 DOCX 压缩包并逐块输出，整份文档不会同时保存在内存中
+
+    normal_size 为正文默认字号（磅），None 时使用模板默认值。
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        package.writestr('_rels/.rels', _PACKAGE_RELS)
+        package.writestr('word/_rels/document.xml.rels', _DOCUMENT_RELS)
+        package.writestr('word/settings.xml', _SETTINGS)
+        package.writestr('word/styles.xml', _STYLES.format(
+            normal_size=f'<w:sz w:val="{normal_size * 2}"/>' if normal_size else ''))
+        yield sink.drain()
+        with package.open('word/document.xml', 'w') as document:
+            pending, size = [_DOCUMENT_HEAD], 0
+            for fragment in body:
+                pending.append(fragment)
+                size += len(fragment)
+                if size >= chunk_size:
+                    document.write(''.join(pending).encode('utf-8'))
+                    pending, size = [], 0
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            pending.append(_DOCUMENT_TAIL)
+            document.write(''.join(pending).encode('utf-8'))
+    yield sink.drain()
+
+
+Progress = Optional[Callable[[int], None]]
+
+
+def worksheet_body(config: Dict, expressions: Sequence[Dict], progress: Progress = None) -> Iterator[str]:
+    """口算练习：题目每行两道，答案页每行四个（与原 python-docx 版式相同）
+
+    progress 在题目页每写完一行时以本行的题目数调用。
+    """
+    yield _TITLE.format('口算练习')
+    info = f'题目数量：{config["total_expressions"]} 道\n'
+    if config.get('bracket_expressions', 0) > 0:
+        info += f'括号题目：{config["bracket_expressions"]} 道\n'
+    info += f'运算符：{", ".join(config["operators"])}\n'
+    info += f'数值范围：{config["min_number"]} - {config["max_number"]}\n'
+    yield f"<w:p>{_runs('练习配置：' + chr(10), bold=True)}{_runs(info)}</w:p>"
+    yield _EMPTY
+
+    # 题目页
+    for i in range(0, len(expressions), 2):
+        row = _QUESTION.format(i + 1, escape(expressions[i]['expression_text']))
+        if i + 1 < len(expressions):
+            row += _TABS + _QUESTION.format(i + 2, escape(expressions[i + 1]['expression_text']))
+        yield f'<w:p>{row}</w:p>'
+        if progress:
+            progress(min(2, len(expressions) - i))
+
+    # 答案页
+    yield _PAGE_BREAK
+    yield _TITLE.format('参考答案')
+    for i in range(0, len(expressions), 4):
+        yield '<w:p>' + ''.join(_ANSWER.format(j + 1, round(expressions[j]['answer'], 2))
+                                for j in range(i, min(i + 4, len(expressions)))) + '</w:p>'
+
+
+def mistakes_body(mistakes: Sequence[Dict], exported_at: str, progress: Progress = None) -> Iterator[str]:
+    """错题记录：每道错题一段算式、一段答案信息，错题之间用分隔线隔开；progress 每写完一道错题调用一次"""
+    yield _TITLE.format('错题记录')
+    yield f'<w:p>{_runs(f"导出时间：{exported_at}")}</w:p>'
+    yield f'<w:p>{_runs(f"错题数量：{len(mistakes)} 道")}</w:p>'
+    yield _EMPTY
+    for idx, mistake in enumerate(mistakes, 1):
+        yield _MISTAKE.format(idx, escape(mistake['expression']), mistake['correct_answer'],
+                              round(mistake['user_answer'], 2), mistake['error_count'])
+        if idx < len(mistakes):
+            yield _SEPARATOR
+        if progress:
+            progress(1)
+
+
+def worksheet_docx(config: Dict, expressions: Sequence[Dict], progress: Progress = None) -> Iterator[bytes]:
+    return stream_docx(worksheet_body(config, expressions, progress))
+
+
+def mistakes_docx(mistakes: Sequence[Dict], exported_at: str, progress: Progress = None) -> Iterator[bytes]:
+    # 原 python-docx 版本设置答案段落字号时修改的是 Normal 样式，整篇正文都是 10 磅
+    return stream_docx(mistakes_body(mistakes, exported_at, progress), normal_size=10)
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def export_key(format_type: str, layout_version: int, *parts: Iterable) -> str:
+    """导出文件的缓存键：格式、版式版本号和决定文件内容的各部分数据（逐行序列化后求 SHA-256）"""
+    digest = hashlib.sha256(json.dumps([format_type, layout_version]).encode('utf-8'))
+    for part in parts:
+        digest.update(b'\x1e')
+        for row in part:
+            digest.update(json.dumps(row, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """已渲染导出文件的本地磁盘缓存
+
+    文件以缓存键命名保存在 EXPORT_CACHE_DIR 中，总大小超过 EXPORT_CACHE_MAX_BYTES 时删除最久未用的文件。
+    命中时更新文件的修改时间，重启后按修改时间恢复使用顺序。
+    写入中的文件以 .part 结尾，超过 EXPORT_CACHE_STALE_PART_AGE 秒未更新的才视为中断遗留并删除，
+    多个进程共用同一目录时不会删除其他进程正在写入的文件。
+    """
+
+    def __init__(self, app=None):
+        self.entries: 'OrderedDict[str, int]' = OrderedDict()  # 缓存键 -> 文件大小，按使用顺序排列
+        self.size = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('EXPORT_CACHE_ENABLED', True)
+        self.directory = app.config.get('EXPORT_CACHE_DIR')
+        self.max_bytes = app.config.get('EXPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+        stale_part_age = app.config.get('EXPORT_CACHE_STALE_PART_AGE', 3600)
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for path in glob.glob(os.path.join(glob.escape(self.directory), '*')):
+            try:
+                stat = os.stat(path)
+                if not path.endswith('.part'):
+                    files.append((stat.st_mtime, os.path.basename(path), stat.st_size))
+                elif stat.st_mtime < time.time() - stale_part_age:
+                    # 中断的写入留下的文件
+                    os.remove(path)
+            except OSError:
+                # 其他进程已经改名或删除
+                pass
+        with self.lock:
+            for _, key, size in sorted(files):
+                self.entries[key] = size
+                self.size += size
+            self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[str]:
+        """命中时返回缓存文件的路径"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        with self.lock:
+            if key not in self.entries:
+                # 其他进程共用同一目录时写入的文件
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    return None
+                self.entries[key] = size
+                self.size += size
+            self.entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            # 已被其他进程淘汰
+            with self.lock:
+                self._discard(key)
+            return None
+        return path
+
+    def store(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """原样输出 chunks，同时写入缓存；输出完整结束后文件才进入缓存，中途断开则丢弃"""
+        if not self.enabled:
+            yield from chunks
+            return
+        path = self._path(key)
+        part = f"{path}.{uuid.uuid4().hex}.part"
+        size, complete = 0, False
+        try:
+            output = open(part, 'wb')
+        except OSError as e:
+            logger.error(f"Error writing export cache {key}: {e}")
+            output = None
+        try:
+            for chunk in chunks:
+                if output is not None:
+                    try:
+                        output.write(chunk)
+                        size += len(chunk)
+                    except OSError as e:
+                        # 磁盘写满等错误只放弃缓存，不影响下载
+                        logger.error(f"Error writing export cache {key}: {e}")
+                        output.close()
+                        output = None
+                yield chunk
+            complete = output is not None and size <= self.max_bytes
+        finally:
+            if output is not None:
+                output.close()
+            if complete:
+                try:
+                    os.replace(part, path)
+                except OSError as e:
+                    # 临时文件被其他进程删除等，按未缓存处理，下载已经完成
+                    logger.warning(f"Export cache file {key} was not stored: {e}")
+                    complete = False
+            if complete:
+                with self.lock:
+                    self._discard(key)
+                    self.entries[key] = size
+                    self.size += size
+                    self._evict()
+            else:
+                try:
+                    os.remove(part)
+                except OSError:
+                    pass
+
+    def _discard(self, key: str):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.size -= size
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
@@ -0,0 +1,191 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+import glob
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# 渲染函数返回 (文件内容的分块或已渲染好的文件路径, MIME 类型, 下载文件名)
+Render = Callable[['ExportJob'], Tuple[Union[Iterable[bytes], str], str, str]]
+
+
+class JobQueueFull(Exception):
+    """排队中的导出任务已达上限"""
+
+
+class ExportJob:
+    """一个导出任务的状态：queued -> running -> done / failed"""
+
+    def __init__(self, job_id: str, total: Optional[int] = None):
+        self.job_id = job_id
+        self.status = 'queued'
+        self.progress = 0  # 已处理的行数（题目数、错题数或练习记录数）
+        self.total = total
+        self.error: Optional[str] = None
+        self.mimetype: Optional[str] = None
+        self.download_name: Optional[str] = None
+        self.path: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def advance(self, count: int = 1):
+        self.progress += count
+
+    def track(self, rows: Iterable) -> Iterator:
+        """逐行经过时累计进度"""
+        for row in rows:
+            self.progress += 1
+            yield row
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'error': self.error,
+            'download_name': self.download_name
+        }
+
+
+class ExportJobs:
+    """本地导出任务
+
+    导出请求提交后立即返回任务ID，由有界的线程池在应用上下文中渲染文件，先写入 .part 临时文件，
+    完成后改名为正式文件并写入同名的 .json 元数据（重启后或其他进程共用同一目录时也能找到结果）。
+    后台线程定期删除超过有效期的结果文件，以及超过有效期未再写入的临时文件（中断的任务留下的）。
+
+    线程池和清理线程在第一次提交任务时才创建，init_db.py 等脚本创建应用时不会启动线程，
+    也不会删除其他进程正在写入的临时文件。
+    """
+
+    def __init__(self, app=None):
+        self.jobs: Dict[str, ExportJob] = {}
+        self.lock = threading.Lock()
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.thread: Optional[threading.Thread] = None
+        self.start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config.get('EXPORT_JOB_DIR')
+        self.workers = app.config.get('EXPORT_JOB_WORKERS', 2)
+        self.max_pending = app.config.get('EXPORT_JOB_MAX_PENDING', 20)
+        self.ttl = app.config.get('EXPORT_JOB_TTL', 3600)
+        self.sweep_interval = app.config.get('EXPORT_JOB_SWEEP_INTERVAL', 60)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _start(self):
+        """创建线程池并启动清理线程（只执行一次）"""
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is not None:
+                return
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export-job')
+            self.thread = threading.Thread(target=self._sweep_loop, name='export-job-sweep', daemon=True)
+            self.thread.start()
+
+    def submit(self, render: Render, total: Optional[int] = None) -> ExportJob:
+        """提交导出任务；排队和执行中的任务超过上限时抛出 JobQueueFull"""
+        self._start()
+        job = ExportJob(uuid.uuid4().hex, total)
+        with self.lock:
+            pending = sum(1 for other in self.jobs.values() if other.status in ('queued', 'running'))
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"Too many export jobs in progress ({pending})")
+            self.jobs[job.job_id] = job
+        self.executor.submit(self._run, job, render)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        return self._load(job_id)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id)
+
+    def _run(self, job: ExportJob, render: Render):
+        job.status = 'running'
+        path = self._path(job.job_id)
+        try:
+            with self.app.app_context():
+                source, job.mimetype, job.download_name = render(job)
+                if isinstance(source, str):
+                    # 导出缓存命中，复制一份，缓存淘汰时不影响任务结果
+                    shutil.copyfile(source, f"{path}.part")
+                    job.progress = job.total or job.progress
+                else:
+                    with open(f"{path}.part", 'wb') as f:
+                        for chunk in source:
+                            f.write(chunk)
+            os.replace(f"{path}.part", path)
+            job.path = path
+            job.status = 'done'
+            with open(f"{path}.json", 'w', encoding='utf-8') as f:
+                json.dump(dict(job.to_dict(), mimetype=job.mimetype), f, ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"Export job {job.job_id} failed: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+            if os.path.exists(f"{path}.part"):
+                os.remove(f"{path}.part")
+        finally:
+            job.finished_at = time.time()
+
+    def _load(self, job_id: str) -> Optional[ExportJob]:
+        """从元数据文件恢复已完成的任务（任务ID只含十六进制字符，不会跳出导出目录）"""
+        if not job_id.isalnum():
+            return None
+        path = self._path(job_id)
+        try:
+            with open(f"{path}.json", encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(path):
+            return None
+        job = ExportJob(job_id, meta.get('total'))
+        job.status = 'done'
+        job.progress = meta.get('progress', 0)
+        job.download_name = meta.get('download_name')
+        job.mimetype = meta.get('mimetype')
+        job.path = path
+        return job
+
+    def sweep(self):
+        """删除超过有效期的结果文件和任务记录
+
+        临时文件在写入期间不断更新修改时间，超过有效期仍未更新的属于已中断的任务（包括其他进程或上次运行的）。
+        """
+        expires = time.time() - self.ttl
+        with self.lock:
+            for job_id, job in list(self.jobs.items()):
+                if job.finished_at is not None and job.finished_at < expires:
+                    del self.jobs[job_id]
+        for path in glob.glob(os.path.join(glob.escape(self.directory), '*')):
+            try:
+                if os.path.getmtime(path) < expires:
+                    os.remove(path)
+            except OSError:
+                # 其他进程已经删除
+                pass
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping export jobs: {e}")
@@ -1,19 +1,72 @@
 import random
-from typing import List, Dict, Tuple, Set
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+from typing import List, Dict, Tuple, Set, Optional
+import hashlib
+import json
 import logging
+import multiprocessing
+from .arithmetic import chain_rpn, evaluate_rpn, format_chain, to_number
+from . import vectorized
 
 logger = logging.getLogger(__name__)
 
+ConfigKey = Tuple[Tuple[str, ...], int, int, int]
+
+
+def _process_context():
+    """并行生成使用的进程启动方式
+
+    Flask 进程中已有题目池、答题日志、导出任务等后台线程，fork 时可能复制其他线程持有的锁导致死锁。
+    优先使用 forkserver：工作进程由单线程的服务进程 fork 出来，服务进程只预加载本模块，不会重新执行
+    启动脚本（run.py 中的 create_app）；不支持 forkserver 的平台使用 spawn。
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def normalize_config(operators: List[str], operator_count: int, min_number: int, max_number: int) -> ConfigKey:
+    """把练习配置规范化：运算符去重排序，数值转为 int"""
+    return (tuple(sorted(set(operators))), int(operator_count), int(min_number), int(max_number))
+
+
+def content_hash(config: ConfigKey, count: int, bracket_count: int, seed: int) -> str:
+    """(规范化配置, 题目数量, 种子) 的内容哈希，相同输入总是得到相同的题目"""
+    payload = json.dumps([list(config[0]), *config[1:], int(count), int(bracket_count), int(seed)],
+                         ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
 class ExpressionGenerator:
     """算术表达式生成器"""
     
-    def __init__(self, selected_operators: List[str], operator_count: int, min_number: int, max_number: int):
+    STRATEGIES = ('rejection', 'constructive', 'enumerate', 'auto')
+    ENGINES = ('python', 'numpy')
+    # 可用组合不超过该数量时，允许穷举全部组合后再抽样
+    ENUMERATE_LIMIT = 200000
+    # 并行生成时每个分片的题目数量
+    PARALLEL_SHARD_SIZE = 2000
+
+    def __init__(self, selected_operators: List[str], operator_count: int, min_number: int, max_number: int,
+                 strategy: str = 'rejection', engine: str = 'python', seed=None):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown generation strategy: {strategy}")
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown generation engine: {engine}")
         self.operator_map = {'+': '+', '-': '-', '×': '*', '÷': '/'}
+        self.selected_operators = list(selected_operators)
         self.operators = [self.operator_map[op] for op in selected_operators]
         self.max_operators = operator_count
         self.min_number = min_number
         self.max_number = max_number
+        self.strategy = strategy
+        self.engine = engine
+        self.seed = seed
+        self.rng = random.Random(seed)  # 每个生成器独立的随机数流，给定 seed 时结果可复现
         self.used_expressions: Set[str] = set()
+        self._capacity: Dict[str, int] = None
 
     def generate_expressions(self, count: int, bracket_count: int) -> List[Dict]:
         """生成指定数量的表达式"""
@@ -27,75 +80,280 @@ class ExpressionGenerator:
             elif self.operators[0] == '/':
                 return self._generate_division_expressions(count)
         
+        if self.engine == 'numpy':
+            return vectorized.generate_mixed_expressions(self, count, bracket_count)
+        
+        strategy = self._resolve_strategy(count, bracket_count)
+        if strategy == 'constructive':
+            return self._generate_constructive_expressions(count, bracket_count)
+        if strategy == 'enumerate':
+            return self._generate_enumerated_expressions(count, bracket_count)
         return self._generate_mixed_expressions(count, bracket_count)
 
+    def _config(self) -> Dict:
+        """重建同样配置的生成器所需的参数（用于子进程）"""
+        return {
+            'selected_operators': self.selected_operators,
+            'operator_count': self.max_operators,
+            'min_number': self.min_number,
+            'max_number': self.max_number,
+            'strategy': self.strategy,
+            'engine': self.engine
+        }
+
+    def generate_expressions_parallel(self, count: int, bracket_count: int, workers: int,
+                                      seed: Optional[int] = None) -> List[Dict]:
+        """用进程池并行生成表达式
+
+        题目按固定大小拆分成分片，每个分片使用由 seed 派生的独立随机数流；分片结果按顺序合并，
+        并与 used_expressions 做全局去重，去重后不足的部分再用派生随机数流补齐。
+        给定 seed 时结果是确定的，与进程数无关。
+        """
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        # 分片数只由题目数量决定，与进程数无关，保证同一 seed 在不同机器上结果一致
+        shards = max(1, count // self.PARALLEL_SHARD_SIZE)
+        if len(self.operators) == 1 or shards == 1:
+            # 单一运算符的无重复抽样本身只与 count 相关，无需拆分
+            expressions = _generate_shard(self._config(), count, bracket_count,
+                                          f"{seed}:0", self.used_expressions)
+            self.used_expressions.update(expr['expression_text'] for expr in expressions)
+            return expressions
+        
+        counts = [count // shards + (1 if i < count % shards else 0) for i in range(shards)]
+        bracket_counts = [bracket_count // shards + (1 if i < bracket_count % shards else 0) for i in range(shards)]
+        used = frozenset(self.used_expressions)
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, shards)), mp_context=_process_context()) as executor:
+            results = list(executor.map(_generate_shard, [self._config()] * shards, counts, bracket_counts,
+                                        [f"{seed}:{i}" for i in range(shards)], [used] * shards))
+        
+        bracketed, plain = [], []
+        for shard in results:
+            for expr in shard:
+                if expr['expression_text'] in self.used_expressions:
+                    continue
+                self.used_expressions.add(expr['expression_text'])
+                (bracketed if expr['has_brackets'] else plain).append(expr)
+        
+        # 跨分片重复被去掉的部分，用派生随机数流在当前进程补齐
+        bracketed = bracketed[:bracket_count]
+        plain = plain[:count - len(bracketed)]
+        missing_bracket = bracket_count - len(bracketed)
+        missing = count - len(bracketed) - len(plain)
+        if missing > 0:
+            logger.info(f"Topping up {missing} expressions removed as cross-shard duplicates")
+            extra = _generate_shard(self._config(), missing, missing_bracket,
+                                    f"{seed}:top-up", self.used_expressions)
+            self.used_expressions.update(expr['expression_text'] for expr in extra)
+            bracketed += [expr for expr in extra if expr['has_brackets']]
+            plain += [expr for expr in extra if not expr['has_brackets']]
+        return bracketed + plain
+
+    def _resolve_strategy(self, count: int, bracket_count: int) -> str:
+        """auto 模式下根据容量选择最快的生成方式"""
+        if self.strategy != 'auto':
+            return self.strategy
+        capacity = self.capacity()
+        # 需求接近容量时随机构造会大量撞重复，组合不多就直接穷举
+        for needed, available in ((count - bracket_count, capacity['plain']),
+                                  (bracket_count, capacity['bracket'])):
+            if needed > 0 and available <= self.ENUMERATE_LIMIT and needed * 2 > available:
+                return 'enumerate'
+        return 'constructive'
+
+    def _bracket_sequences(self) -> List[Tuple[str, ...]]:
+        """括号题可用的运算符序列：强制使用"加减-乘除"的顺序"""
+        mul_div = [op for op in self.operators if op in ['*', '/']]
+        add_sub = [op for op in self.operators if op in ['+', '-']]
+        return [(a, m) for a in add_sub for m in mul_div]
+
+    def _plain_sequences(self) -> List[Tuple[str, ...]]:
+        """不带括号的题目可用的运算符序列（同一运算符最多出现一次）"""
+        sequences = []
+        for operator_count in range(1, min(self.max_operators, len(self.operators)) + 1):
+            sequences.extend(permutations(self.operators, operator_count))
+        return sequences
+
+    def _count_numbers(self, operators: Tuple[str, ...]) -> int:
+        """精确计算运算符序列下合法数字组合的个数，逐位置递推而不枚举
+
+        f(v) 表示以 v 结尾的合法前缀个数：范围内取 base，overrides 中的数字单独记录。
+        """
+        def total(base, overrides):
+            in_range = lambda v: self.min_number <= v <= self.max_number
+            span = max(0, self.max_number - self.min_number + 1)
+            return base * span + sum(c - (base if in_range(v) else 0) for v, c in overrides.items())
+
+        base, overrides = 0, {}
+        for i in range(len(operators) + 1):
+            left = operators[i - 1] if i > 0 else None
+            right = operators[i] if i < len(operators) else None
+            excluded = self._position_exclusions(left, right)
+            if left is None:
+                base, overrides = 1, {}
+            elif left == '-':
+                # 避免相同数字相减：f'(v) = 总数 - f(v)
+                prefixes = total(base, overrides)
+                overrides = {v: prefixes - c for v, c in overrides.items()
+                             if self.min_number <= v <= self.max_number}
+                base = prefixes - base
+            elif left == '/':
+                # 除数 d 的前缀数 = 所有能被 d 整除且不等于 d 的被除数的前缀数之和
+                divided = {}
+                for d in self._divisor_range():
+                    ways = base * self._count_dividends(d)
+                    ways += sum(c - base for v, c in overrides.items()
+                                if self.min_number <= v <= self.max_number and v % d == 0 and v != d)
+                    divided[d] = ways
+                base, overrides = 0, divided
+            else:
+                base, overrides = total(base, overrides), {}
+            for value in excluded:
+                overrides[value] = 0
+        return total(base, overrides)
+
+    def capacity(self) -> Dict[str, int]:
+        """统计当前配置下能生成的不同表达式数量（计数而非生成）"""
+        if self._capacity is None:
+            if len(self.operators) == 1:
+                plain, bracket = self.count_valid_pairs(self.operators[0]), 0
+            else:
+                plain = sum(self._count_numbers(ops) for ops in self._plain_sequences())
+                bracket = sum(self._count_numbers(ops) for ops in self._bracket_sequences())
+            self._capacity = {'total': plain + bracket, 'plain': plain, 'bracket': bracket}
+        return self._capacity
+
+    def capacity_error(self, count: int, bracket_count: int) -> str:
+        """配置无法生成足够多的不同表达式时返回错误说明，否则返回空字符串"""
+        capacity = self.capacity()
+        if len(self.operators) == 1:
+            if count > capacity['plain']:
+                return f"当前配置最多只能生成 {capacity['plain']} 道不同的题目"
+            return ''
+        if bracket_count > capacity['bracket']:
+            return f"当前配置最多只能生成 {capacity['bracket']} 道不同的括号题"
+        if count - bracket_count > capacity['plain']:
+            return f"当前配置最多只能生成 {capacity['plain']} 道不同的无括号题目"
+        return ''
+
     def _generate_multiplication_expressions(self, count: int) -> List[Dict]:
         """生成乘法表达式"""
-        possible_combinations = []
-        for num1 in range(2, self.max_number + 1):  # 从2开始，避免1
-            for num2 in range(2, self.max_number + 1):  # 从2开始，避免1
-                if num1 != 1 and num2 != 1:  # 确保两个数都不是1
-                    possible_combinations.append((num1, num2))
-        
-        if len(possible_combinations) < count:
+        if self.count_valid_pairs('*') < count:
             raise ValueError(
                 f"Cannot generate {count} unique multiplication expressions without using 1.\n"
                 f"Numbers range: {self.min_number} to {self.max_number}"
             )
         
-        return self._generate_expressions_from_combinations(possible_combinations, count, '×', lambda x, y: x * y)
+        return self._generate_expressions_from_pairs('*', count, '×', lambda x, y: x * y)
 
     def _generate_addition_expressions(self, count: int) -> List[Dict]:
         """生成加法表达式"""
-        possible_combinations = []
-        for num1 in range(self.min_number, self.max_number + 1):
-            for num2 in range(self.min_number, self.max_number + 1):
-                possible_combinations.append((num1, num2))
-        
-        return self._generate_expressions_from_combinations(possible_combinations, count, '+', lambda x, y: x + y)
-# yyy
+        return self._generate_expressions_from_pairs('+', count, '+', lambda x, y: x + y)
+
     def _generate_subtraction_expressions(self, count: int) -> List[Dict]:
         """生成减法表达式"""
-        possible_combinations = []
-        for num1 in range(self.min_number, self.max_number + 1):
-            for num2 in range(self.min_number, self.max_number + 1):
-                # 避免相同数字相减
-                if num1 != num2:
-                    possible_combinations.append((num1, num2))
-        
-        return self._generate_expressions_from_combinations(possible_combinations, count, '-', lambda x, y: x - y)
+        return self._generate_expressions_from_pairs('-', count, '-', lambda x, y: x - y)
 
     def _generate_division_expressions(self, count: int) -> List[Dict]:
         """生成除法表达式"""
-        possible_combinations = []
-        for num1 in range(self.min_number, self.max_number + 1):
-            for num2 in range(2, min(11, self.max_number + 1)):  # 除数从2开始，最大到10
-                # 确保能整除，且除数不等于被除数
-                if num1 % num2 == 0 and num1 != num2:
-                    possible_combinations.append((num1, num2))
-        
-        return self._generate_expressions_from_combinations(possible_combinations, count, '÷', lambda x, y: x / y)
+        return self._generate_expressions_from_pairs('/', count, '÷', lambda x, y: x / y)
+
+    def _divisor_range(self) -> range:
+        """除数取值范围：从2开始，最大到10"""
+        return range(2, min(11, self.max_number + 1))
 
-    def _generate_expressions_from_combinations(self, combinations: List[Tuple[int, int]], 
-                                             count: int, operator: str, 
-                                             operation: callable) -> List[Dict]:
-        """从可能的组合中生成表达式"""
-        logger.info(f"Found {len(combinations)} possible combinations for {operator}")
+    def _count_dividends(self, divisor: int) -> int:
+        """范围内能被 divisor 整除且不等于 divisor 的被除数个数"""
+        if self.max_number < self.min_number:
+            return 0
+        multiples = self.max_number // divisor - (self.min_number - 1) // divisor
+        if self.min_number <= divisor <= self.max_number:
+            multiples -= 1
+        return multiples
+
+    def count_valid_pairs(self, operator: str) -> int:
+        """精确计算单一运算符下有效的 (num1, num2) 组合数，不枚举组合
+        operator: 内部运算符（'+', '-', '*', '/'）
+        """
+        span = max(0, self.max_number - self.min_number + 1)
+        if operator == '*':
+            # 乘法两个数都从2开始，避免1
+            factors = max(0, self.max_number - 1)
+            return factors * factors
+        if operator == '+':
+            return span * span
+        if operator == '-':
+            # 避免相同数字相减
+            return span * (span - 1) if span else 0
+        if operator == '/':
+            return sum(self._count_dividends(d) for d in self._divisor_range())
+        raise ValueError(f"Unsupported operator: {operator}")
+
+    def _pair_at(self, operator: str, index: int) -> Tuple[int, int]:
+        """按序号取第 index 个有效组合，组合空间是虚拟的，不会实际构建"""
+        if operator == '*':
+            factors = self.max_number - 1
+            return 2 + index // factors, 2 + index % factors
+        span = self.max_number - self.min_number + 1
+        if operator == '+':
+            return self.min_number + index // span, self.min_number + index % span
+        if operator == '-':
+            # 每个被减数对应 span - 1 个减数，跳过与被减数相同的那一个
+            offset1, offset2 = divmod(index, span - 1)
+            if offset2 >= offset1:
+                offset2 += 1
+            return self.min_number + offset1, self.min_number + offset2
+        if operator == '/':
+            for divisor in self._divisor_range():
+                dividends = self._count_dividends(divisor)
+                if index < dividends:
+                    first = -(-self.min_number // divisor) * divisor
+                    num1 = first + index * divisor
+                    # 跳过被除数等于除数的情况
+                    if self.min_number <= divisor <= num1:
+                        num1 += divisor
+                    return num1, divisor
+                index -= dividends
+        raise IndexError(f"Pair index out of range for {operator}")
+
+    def _sample_pairs(self, operator: str, count: int, symbol: str) -> List[Tuple[int, int]]:
+        """在虚拟组合空间中按随机序号无重复地抽取组合，代价只与 count 相关"""
+        total = self.count_valid_pairs(operator)
+        logger.info(f"Found {total} possible combinations for {symbol}")
         
-        if len(combinations) < count:
+        if total < count:
             raise ValueError(
-                f"Cannot generate {count} unique {operator} expressions.\n"
+                f"Cannot generate {count} unique {symbol} expressions.\n"
                 f"Numbers range: {self.min_number} to {self.max_number}\n"
-                f"Found combinations: {len(combinations)}"
+                f"Found combinations: {total}"
             )
         
-        # 随机选择组合并生成表达式
+        # 已使用过的表达式最多占用 len(used_expressions) 个序号，多抽这么多即可保证足够
+        draws = min(total, count + len(self.used_expressions))
+        pairs = []
+        for index in self.rng.sample(range(total), draws):
+            num1, num2 = self._pair_at(operator, index)
+            if f"{num1} {symbol} {num2}" in self.used_expressions:
+                continue
+            pairs.append((num1, num2))
+            if len(pairs) == count:
+                return pairs
+        
+        raise ValueError(
+            f"Cannot generate {count} unique {symbol} expressions.\n"
+            f"Numbers range: {self.min_number} to {self.max_number}\n"
+            f"Unused combinations: {len(pairs)}"
+        )
+
+    def _generate_expressions_from_pairs(self, operator: str, count: int, symbol: str,
+                                         operation: callable) -> List[Dict]:
+        """从随机抽取的组合中生成表达式"""
         expressions = []
-        selected_combinations = random.sample(combinations, count)
         
-        for num1, num2 in selected_combinations:
-            expr = f"{num1} {operator} {num2}"
+        for num1, num2 in self._sample_pairs(operator, count, symbol):
+            expr = f"{num1} {symbol} {num2}"
             ans = operation(num1, num2)
+            self.used_expressions.add(expr)
             expressions.append({
                 "expression_text": expr,
                 "answer": ans,
@@ -136,30 +394,9 @@ class ExpressionGenerator:
             if abs(bracket_result) < 0.001 or abs(abs(bracket_result) - 1) < 0.001:
                 return False
             
-            # 构建带括号和不带括号的表达式
-            with_bracket = []
-            without_bracket = []
-            
-            # 构建两个表达式用于比较结果
-            for i in range(len(operators)):
-                if i == start:
-                    with_bracket.append('(')
-                with_bracket.append(str(numbers[i]))
-                with_bracket.append(operators[i])
-                without_bracket.append(str(numbers[i]))
-                without_bracket.append(operators[i])
-                if i == end:
-                    with_bracket.append(')')
-            
-            with_bracket.append(str(numbers[-1]))
-            without_bracket.append(str(numbers[-1]))
-            
-            # 计算两个表达式的结果
-            expr1 = ' '.join(with_bracket)
-            expr2 = ' '.join(without_bracket)
-            
-            result1 = eval(expr1)
-            result2 = eval(expr2)
+            # 直接构建带括号和不带括号的逆波兰序列，比较计算结果
+            result1 = evaluate_rpn(chain_rpn(numbers, operators, (start, end)))
+            result2 = evaluate_rpn(chain_rpn(numbers, operators))
             
             # 如果结果不同，且括号内的结果不是0、1或-1，则括号有意义
             return result1 != result2
@@ -230,7 +467,7 @@ class ExpressionGenerator:
                 raise ValueError("Need both multiplication/division and addition/subtraction operators for brackets")
             
             # 强制使用"加减-乘除"的顺序
-            selected_operators = [random.choice(add_sub), random.choice(mul_div)]
+            selected_operators = [self.rng.choice(add_sub), self.rng.choice(mul_div)]
             
             # 生成数字
             numbers = []
@@ -239,7 +476,7 @@ class ExpressionGenerator:
             for i in range(3):  # 需要3个数字
                 attempts_for_number = 0  # 移到循环内部
                 while attempts_for_number < 10:
-                    num = random.randint(self.min_number, self.max_number)
+                    num = self.rng.randint(self.min_number, self.max_number)
                     
                     # 检查当前数字是否有效
                     is_valid = True
@@ -264,7 +501,7 @@ class ExpressionGenerator:
                         if not divisors:
                             is_valid = False
                         elif is_valid:
-                            num = random.choice(divisors)
+                            num = self.rng.choice(divisors)
                     
                     if is_valid:
                         numbers.append(num)
@@ -281,17 +518,10 @@ class ExpressionGenerator:
                 continue
             
             # 构建带括号的表达式
-            expression_parts = ['(', str(numbers[0]), 
-                              selected_operators[0].replace('*', '×').replace('/', '÷'),
-                              str(numbers[1]), ')', 
-                              selected_operators[1].replace('*', '×').replace('/', '÷'),
-                              str(numbers[2])]
-            
-            expr_text = ' '.join(expression_parts)
+            expr_text = format_chain(numbers, selected_operators, (0, 1))
             
             try:
-                calc_expr = expr_text.replace('×', '*').replace('÷', '/')
-                result = eval(calc_expr)
+                result = to_number(evaluate_rpn(chain_rpn(numbers, selected_operators, (0, 1))))
                 
                 if isinstance(result, (int, float)) and str(expr_text) not in self.used_expressions:
                     self.used_expressions.add(str(expr_text))
@@ -313,8 +543,8 @@ class ExpressionGenerator:
         remaining_count = count - len(expressions)
         if remaining_count > 0:
             while len(expressions) < count and attempts < max_attempts:
-                operator_count = random.randint(1, self.max_operators)
-                selected_operators = random.sample(self.operators, operator_count)
+                operator_count = self.rng.randint(1, self.max_operators)
+                selected_operators = self.rng.sample(self.operators, operator_count)
                 
                 # 生成有意义的数字
                 numbers = []
@@ -323,7 +553,7 @@ class ExpressionGenerator:
                 for i in range(operator_count + 1):
                     attempts_for_number = 0
                     while attempts_for_number < 10:  # 限制每个数字的尝试次数
-                        num = random.randint(self.min_number, self.max_number)
+                        num = self.rng.randint(self.min_number, self.max_number)
                         
                         # 检查当前数字是否有效
                         is_valid = True
@@ -353,7 +583,7 @@ class ExpressionGenerator:
                             if not divisors:
                                 is_valid = False
                             elif is_valid:
-                                num = random.choice(divisors)
+                                num = self.rng.choice(divisors)
                         
                         if is_valid:
                             numbers.append(num)
@@ -370,17 +600,10 @@ class ExpressionGenerator:
                     continue
                 
                 # 构建表达式
-                expression_parts = []
-                for i in range(operator_count):
-                    expression_parts.append(str(numbers[i]))
-                    expression_parts.append(selected_operators[i].replace('*', '×').replace('/', '÷'))
-                expression_parts.append(str(numbers[-1]))
-                
-                expr_text = ' '.join(expression_parts)
+                expr_text = format_chain(numbers, selected_operators)
                 
                 try:
-                    calc_expr = expr_text.replace('×', '*').replace('÷', '/')
-                    result = eval(calc_expr)
+                    result = to_number(evaluate_rpn(chain_rpn(numbers, selected_operators)))
                     
                     if isinstance(result, (int, float)) and str(expr_text) not in self.used_expressions:
                         self.used_expressions.add(str(expr_text))
@@ -401,6 +624,192 @@ class ExpressionGenerator:
         
         return expressions
 
+    def _number_domain_size(self, excluded: Set[int]) -> int:
+        """[min, max] 中去掉 excluded 后剩余的数字个数"""
+        span = max(0, self.max_number - self.min_number + 1)
+        return span - sum(1 for n in excluded if self.min_number <= n <= self.max_number)
+
+    def _pick_number(self, excluded: Set[int]) -> int:
+        """在 [min, max] 中均匀选取一个不在 excluded 中的数字，按序号映射，不做重试"""
+        number = self.min_number + self.rng.randrange(self._number_domain_size(excluded))
+        for skipped in sorted(n for n in excluded if self.min_number <= n <= self.max_number):
+            if skipped > number:
+                break
+            number += 1
+        return number
+
+    def _division_domain_size(self, excluded: Set[int]) -> int:
+        """被除数不在 excluded 中的 (被除数, 除数) 组合个数"""
+        total = self.count_valid_pairs('/')
+        for dividend in excluded:
+            if self.min_number <= dividend <= self.max_number:
+                total -= sum(1 for d in self._divisor_range() if dividend % d == 0 and dividend != d)
+        return total
+
+    def _pick_division_pair(self, excluded: Set[int]) -> Tuple[int, int]:
+        """先选除数和商，得到必然整除的 (被除数, 除数)；只拒绝被除数落在 excluded 中的少数组合"""
+        total = self.count_valid_pairs('/')
+        while True:
+            dividend, divisor = self._pair_at('/', self.rng.randrange(total))
+            if dividend not in excluded:
+                return dividend, divisor
+
+    def _position_exclusions(self, left: str, right: str) -> Set[int]:
+        """某个位置上的数字因左右运算符而不能取的值（不含依赖前一个数字的部分）"""
+        excluded = set()
+        if left == '*':
+            excluded.update((0, 1))  # 乘法：不能是0和1
+        if right in ('*', '/'):
+            excluded.add(1)
+        return excluded
+
+    def _can_construct(self, operators: Tuple[str, ...]) -> bool:
+        """按最坏情况检查该运算符序列能否直接构造出合法数字"""
+        for i in range(len(operators) + 1):
+            left = operators[i - 1] if i > 0 else None
+            right = operators[i] if i < len(operators) else None
+            if left == '/':
+                continue
+            excluded = self._position_exclusions(left, right)
+            # 减法还要排除前一个数字，按最坏情况多扣除
+            if right == '/':
+                worst = len(self._divisor_range()) if left == '-' else 0
+                if self._division_domain_size(excluded) - worst < 1:
+                    return False
+            elif self._number_domain_size(excluded) - (1 if left == '-' else 0) < 1:
+                return False
+        return True
+
+    def _construct_numbers(self, operators: List[str]) -> List[int]:
+        """从左到右直接选出满足规则的数字，每次都能成功"""
+        numbers = []
+        for i in range(len(operators) + 1):
+            left = operators[i - 1] if i > 0 else None
+            right = operators[i] if i < len(operators) else None
+            if left == '/':
+                continue  # 除数已和被除数一起选出
+            excluded = self._position_exclusions(left, right)
+            if left == '-':
+                excluded.add(numbers[-1])  # 避免相同数字相减
+            if right == '/':
+                numbers.extend(self._pick_division_pair(excluded))
+            else:
+                numbers.append(self._pick_number(excluded))
+        return numbers
+
+    def _generate_constructive_expressions(self, count: int, bracket_count: int) -> List[Dict]:
+        """构造式生成混合运算表达式：直接选出合法数字，只有重复的表达式需要重试"""
+        expressions = []
+        max_attempts = count * 20
+        attempts = 0
+        
+        bracket_sequences = []
+        if bracket_count > 0:
+            bracket_sequences = [ops for ops in self._bracket_sequences() if self._can_construct(ops)]
+            if not bracket_sequences:
+                raise ValueError(
+                    f"Cannot build bracketed expressions in range {self.min_number} to {self.max_number}"
+                )
+        
+        # 按运算符个数分组的可构造运算符序列
+        sequences_by_count = {}
+        for ops in self._plain_sequences():
+            if self._can_construct(ops):
+                sequences_by_count.setdefault(len(ops), []).append(ops)
+        if count > bracket_count and not sequences_by_count:
+            raise ValueError(
+                f"Cannot build expressions in range {self.min_number} to {self.max_number}"
+            )
+        operator_counts = list(sequences_by_count)
+        
+        while len(expressions) < count and attempts < max_attempts:
+            attempts += 1
+            if len(expressions) < bracket_count:
+                selected_operators = list(self.rng.choice(bracket_sequences))
+                bracket = (0, 1)
+            else:
+                selected_operators = list(self.rng.choice(sequences_by_count[self.rng.choice(operator_counts)]))
+                bracket = None
+            
+            numbers = self._construct_numbers(selected_operators)
+            expr_text = format_chain(numbers, selected_operators, bracket)
+            if expr_text in self.used_expressions:
+                continue
+            
+            result = to_number(evaluate_rpn(chain_rpn(numbers, selected_operators, bracket)))
+            self.used_expressions.add(expr_text)
+            expressions.append({
+                "expression_text": expr_text,
+                "answer": result,
+                "has_brackets": bracket is not None,
+                "operator_count": len(selected_operators)
+            })
+            logger.info(f"Constructed expression: {expr_text} = {result}")
+        
+        if len(expressions) < count:
+            raise ValueError(
+                f"Could only generate {len(expressions)} of {count} unique expressions after {max_attempts} attempts"
+            )
+        
+        return expressions
+
+    def _enumerate_numbers(self, operators: Tuple[str, ...], numbers: List[int] = None):
+        """按规则逐个列出运算符序列下的全部合法数字组合"""
+        numbers = numbers or []
+        i = len(numbers)
+        if i > len(operators):
+            yield list(numbers)
+            return
+        left = operators[i - 1] if i > 0 else None
+        right = operators[i] if i < len(operators) else None
+        excluded = self._position_exclusions(left, right)
+        if left == '-':
+            excluded.add(numbers[-1])
+        if right == '/':
+            candidates = (self._pair_at('/', index) for index in range(self.count_valid_pairs('/')))
+            choices = [list(pair) for pair in candidates if pair[0] not in excluded]
+        else:
+            choices = [[n] for n in range(self.min_number, self.max_number + 1) if n not in excluded]
+        for choice in choices:
+            yield from self._enumerate_numbers(operators, numbers + choice)
+
+    def _generate_enumerated_expressions(self, count: int, bracket_count: int) -> List[Dict]:
+        """穷举全部合法表达式后无重复抽样，适用于需求接近容量的小范围配置"""
+        def candidates(sequences, bracket):
+            return [(numbers, ops, bracket) for ops in sequences
+                    for numbers in self._enumerate_numbers(ops)
+                    if format_chain(numbers, ops, bracket) not in self.used_expressions]
+        
+        groups = []
+        if bracket_count > 0:
+            groups.append((candidates(self._bracket_sequences(), (0, 1)), bracket_count))
+        if count > bracket_count:
+            groups.append((candidates(self._plain_sequences(), None), count - bracket_count))
+        
+        expressions = []
+        for pool, needed in groups:
+            if len(pool) < needed:
+                raise ValueError(f"Cannot generate {needed} unique expressions, only {len(pool)} available")
+            for numbers, ops, bracket in self.rng.sample(pool, needed):
+                expr_text = format_chain(numbers, ops, bracket)
+                result = to_number(evaluate_rpn(chain_rpn(numbers, ops, bracket)))
+                self.used_expressions.add(expr_text)
+                expressions.append({
+                    "expression_text": expr_text,
+                    "answer": result,
+                    "has_brackets": bracket is not None,
+                    "operator_count": len(ops)
+                })
+        
+        return expressions
+
+
+def _generate_shard(config: Dict, count: int, bracket_count: int, seed: str, used: Set[str]) -> List[Dict]:
+    """在独立进程中生成一个分片：每个分片使用由自己的种子创建的随机数流"""
+    generator = ExpressionGenerator(**config, seed=seed)
+    generator.used_expressions.update(used)
+    return generator.generate_expressions(count, bracket_count)
+
 if __name__ == "__main__":
     generator = ExpressionGenerator(['+', '-', '×', '÷'], 3, 1, 100)
     expressions = generator.generate_expressions(5, 3)
@@ -0,0 +1,206 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from .expression_generator import ConfigKey, ExpressionGenerator, normalize_config
+
+logger = logging.getLogger(__name__)
+
+
+class _PoolEntry:
+    """单个配置下预生成的无括号题和括号题"""
+
+    def __init__(self):
+        self.plain: Deque[Dict] = deque()
+        self.bracket: Deque[Dict] = deque()
+        self.texts = set()
+        self.supports_brackets = True
+
+    def add(self, expressions: List[Dict]):
+        for expr in expressions:
+            if expr['expression_text'] in self.texts:
+                continue
+            self.texts.add(expr['expression_text'])
+            (self.bracket if expr['has_brackets'] else self.plain).append(expr)
+
+    def take(self, bucket: Deque[Dict], count: int) -> List[Dict]:
+        taken = [bucket.popleft() for _ in range(min(count, len(bucket)))]
+        for expr in taken:
+            self.texts.discard(expr['expression_text'])
+        return taken
+
+
+class ExpressionPool:
+    """按练习配置预生成题目的进程内题目池
+
+    后台线程把近期用到的配置补满，池中配置数量有上限，超出时淘汰最久未使用的配置；
+    池内容定期写入快照文件，重启后直接从快照恢复。
+
+    快照在第一次取题时才加载，补充线程也在这时启动：只有处理请求的进程会用到题目池，
+    init_db.py 等脚本和调试模式下的重载监视进程不会启动线程，也不会写快照。
+    """
+
+    def __init__(self, app=None):
+        self.entries: 'OrderedDict[ConfigKey, _PoolEntry]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.enabled = False
+        self.thread: Optional[threading.Thread] = None
+        self.start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('EXPRESSION_POOL_ENABLED', True)
+        self.target_size = app.config.get('EXPRESSION_POOL_TARGET', 200)
+        self.bracket_target = app.config.get('EXPRESSION_POOL_BRACKET_TARGET', 50)
+        self.max_configs = app.config.get('EXPRESSION_POOL_MAX_CONFIGS', 32)
+        self.refill_interval = app.config.get('EXPRESSION_POOL_REFILL_INTERVAL', 30)
+        self.snapshot_path = app.config.get('EXPRESSION_POOL_SNAPSHOT')
+
+    def _start(self):
+        """加载快照并启动补充线程（只执行一次）"""
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is not None:
+                return
+            self.load_snapshot()
+            self.thread = threading.Thread(target=self._refill_loop, name='expression-pool', daemon=True)
+            self.thread.start()
+
+    def draw(self, config: ConfigKey, count: int, bracket_count: int) -> List[Dict]:
+        """从池中取出一套题目，池中不足的部分当场生成"""
+        self._start()
+        with self.lock:
+            entry = self._touch(config)
+            bracket = entry.take(entry.bracket, bracket_count)
+            plain = entry.take(entry.plain, count - bracket_count)
+            pooled = entry.texts.copy()
+        self.wakeup.set()
+
+        missing_bracket = bracket_count - len(bracket)
+        missing = count - len(bracket) - len(plain)
+        if missing > 0:
+            generator = self._generator(config)
+            # 现场生成的题目不能与已取出的题目和池中剩余的题目重复
+            generator.used_expressions.update(expr['expression_text'] for expr in bracket + plain)
+            generator.used_expressions.update(pooled)
+            extra = generator.generate_expressions(missing, missing_bracket)
+            bracket += [expr for expr in extra if expr['has_brackets']]
+            plain += [expr for expr in extra if not expr['has_brackets']]
+        return bracket + plain
+
+    def refill(self):
+        """把池中每个配置补充到目标数量"""
+        with self.lock:
+            pending = [(config, entry) for config, entry in self.entries.items()
+                       if len(entry.plain) < self.target_size
+                       or (entry.supports_brackets and len(entry.bracket) < self.bracket_target)]
+
+        changed = False
+        for config, entry in pending:
+            generator = self._generator(config)
+            with self.lock:
+                generator.used_expressions.update(entry.texts)
+                plain_needed = max(0, self.target_size - len(entry.plain))
+                bracket_needed = max(0, self.bracket_target - len(entry.bracket)) if entry.supports_brackets else 0
+            capacity = generator.capacity()
+            if bracket_needed and not capacity['bracket']:
+                with self.lock:
+                    entry.supports_brackets = False
+                bracket_needed = 0
+            # 可用组合不足时只补到容量允许的数量
+            bracket_needed = min(bracket_needed, max(0, capacity['bracket'] - len(entry.bracket)))
+            plain_needed = min(plain_needed, max(0, capacity['plain'] - len(entry.plain)))
+            if not plain_needed and not bracket_needed:
+                continue
+            try:
+                expressions = generator.generate_expressions(plain_needed + bracket_needed, bracket_needed)
+            except ValueError as e:
+                logger.warning(f"Could not refill expression pool for {config}: {e}")
+                continue
+            with self.lock:
+                if config in self.entries:
+                    entry.add(expressions)
+                    changed = True
+        if changed:
+            self.save_snapshot()
+
+    def _touch(self, config: ConfigKey) -> _PoolEntry:
+        """取出配置对应的条目并标记为最近使用，必要时淘汰最久未用的配置"""
+        entry = self.entries.get(config)
+        if entry is None:
+            entry = self.entries[config] = _PoolEntry()
+            while len(self.entries) > self.max_configs:
+                evicted, _ = self.entries.popitem(last=False)
+                logger.info(f"Evicted cold expression pool config: {evicted}")
+        self.entries.move_to_end(config)
+        return entry
+
+    def _generator(self, config: ConfigKey) -> ExpressionGenerator:
+        operators, operator_count, min_number, max_number = config
+        return ExpressionGenerator(
+            selected_operators=list(operators),
+            operator_count=operator_count,
+            min_number=min_number,
+            max_number=max_number,
+            strategy='auto'
+        )
+
+    def _refill_loop(self):
+        while True:
+            self.wakeup.wait(self.refill_interval)
+            self.wakeup.clear()
+            try:
+                self.refill()
+            except Exception as e:
+                logger.error(f"Error refilling expression pool: {e}")
+
+    def save_snapshot(self):
+        """把池内容写入快照文件
+
+        先写入同一目录下本进程独有的临时文件再替换，多个进程同时保存时也不会留下写到一半的快照。
+        """
+        if not self.snapshot_path:
+            return
+        with self.lock:
+            snapshot = [{
+                'config': [list(config[0])] + list(config[1:]),
+                'plain': list(entry.plain),
+                'bracket': list(entry.bracket)
+            } for config, entry in self.entries.items()]
+        directory, name = os.path.split(os.path.abspath(self.snapshot_path))
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=f"{name}.", suffix='.tmp', dir=directory)
+        except OSError as e:
+            logger.error(f"Error saving expression pool snapshot: {e}")
+            return
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as e:
+            logger.error(f"Error saving expression pool snapshot: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load_snapshot(self):
+        """启动时从快照恢复池内容"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading expression pool snapshot: {e}")
+            return
+        with self.lock:
+            for item in snapshot:
+                entry = self._touch(normalize_config(*item['config']))
+                entry.add(item['bracket'] + item['plain'])
+        logger.info(f"Loaded {len(snapshot)} configs from expression pool snapshot")
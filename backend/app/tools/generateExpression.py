@@ -1,6 +1,6 @@
 import random
 import re
-from fractions import Fraction
+from .arithmetic import evaluate, to_number
 
 def parse_expression(expression):
     """解析表达式，返回操作数列表和运算符列表"""
@@ -102,11 +102,8 @@ def generate_new_expression(numbers, operators):
 
 def evaluate_expression(expression):
     """计算表达式的值，支持分数和小数"""
-    expression = expression.replace('×', '*').replace('÷', '/')
     try:
-        expression = re.sub(r'(\d+)/(\d+)', lambda x: str(Fraction(int(x.group(1)), int(x.group(2)))), expression)
-        result = eval(expression)
-        return result
+        return to_number(evaluate(expression))
     except Exception as e:
         print(f"表达式计算错误: {e}")
         return None
@@ -0,0 +1,164 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import case, exists, false, insert, literal, or_, select
+
+from .. import db
+from ..config import Config
+from ..models import (
+    AnswerRecord,
+    ErrorRecord,
+    ExerciseSet,
+    Expression,
+    PracticeRecord,
+    UserMistake,
+    UserMistakeFrequency
+)
+from .arithmetic import canonical_text
+from .stats_rollup import upsert_rows
+
+MISTAKE_COLUMNS = ['error_record_id', 'user_id', 'expression_id', 'expression_text', 'correct_answer',
+                   'user_answer', 'answer_time', 'difficulty', 'operator_count', 'is_exported',
+                   'export_time', 'created_at']
+
+
+def expression_difficulty():
+    """算式难度的 SQL 表达式；尚未回填特征列的旧算式按括号和运算符数量计算（与 arithmetic.difficulty_of 一致）"""
+    return db.func.coalesce(Expression.difficulty, case(
+        (or_(Expression.has_brackets, Expression.operator_count >= 3), 'hard'),
+        (Expression.operator_count == 2, 'medium'),
+        else_='simple'
+    ))
+
+
+def error_records_insert(*conditions):
+    """为符合条件的答错的答题记录生成错题记录的 INSERT ... SELECT 语句"""
+    wrong_answers = select(AnswerRecord.answer_record_id, false())\
+        .where(AnswerRecord.is_correct == false(), *conditions)
+    return insert(ErrorRecord).from_select(['answer_record_id', 'is_exported'], wrong_answers)
+
+
+def user_mistakes_insert(*conditions, created_at=None):
+    """把符合条件、尚未写入用户错题表的错题记录写入用户错题表的 INSERT ... SELECT 语句
+
+    created_at 默认为当前的中国时区时间，也可以传入 SQL 表达式。
+    """
+    if created_at is None:
+        created_at = literal(datetime.now(Config.CHINA_TZ).replace(tzinfo=None))
+    mistakes = select(
+        ErrorRecord.error_record_id,
+        ExerciseSet.user_id,
+        Expression.expression_id,
+        Expression.expression_text,
+        Expression.answer,
+        AnswerRecord.user_answer,
+        AnswerRecord.answer_time,
+        expression_difficulty(),
+        Expression.operator_count,
+        db.func.coalesce(ErrorRecord.is_exported, False),
+        ErrorRecord.export_time,
+        created_at
+    ).select_from(ErrorRecord)\
+     .join(AnswerRecord, AnswerRecord.answer_record_id == ErrorRecord.answer_record_id)\
+     .join(Expression, Expression.expression_id == AnswerRecord.expression_id)\
+     .join(ExerciseSet, ExerciseSet.exercise_set_id == Expression.exercise_set_id)\
+     .where(
+        ExerciseSet.user_id.isnot(None),
+        ~exists().where(UserMistake.error_record_id == ErrorRecord.error_record_id),
+        *conditions
+    )
+    return insert(UserMistake).from_select(MISTAKE_COLUMNS, mistakes)
+
+
+def insert_user_mistakes(*conditions, created_at=None):
+    """把符合条件、尚未写入用户错题表的错题记录写入用户错题表（不提交事务），用一条 INSERT ... SELECT 完成"""
+    db.session.execute(user_mistakes_insert(*conditions, created_at=created_at))
+
+
+def rebuild_user_mistakes():
+    """为已有的错题记录补写用户错题表
+
+    原有数据没有答错时间，按所属练习集第一次完成的时间计入，没有练习记录的按练习集的创建时间计入。
+    """
+    first_completion = select(db.func.min(PracticeRecord.completion_time))\
+        .where(PracticeRecord.exercise_set_id == ExerciseSet.exercise_set_id)\
+        .scalar_subquery()
+    insert_user_mistakes(created_at=db.func.coalesce(first_completion, ExerciseSet.create_time))
+    db.session.commit()
+    return UserMistake.query.count()
+
+
+def _frequency_rows(mistakes: Iterable) -> List[Dict]:
+    """把按时间排列的 (user_id, expression_text, correct_answer, user_answer, wrong_time)
+    按 (用户, 规范化算式) 汇总为错题频次表的行"""
+    rows = {}
+    for user_id, expression_text, correct_answer, user_answer, wrong_time in mistakes:
+        key = (user_id, canonical_text(expression_text))
+        row = rows.setdefault(key, {'user_id': user_id, 'expression_key': key[1], 'error_count': 0})
+        row['error_count'] += 1
+        row.update(expression_text=expression_text, correct_answer=correct_answer,
+                   last_user_answer=user_answer, last_wrong_time=wrong_time)
+    return list(rows.values())
+
+
+def _upsert_frequency(rows: List[Dict]):
+    upsert_rows(UserMistakeFrequency, rows, ['error_count'],
+                replace=['expression_text', 'correct_answer', 'last_user_answer', 'last_wrong_time'])
+
+
+def record_wrong_answers(rows: List[Dict]):
+    """答错时累加错题频次（不提交事务）；rows 中每项包含 expression_id, user_answer, is_correct"""
+    wrong = [row for row in rows if not row['is_correct']]
+    if not wrong:
+        return
+    expressions = {
+        expression_id: (user_id, expression_text, answer)
+        for expression_id, user_id, expression_text, answer in db.session.query(
+            Expression.expression_id, ExerciseSet.user_id, Expression.expression_text, Expression.answer
+        ).join(ExerciseSet, ExerciseSet.exercise_set_id == Expression.exercise_set_id)
+         .filter(Expression.expression_id.in_({row['expression_id'] for row in wrong}),
+                 ExerciseSet.user_id.isnot(None))
+    }
+    wrong_time = datetime.now(Config.CHINA_TZ).replace(tzinfo=None)
+    _upsert_frequency(_frequency_rows(
+        (*expressions[row['expression_id']], float(row['user_answer']), wrong_time)
+        for row in wrong if row['expression_id'] in expressions
+    ))
+
+
+def forget_mistake(user_id: str, expression_text: str):
+    """删除一条错题后扣减对应的答错次数，减到 0 时删除频次记录（不提交事务）"""
+    frequency = UserMistakeFrequency.query.filter_by(
+        user_id=user_id, expression_key=canonical_text(expression_text)).first()
+    if frequency is None:
+        return
+    if frequency.error_count <= 1:
+        db.session.delete(frequency)
+    else:
+        frequency.error_count -= 1
+
+
+def mistake_counts(user_id: str, expression_texts: Iterable[str]) -> Dict[str, int]:
+    """一次查询取出若干算式的答错次数，按算式原文返回"""
+    keys = {text: canonical_text(text) for text in expression_texts}
+    if not keys:
+        return {}
+    counts = dict(db.session.query(UserMistakeFrequency.expression_key, UserMistakeFrequency.error_count)
+                  .filter(UserMistakeFrequency.user_id == user_id,
+                          UserMistakeFrequency.expression_key.in_(set(keys.values()))))
+    return {text: counts.get(key, 1) for text, key in keys.items()}
+
+
+def rebuild_mistake_frequency(batch_size: int = 10000):
+    """由用户错题表重建错题频次表"""
+    UserMistakeFrequency.query.delete()
+    mistakes = db.session.query(
+        UserMistake.user_id, UserMistake.expression_text, UserMistake.correct_answer,
+        UserMistake.user_answer, UserMistake.created_at
+    ).order_by(UserMistake.created_at, UserMistake.error_record_id)\
+     .execution_options(yield_per=batch_size)
+    rows = _frequency_rows(mistakes)
+    for start in range(0, len(rows), batch_size):
+        _upsert_frequency(rows[start:start + batch_size])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,162 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select
+from werkzeug.security import generate_password_hash
+
+from .. import db
+from ..models import (
+    User, ExerciseSet, PracticeRecord, Expression, AnswerRecord, ErrorRecord,
+    UserAnswerRollup, UserPracticeRollup, UserMistake, UserMistakeFrequency
+)
+from ..routes import _encode_cursor, _keyset_before
+from .arithmetic import expression_features
+from .mistakes import (
+    error_records_insert,
+    rebuild_mistake_frequency,
+    rebuild_user_mistakes,
+    user_mistakes_insert
+)
+from .stats_rollup import rebuild_rollups
+
+SEED_PREFIX = 'explain'
+
+def seed(users=50, sets_per_user=20, expressions_per_set=10):
+    """写入一批测试数据，使优化器按真实的数据分布选择执行计划（用户ID以 explain 开头），返回写入的用户ID"""
+    now = datetime.now()
+    password = generate_password_hash('123456')
+    user_ids = [f"{SEED_PREFIX}{index:04d}" for index in range(users)]
+    db.session.bulk_insert_mappings(User, [{
+        'user_id': user_id,
+        'name': '测试用户',
+        'id_card': f"{SEED_PREFIX}{index:010d}",
+        'grade': 3,
+        '_password': password,
+        'phone': f"199{index:08d}"
+    } for index, user_id in enumerate(user_ids)])
+
+    for user_id in user_ids:
+        sets = [{
+            'user_id': user_id,
+            'total_expressions': expressions_per_set,
+            'bracket_expressions': 0,
+            'time_limit': 10,
+            'create_time': now - timedelta(days=index),
+            'operators': '+,-',
+            'operator_count': 1,
+            'min_number': 1,
+            'max_number': 99
+        } for index in range(sets_per_user)]
+        db.session.bulk_insert_mappings(ExerciseSet, sets, return_defaults=True)
+        db.session.bulk_insert_mappings(PracticeRecord, [dict(
+            {key: exercise_set[key] for key in ('user_id', 'total_expressions', 'bracket_expressions', 'time_limit',
+                                                'operators', 'operator_count', 'min_number', 'max_number')},
+            exercise_set_id=exercise_set['exercise_set_id'],
+            completion_time=exercise_set['create_time'],
+            local_date=exercise_set['create_time'].date(),
+            duration=300,
+            is_timeout=False,
+            is_completed=True
+        ) for exercise_set in sets])
+
+        expressions = []
+        for exercise_set in sets:
+            for _ in range(expressions_per_set):
+                left, right = random.randint(1, 99), random.randint(1, 99)
+                text = f"{left} + {right}"
+                expressions.append(dict(expression_features(text), exercise_set_id=exercise_set['exercise_set_id'],
+                                        expression_text=text, answer=left + right))
+        db.session.bulk_insert_mappings(Expression, expressions, return_defaults=True)
+        set_dates = {exercise_set['exercise_set_id']: exercise_set['create_time'].date() for exercise_set in sets}
+        answers = [{
+            'expression_id': expression['expression_id'],
+            'local_date': set_dates[expression['exercise_set_id']],
+            'user_answer': expression['answer'] + (1 if index % 5 == 0 else 0),
+            'is_correct': index % 5 != 0,
+            'answer_time': random.uniform(1, 20)
+        } for index, expression in enumerate(expressions)]
+        db.session.bulk_insert_mappings(AnswerRecord, answers, return_defaults=True)
+        # 大部分错题已导出，未导出的只占一小部分，与实际使用时的分布一致
+        db.session.bulk_insert_mappings(ErrorRecord, [{
+            'answer_record_id': answer['answer_record_id'],
+            'is_exported': index % 10 != 0,
+            'export_time': now if index % 10 != 0 else None
+        } for index, answer in enumerate(a for a in answers if not a['is_correct'])])
+        db.session.commit()
+
+    rebuild_user_mistakes()
+    rebuild_mistake_frequency()
+    for user_id in user_ids:
+        rebuild_rollups(user_id)
+    if db.engine.dialect.name == 'mysql':
+        for table in db.metadata.sorted_tables:
+            db.session.connection().exec_driver_sql(f"ANALYZE TABLE `{table.name}`")
+    else:
+        db.session.connection().exec_driver_sql("ANALYZE")
+    db.session.commit()
+    return user_ids
+
+def hot_queries(user_id):
+    """各热点接口使用的查询：(名称, 语句)"""
+    user = db.session.get(User, user_id)
+    record = PracticeRecord.query.filter_by(user_id=user_id).order_by(PracticeRecord.completion_time.desc()).first()
+    expression = Expression.query.filter_by(exercise_set_id=record.exercise_set_id).first()
+    mistake = UserMistake.query.filter_by(user_id=user_id).first()
+    answer_ids = [answer_id for answer_id, in db.session.query(AnswerRecord.answer_record_id)
+                  .join(Expression, Expression.expression_id == AnswerRecord.expression_id)
+                  .filter(Expression.exercise_set_id == record.exercise_set_id)]
+    cursor = _encode_cursor(record.completion_time, record.record_id)
+    return [
+        ('注册查重: 身份证号', select(User).where(User.id_card == user.id_card)),
+        ('注册查重: 手机号', select(User).where(User.phone == (user.phone or '13800138000'))),
+        ('练习记录: 首页', select(PracticeRecord).where(PracticeRecord.user_id == user_id)
+            .order_by(PracticeRecord.completion_time.desc(), PracticeRecord.record_id.desc()).limit(11)),
+        ('练习记录: 游标页', select(PracticeRecord).where(
+            PracticeRecord.user_id == user_id,
+            _keyset_before(PracticeRecord.completion_time, PracticeRecord.record_id, cursor))
+            .order_by(PracticeRecord.completion_time.desc(), PracticeRecord.record_id.desc()).limit(11)),
+        ('练习记录: 答题统计', select(
+            Expression.exercise_set_id,
+            func.sum(case((AnswerRecord.is_correct, 1), else_=0)),
+            func.count(AnswerRecord.answer_record_id),
+            func.sum(AnswerRecord.answer_time)
+        ).join(AnswerRecord, AnswerRecord.expression_id == Expression.expression_id)
+            .where(Expression.exercise_set_id.in_([record.exercise_set_id]))
+            .group_by(Expression.exercise_set_id)),
+        ('练习集: 可复用检查', select(ExerciseSet).where(
+            ExerciseSet.user_id == user_id,
+            ExerciseSet.content_hash == '0' * 64,
+            ~ExerciseSet.practice_records.any())),
+        ('练习集: 题目', select(Expression).where(Expression.exercise_set_id == record.exercise_set_id)),
+        ('练习集: 答题记录', select(AnswerRecord).where(AnswerRecord.expression_id == expression.expression_id)),
+        # 批量提交答案时按本次写入的答题记录ID生成错题记录和用户错题（与 _insert_answer_rows 相同的语句）
+        ('批量答题: 错题记录', error_records_insert(AnswerRecord.answer_record_id.in_(answer_ids))),
+        ('批量答题: 用户错题', user_mistakes_insert(AnswerRecord.answer_record_id.in_(answer_ids))),
+        ('错题记录: 未导出', select(ErrorRecord).where(ErrorRecord.is_exported == False)),
+        ('错题列表', select(UserMistake).where(UserMistake.user_id == user_id, UserMistake.is_exported == False)
+            .order_by(UserMistake.created_at.desc(), UserMistake.error_record_id.desc()).limit(21)),
+        ('错题汇总', select(UserMistake.is_exported, UserMistake.difficulty, func.count(UserMistake.error_record_id))
+            .where(UserMistake.user_id == user_id)
+            .group_by(UserMistake.is_exported, UserMistake.difficulty)),
+        ('错题删除', select(UserMistake).where(
+            UserMistake.error_record_id == (mistake.error_record_id if mistake else 0))),
+        ('高频错题', select(UserMistakeFrequency).where(UserMistakeFrequency.user_id == user_id)
+            .order_by(UserMistakeFrequency.error_count.desc(), UserMistakeFrequency.last_wrong_time.desc())
+            .limit(20)),
+        ('统计: 练习汇总', select(func.sum(UserPracticeRollup.practice_count))
+            .where(UserPracticeRollup.user_id == user_id)),
+        ('统计: 答题汇总', select(UserAnswerRollup).where(UserAnswerRollup.user_id == user_id)),
+    ]
+
+def full_scans(statement):
+    """执行 EXPLAIN，返回执行计划中全表扫描（或全索引扫描）的步骤"""
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    connection = db.session.connection()
+    if dialect.name == 'mysql':
+        rows = connection.exec_driver_sql(f"EXPLAIN {sql}").mappings().all()
+        return [f"{row['table']}: type={row['type']}" for row in rows if row['type'] in ('ALL', 'index')]
+    # SQLite: 只有 SEARCH 表示按索引查找，SCAN 表示逐行扫描
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    return [row[-1] for row in rows
+            if row[-1].startswith('SCAN ') and not row[-1].startswith('SCAN CONSTANT')]
@@ -0,0 +1,30 @@
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+
+def add_missing_columns(db) -> List[str]:
+    """为已有的表补加模型中新增的列，返回补加的列（"表.列"）
+
+    db.create_all() 不会修改已存在的表，升级旧数据库时先执行本函数；已有的列不做任何修改，可以重复执行。
+    新增的列都允许为空，旧数据由 rebuild_stats.py 等脚本回填。
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise ValueError(f"Cannot add NOT NULL column {table.name}.{column.name} to an existing table")
+                definition = CreateColumn(column).compile(dialect=db.engine.dialect)
+                connection.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {definition}"))
+                added.append(f"{table.name}.{column.name}")
+    return added
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+import json
+import logging
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:  # redis 是可选依赖，只有配置了 STATS_CACHE_REDIS_URL 时才需要
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """进程内缓存：按最近使用淘汰，条目超过 TTL 后失效
+
+    版本号只在本进程内有效，只能用于单进程部署。递增时取全局计数器的下一个值，没有记录的用户（包括被淘汰的）
+    使用已淘汰版本号中的最大值：淘汰后的版本号不小于该用户淘汰前的版本号，不会与之前签发的旧 ETag 重复。
+    """
+
+    def __init__(self, max_entries: int, ttl: int, max_versions: int = 100000):
+        self.entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.versions: 'OrderedDict[str, int]' = OrderedDict()
+        self.max_entries = max_entries
+        self.max_versions = max_versions
+        self.counter = 0
+        self.evicted = 0
+        self.ttl = ttl
+        # 版本号带上进程启动标识，重启后旧的 ETag 不会与新数据混淆
+        self.epoch = uuid.uuid4().hex[:8]
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def version(self, user_id: str) -> str:
+        with self.lock:
+            version = self.versions.get(user_id)
+            if version is None:
+                return f"{self.epoch}.{self.evicted}"
+            self.versions.move_to_end(user_id)
+            return f"{self.epoch}.{version}"
+
+    def bump(self, user_id: str):
+        with self.lock:
+            self.counter += 1
+            self.versions[user_id] = self.counter
+            self.versions.move_to_end(user_id)
+            while len(self.versions) > self.max_versions:
+                _, version = self.versions.popitem(last=False)
+                self.evicted = max(self.evicted, version)
+
+
+class RedisBackend:
+    """多个进程共享的 Redis 缓存，版本号用 INCR 维护"""
+
+    def __init__(self, url: str, ttl: int):
+        if redis is None:
+            raise ValueError("STATS_CACHE_REDIS_URL requires the redis package to be installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self.client.get(f"stats:{key}")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Dict):
+        self.client.set(f"stats:{key}", json.dumps(value, ensure_ascii=False), ex=self.ttl)
+
+    def version(self, user_id: str) -> str:
+        return (self.client.get(f"stats-version:{user_id}") or b'0').decode()
+
+    def bump(self, user_id: str):
+        self.client.incr(f"stats-version:{user_id}")
+
+
+class StatsCache:
+    """用户统计数据的缓存
+
+    每个用户有一个写入版本号，答题、完成练习、导入以及错题导出和删除后递增；缓存键和 ETag 都包含版本号，
+    版本号变化后旧条目自然失效。默认使用进程内缓存，配置 STATS_CACHE_REDIS_URL 后改用共享的 Redis。
+    有多个 Web 工作进程（WEB_WORKERS 大于1）时进程内缓存无法同步版本号，未配置 Redis 则不启用缓存。
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('STATS_CACHE_ENABLED', True)
+        ttl = app.config.get('STATS_CACHE_TTL', 300)
+        redis_url = app.config.get('STATS_CACHE_REDIS_URL')
+        if redis_url:
+            self.backend = RedisBackend(redis_url, ttl)
+            return
+        if self.enabled and app.config.get('WEB_WORKERS', 1) > 1:
+            logger.warning("Stats cache disabled: the in-process cache cannot be shared by "
+                           "multiple workers, set STATS_CACHE_REDIS_URL to enable it")
+            self.enabled = False
+        self.backend = MemoryBackend(app.config.get('STATS_CACHE_MAX_ENTRIES', 1024), ttl,
+                                     app.config.get('STATS_CACHE_MAX_VERSIONS', 100000))
+
+    def etag(self, user_id: str, window: str) -> Optional[str]:
+        """统计结果的 ETag：写入版本号加上趋势窗口（当天日期与天数，趋势随日期变化）；缓存不可用时返回 None"""
+        return self.versioned_key(user_id, window)
+
+    def versioned_key(self, user_id: str, name: str) -> Optional[str]:
+        """带用户写入版本号的缓存键，用于同一用户的其他统计结果；缓存不可用时返回 None"""
+        if not self.enabled:
+            return None
+        version = self._call('version', user_id)
+        return f"{version}-{name}" if version is not None else None
+
+    def get(self, user_id: str, etag: str) -> Optional[Dict]:
+        return self._call('get', f"{user_id}:{etag}")
+
+    def set(self, user_id: str, etag: str, value: Dict):
+        self._call('set', f"{user_id}:{etag}", value)
+
+    def bump(self, *user_ids: str):
+        """用户数据变化后递增写入版本号"""
+        for user_id in user_ids:
+            if user_id:
+                self._call('bump', str(user_id))
+
+    def _call(self, method: str, *args):
+        # 共享缓存不可用时不影响接口本身，只是退化为每次查询数据库
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception as e:
+            logger.error(f"Stats cache {method} failed: {e}")
+            return None
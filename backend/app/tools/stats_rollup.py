@@ -0,0 +1,225 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import pytz
+from sqlalchemy.dialects import mysql, sqlite
+
+from .. import db
+from ..config import Config
+from ..models import AnswerRecord, ExerciseSet, Expression, PracticeRecord, UserAnswerRollup, UserPracticeRollup
+from .arithmetic import expression_features, operator_symbols
+
+OPERATOR_ORDER = '+-×÷'
+# 答题用时区间的上界(秒)与对应的汇总列，超过最后一个上界的计入 time_over_15
+TIME_BUCKETS = ((3, 'time_0_3'), (5, 'time_3_5'), (10, 'time_5_10'), (15, 'time_10_15'))
+TIME_COLUMNS = [column for _, column in TIME_BUCKETS] + ['time_over_15']
+ANSWER_COUNTERS = ['correct_count', 'total_count', 'total_answer_time'] + TIME_COLUMNS
+
+
+def time_column(answer_time: Optional[float]) -> Optional[str]:
+    """答题用时所属的区间列；没有用时（为空或0）的不计入分布"""
+    if not answer_time:
+        return None
+    for upper, column in TIME_BUCKETS:
+        if answer_time <= upper:
+            return column
+    return 'time_over_15'
+
+
+def today() -> date:
+    """当前的本地日期（中国时区）"""
+    return datetime.now(Config.CHINA_TZ).date()
+
+
+def local_date_of(value: Union[str, date, None]) -> date:
+    """日期可以是 ISO 字符串；缺失时（旧版本写入的预写日志）按当天计"""
+    if value is None:
+        return today()
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def upsert_rows(model, rows: List[Dict], counters: List[str], replace: Sequence[str] = ()):
+    """按主键写入汇总行，已存在时累加 counters 中的列、用新值覆盖 replace 中的列
+
+    MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE。
+    """
+    if not rows:
+        return
+    if db.engine.dialect.name == 'mysql':
+        statement = mysql.insert(model).values(rows)
+        new_values = statement.inserted
+    else:
+        statement = sqlite.insert(model).values(rows)
+        new_values = statement.excluded
+    updates = {column: getattr(model, column) + new_values[column] for column in counters}
+    updates.update({column: new_values[column] for column in replace})
+    if db.engine.dialect.name == 'mysql':
+        statement = statement.on_duplicate_key_update(updates)
+    else:
+        statement = statement.on_conflict_do_update(
+            index_elements=[column.name for column in model.__table__.primary_key], set_=updates)
+    db.session.execute(statement)
+
+
+def _expression_group(expression_text: str, operator_mask: Optional[int], difficulty: Optional[str]) -> Tuple[str, str]:
+    """算式所属的 (运算符组合, 难度)；尚未回填特征列的旧算式由算式文本解析得到"""
+    if operator_mask is None or difficulty is None:
+        features = expression_features(expression_text)
+        operator_mask, difficulty = features['operator_mask'], features['difficulty']
+    return operator_symbols(operator_mask), difficulty
+
+
+def _aggregate_answers(answers: Iterable) -> List[Dict]:
+    """把 (user_id, local_date, expression_text, operator_mask, difficulty, is_correct, answer_time)
+    汇总为答题汇总表的行"""
+    totals = defaultdict(lambda: dict.fromkeys(ANSWER_COUNTERS, 0))
+    for user_id, local_date, expression_text, operator_mask, difficulty, is_correct, answer_time in answers:
+        if not user_id:
+            continue
+        key = (user_id, local_date_of(local_date), *_expression_group(expression_text, operator_mask, difficulty))
+        counters = totals[key]
+        counters['total_count'] += 1
+        counters['correct_count'] += 1 if is_correct else 0
+        counters['total_answer_time'] += answer_time or 0
+        column = time_column(answer_time)
+        if column:
+            counters[column] += 1
+    return [dict(zip(('user_id', 'local_date', 'operators', 'difficulty'), key), **counters)
+            for key, counters in totals.items()]
+
+
+def update_answer_rollups(rows: List[Dict]) -> Set[str]:
+    """按刚写入的答题记录更新答题汇总表（不提交事务），返回涉及的用户ID
+
+    rows 中每项包含 expression_id, is_correct, answer_time, local_date。
+    """
+    if not rows:
+        return set()
+    expressions = {
+        expression_id: (user_id, expression_text, operator_mask, difficulty)
+        for expression_id, user_id, expression_text, operator_mask, difficulty in db.session.query(
+            Expression.expression_id, ExerciseSet.user_id, Expression.expression_text,
+            Expression.operator_mask, Expression.difficulty
+        ).join(ExerciseSet, ExerciseSet.exercise_set_id == Expression.exercise_set_id)
+         .filter(Expression.expression_id.in_({row['expression_id'] for row in rows}))
+    }
+    answers = []
+    for row in rows:
+        if row['expression_id'] not in expressions:
+            continue
+        user_id, expression_text, operator_mask, difficulty = expressions[row['expression_id']]
+        answers.append((user_id, row.get('local_date'), expression_text, operator_mask, difficulty,
+                        row['is_correct'], row['answer_time']))
+    upsert_rows(UserAnswerRollup, _aggregate_answers(answers), ANSWER_COUNTERS)
+    return {answer[0] for answer in answers if answer[0]}
+
+
+def update_practice_rollup(user_id: str, local_date: date, duration: int):
+    """完成一次练习后更新练习汇总表（不提交事务）"""
+    upsert_rows(UserPracticeRollup, [{
+        'user_id': user_id,
+        'local_date': local_date,
+        'practice_count': 1,
+        'total_duration': duration or 0
+    }], ['practice_count', 'total_duration'])
+
+
+def backfill_expression_features(batch_size: int = 10000) -> int:
+    """为缺少特征列的已有算式补写难度、运算符位掩码和操作数位数"""
+    filled = 0
+    while True:
+        expressions = db.session.query(Expression.expression_id, Expression.expression_text)\
+            .filter(Expression.difficulty.is_(None))\
+            .limit(batch_size).all()
+        if not expressions:
+            return filled
+        db.session.bulk_update_mappings(Expression, [
+            dict(expression_features(expression_text), expression_id=expression_id)
+            for expression_id, expression_text in expressions
+        ])
+        db.session.commit()
+        filled += len(expressions)
+
+
+def _answer_date(completion_time: Optional[datetime], create_time: datetime) -> date:
+    """没有记录答题日期的旧答题记录按所属练习集第一次完成的日期计；没有练习记录的（如导入的题目）按练习集的创建日期计"""
+    if completion_time is not None:
+        # completion_time 按中国时区的本地时间存储
+        return completion_time.date()
+    # create_time 为 UTC 时间
+    return pytz.utc.localize(create_time).astimezone(Config.CHINA_TZ).date()
+
+
+def backfill_local_dates(batch_size: int = 10000) -> Tuple[int, int]:
+    """为缺少本地日期的已有练习记录和答题记录补写日期，返回补写的 (练习记录数, 答题记录数)"""
+    practices = PracticeRecord.query.filter(PracticeRecord.local_date.is_(None))\
+        .update({PracticeRecord.local_date: db.func.date(PracticeRecord.completion_time)},
+                synchronize_session=False)
+    db.session.commit()
+
+    first_completion = db.session.query(
+        PracticeRecord.exercise_set_id,
+        db.func.min(PracticeRecord.completion_time).label('completion_time')
+    ).group_by(PracticeRecord.exercise_set_id).subquery()
+    answers = 0
+    while True:
+        rows = db.session.query(
+            AnswerRecord.answer_record_id, first_completion.c.completion_time, ExerciseSet.create_time
+        ).join(Expression, Expression.expression_id == AnswerRecord.expression_id)\
+         .join(ExerciseSet, ExerciseSet.exercise_set_id == Expression.exercise_set_id)\
+         .outerjoin(first_completion, first_completion.c.exercise_set_id == ExerciseSet.exercise_set_id)\
+         .filter(AnswerRecord.local_date.is_(None))\
+         .limit(batch_size).all()
+        if not rows:
+            return practices, answers
+        db.session.bulk_update_mappings(AnswerRecord, [{
+            'answer_record_id': answer_record_id,
+            'local_date': _answer_date(completion_time, create_time)
+        } for answer_record_id, completion_time, create_time in rows])
+        db.session.commit()
+        answers += len(rows)
+
+
+def rebuild_rollups(user_id: Optional[str] = None, batch_size: int = 10000):
+    """由已有数据重建汇总表（可只重建一个用户）
+
+    按练习记录和答题记录写入时保存的本地日期汇总。旧数据库需先用 schema.add_missing_columns 补加日期列，
+    再用 backfill_local_dates 补写日期（rebuild_stats.py 依次执行这两步）。
+    """
+    answer_filter = [ExerciseSet.user_id == user_id] if user_id else [ExerciseSet.user_id.isnot(None)]
+    practice_filter = [PracticeRecord.user_id == user_id] if user_id else []
+    UserAnswerRollup.query.filter(*([UserAnswerRollup.user_id == user_id] if user_id else [])).delete()
+    UserPracticeRollup.query.filter(*([UserPracticeRollup.user_id == user_id] if user_id else [])).delete()
+
+    answers = db.session.query(
+        ExerciseSet.user_id, AnswerRecord.local_date, Expression.expression_text,
+        Expression.operator_mask, Expression.difficulty,
+        AnswerRecord.is_correct, AnswerRecord.answer_time
+    ).join(Expression, Expression.expression_id == AnswerRecord.expression_id)\
+     .join(ExerciseSet, ExerciseSet.exercise_set_id == Expression.exercise_set_id)\
+     .filter(*answer_filter, AnswerRecord.local_date.isnot(None))\
+     .execution_options(yield_per=batch_size)
+
+    answer_rows = _aggregate_answers(answers)
+    for start in range(0, len(answer_rows), batch_size):
+        upsert_rows(UserAnswerRollup, answer_rows[start:start + batch_size], ANSWER_COUNTERS)
+
+    practices = db.session.query(
+        PracticeRecord.user_id,
+        PracticeRecord.local_date,
+        db.func.count(PracticeRecord.record_id),
+        db.func.coalesce(db.func.sum(PracticeRecord.duration), 0)
+    ).filter(*practice_filter, PracticeRecord.local_date.isnot(None))\
+     .group_by(PracticeRecord.user_id, PracticeRecord.local_date)
+    practice_rows = [{
+        'user_id': user,
+        'local_date': local_date,
+        'practice_count': count,
+        'total_duration': int(duration)
+    } for user, local_date, count, duration in practices]
+    for start in range(0, len(practice_rows), batch_size):
+        upsert_rows(UserPracticeRollup, practice_rows[start:start + batch_size],
+                    ['practice_count', 'total_duration'])
+    db.session.commit()
+    return len(answer_rows), len(practice_rows)
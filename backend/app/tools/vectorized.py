@@ -0,0 +1,201 @@
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .arithmetic import chain_rpn, evaluate_rpn, format_chain, to_number
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖，只有 engine='numpy' 时才需要
+    np = None
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = ('+', '-', '*', '/')
+MIN_BLOCK_SIZE = 1024
+MAX_BLOCK_SIZE = 65536
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def _fits_int64(generator, operator_count: int) -> bool:
+    """运算中间结果不会超出 int64 时才能用向量化计算"""
+    largest = max(abs(generator.min_number), abs(generator.max_number), 10)
+    return largest ** (operator_count + 1) < 2 ** 62
+
+
+def _draw_operators(rng, operators: List[int], rows: int, width: int) -> Tuple['np.ndarray', 'np.ndarray']:
+    """每行随机取运算符个数 k，再取 k 个不重复的运算符；超出 k 的列记为 -1"""
+    counts = rng.integers(1, width + 1, rows)
+    order = np.argsort(rng.random((rows, len(operators))), axis=1)[:, :width]
+    codes = np.asarray(operators)[order]
+    codes[np.arange(width) >= counts[:, None]] = -1
+    return codes, counts
+
+
+def _draw_bracket_operators(rng, operators: List[int], rows: int) -> 'np.ndarray':
+    """括号题强制使用"加减-乘除"的顺序"""
+    add_sub = np.asarray([op for op in operators if OPERATORS[op] in '+-'])
+    mul_div = np.asarray([op for op in operators if OPERATORS[op] in '*/'])
+    return np.stack([rng.choice(add_sub, rows), rng.choice(mul_div, rows)], axis=1)
+
+
+def _apply_rules(generator, rng, codes: 'np.ndarray', numbers: 'np.ndarray') -> 'np.ndarray':
+    """用布尔掩码套用与逐个生成时相同的规则，并把除数替换为能整除的数；返回合法行"""
+    rows, width = codes.shape
+    valid = np.ones(rows, dtype=bool)
+    divisor_high = min(10, generator.max_number)
+    for i in range(width):
+        op = codes[:, i]
+        left = numbers[:, i]
+        if divisor_high >= 2:
+            divisors = rng.integers(2, divisor_high + 1, rows)
+        else:
+            divisors = np.zeros(rows, dtype=np.int64)
+        is_div = op == OPERATORS.index('/')
+        numbers[:, i + 1] = np.where(is_div, divisors, numbers[:, i + 1])
+        right = numbers[:, i + 1]
+
+        # 避免相同数字相减
+        valid &= ~((op == OPERATORS.index('-')) & (left == right))
+        # 乘法：不能是0和1；乘除号左边的数不能是1
+        valid &= ~((op == OPERATORS.index('*')) & ((right == 0) | (right == 1)))
+        valid &= ~(((op == OPERATORS.index('*')) | is_div) & (left == 1))
+        # 除法：除数在2到10之间，能整除且不等于被除数
+        safe = np.where(is_div & (right != 0), right, 1)
+        valid &= ~(is_div & ((right < 2) | (left % safe != 0) | (left == right)))
+    return valid
+
+
+def _evaluate(codes: 'np.ndarray', numbers: 'np.ndarray', bracket: bool) -> Tuple['np.ndarray', 'np.ndarray']:
+    """按列计算结果（遵守先乘除后加减），返回整数结果和能否整除的掩码"""
+    rows, width = codes.shape
+    exact = np.ones(rows, dtype=bool)
+    if bracket:
+        # ( n0 ± n1 ) × ÷ n2
+        inner = np.where(codes[:, 0] == OPERATORS.index('+'),
+                         numbers[:, 0] + numbers[:, 1], numbers[:, 0] - numbers[:, 1])
+        right = numbers[:, 2]
+        is_div = codes[:, 1] == OPERATORS.index('/')
+        safe = np.where(right != 0, right, 1)
+        exact &= ~is_div | (inner % safe == 0)
+        return np.where(is_div, inner // safe, inner * right), exact
+
+    total = np.zeros(rows, dtype=np.int64)
+    term = numbers[:, 0].copy()
+    sign = np.ones(rows, dtype=np.int64)
+    for i in range(width):
+        op = codes[:, i]
+        right = numbers[:, i + 1]
+        is_add_sub = (op == OPERATORS.index('+')) | (op == OPERATORS.index('-'))
+        total = np.where(is_add_sub, total + sign * term, total)
+        sign = np.where(op == OPERATORS.index('-'), -1, np.where(op == OPERATORS.index('+'), 1, sign))
+        is_div = op == OPERATORS.index('/')
+        safe = np.where(right != 0, right, 1)
+        exact &= ~is_div | (term % safe == 0)
+        term = np.where(is_add_sub, right,
+                        np.where(op == OPERATORS.index('*'), term * right,
+                                 np.where(is_div, term // safe, term)))
+    return total + sign * term, exact
+
+
+def _unique_rows(codes: 'np.ndarray', numbers: 'np.ndarray') -> 'np.ndarray':
+    """按运算符和数字去重，返回首次出现的行号（保持原顺序）"""
+    active = np.concatenate([codes >= 0, np.ones((len(codes), 1), dtype=bool)], axis=1)
+    active[:, 1:] = active[:, :-1]
+    active[:, 0] = True
+    keys = np.concatenate([codes, np.where(active, numbers, 0)], axis=1)
+    _, first = np.unique(keys, axis=0, return_index=True)
+    return np.sort(first)
+
+
+def _template(codes: Tuple[int, ...], bracket: bool) -> str:
+    """按运算符序列生成算式文本模板，如 "( {} + {} ) × {}" """
+    operators = [OPERATORS[code] for code in codes if code >= 0]
+    return format_chain(['{}'] * (len(operators) + 1), operators, (0, 1) if bracket else None)
+
+
+def _generate_block(generator, rng, rows: int, bracket: bool, limit: int) -> List[Dict]:
+    """生成一批候选表达式，返回合法且批内不重复的结果（最多 limit 个新表达式）"""
+    operators = [OPERATORS.index(op) for op in generator.operators]
+    if bracket:
+        codes = _draw_bracket_operators(rng, operators, rows)
+    else:
+        width = min(generator.max_operators, len(operators))
+        codes, _ = _draw_operators(rng, operators, rows, width)
+    numbers = rng.integers(generator.min_number, generator.max_number + 1,
+                           (rows, codes.shape[1] + 1), dtype=np.int64)
+
+    valid = _apply_rules(generator, rng, codes, numbers)
+    results, exact = _evaluate(codes, numbers, bracket)
+    keep = np.flatnonzero(valid)
+    keep = keep[_unique_rows(codes[keep], numbers[keep])]
+
+    # 只在最后一步把采用的行转换为 Python 对象和文本
+    templates = {}
+    expressions = []
+    brackets = (0, 1) if bracket else None
+    for row_codes, row_numbers, result, is_exact in zip(codes[keep].tolist(), numbers[keep].tolist(),
+                                                        results[keep].tolist(), exact[keep].tolist()):
+        key = tuple(row_codes)
+        if key not in templates:
+            templates[key] = _template(key, bracket)
+        operator_count = len(key) - key.count(-1)
+        row_numbers = row_numbers[:operator_count + 1]
+        expr_text = templates[key].format(*row_numbers)
+        if expr_text in generator.used_expressions:
+            continue
+        if is_exact:
+            answer = result
+        else:
+            row_ops = [OPERATORS[code] for code in key[:operator_count]]
+            answer = to_number(evaluate_rpn(chain_rpn(row_numbers, row_ops, brackets)))
+        expressions.append({
+            "expression_text": expr_text,
+            "answer": answer,
+            "has_brackets": bracket,
+            "operator_count": operator_count
+        })
+        if len(expressions) == limit:
+            break
+    return expressions
+
+
+def generate_mixed_expressions(generator, count: int, bracket_count: int,
+                               rng: Optional['np.random.Generator'] = None) -> List[Dict]:
+    """向量化生成混合运算表达式，规则与 ExpressionGenerator 逐个生成时一致
+
+    按块批量抽取运算符矩阵和数字矩阵，用布尔掩码过滤不合法的行，逐列计算结果，
+    块内用数组去重，只有被采用的行才转换成文本。
+    """
+    if np is None:
+        raise ValueError("engine='numpy' requires numpy to be installed")
+    # 默认从生成器的随机数流派生种子，使 seed 同样能固定向量化生成的结果
+    rng = rng if rng is not None else np.random.default_rng(generator.rng.getrandbits(64))
+
+    if bracket_count > 0:
+        if not (any(op in '*/' for op in generator.operators) and any(op in '+-' for op in generator.operators)):
+            raise ValueError("Need both multiplication/division and addition/subtraction operators for brackets")
+
+    width = 2 if bracket_count >= count else min(generator.max_operators, len(generator.operators))
+    if not _fits_int64(generator, max(width, 2)):
+        logger.info("Number range too large for int64 columns, falling back to constructive generation")
+        return generator._generate_constructive_expressions(count, bracket_count)
+
+    expressions = []
+    max_rows = max(count * 200, MAX_BLOCK_SIZE * 4)
+    for needed, bracket in ((bracket_count, True), (count - bracket_count, False)):
+        produced = 0
+        drawn = 0
+        while produced < needed and drawn < max_rows:
+            rows = min(MAX_BLOCK_SIZE, max(MIN_BLOCK_SIZE, (needed - produced) * 4))
+            drawn += rows
+            for expr in _generate_block(generator, rng, rows, bracket, needed - produced):
+                generator.used_expressions.add(expr['expression_text'])
+                expressions.append(expr)
+                produced += 1
+        if produced < needed:
+            raise ValueError(f"Could not generate {needed} unique expressions after drawing {drawn} candidates")
+        logger.info(f"Vectorized generation produced {produced} expressions from {drawn} candidates")
+    return expressions
@@ -0,0 +1,62 @@
+from typing import Iterable, Iterator, NamedTuple, Sequence
+import tempfile
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.utils import get_column_letter
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# 版式版本号：输出格式有变化时加一，已缓存的导出文件随之失效
+LAYOUT_VERSION = 1
+
+
+class Sheet(NamedTuple):
+    """一个工作表：标题、表头、各列宽度和逐行产生的数据"""
+    title: str
+    header: Sequence[str]
+    widths: Sequence[int]
+    rows: Iterable[Sequence]
+
+
+def _header_style() -> NamedStyle:
+    # 表头样式注册为工作簿的命名样式，所有表头单元格共用同一条样式记录
+    return NamedStyle(
+        name='export_header',
+        font=Font(bold=True, color='FFFFFF'),
+        fill=PatternFill('solid', fgColor='4F81BD'),
+        alignment=Alignment(horizontal='center', vertical='center')
+    )
+
+
+def stream_xlsx(sheets: Iterable[Sheet], chunk_size: int = 65536) -> Iterator[bytes]:
+    """用 openpyxl 的只写模式生成工作簿并逐块输出
+
+    只写模式下每行写入后即序列化到临时文件，不在内存中保留单元格对象，内存占用与行数无关；
+    保存后的文件从临时文件分块读出。
+    """
+    workbook = Workbook(write_only=True)
+    header_style = _header_style()
+    workbook.add_named_style(header_style)
+    for sheet in sheets:
+        worksheet = workbook.create_sheet(sheet.title)
+        for index, width in enumerate(sheet.widths, 1):
+            worksheet.column_dimensions[get_column_letter(index)].width = width
+        worksheet.freeze_panes = 'A2'
+        header = []
+        for title in sheet.header:
+            cell = WriteOnlyCell(worksheet, value=title)
+            cell.style = header_style.name
+            header.append(cell)
+        worksheet.append(header)
+        for row in sheet.rows:
+            worksheet.append(row)
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,91 @@
+import random
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+
+from app.tools.docx_writer import worksheet_docx
+
+CONFIG = {
+    'total_expressions': 0,
+    'bracket_expressions': 0,
+    'operators': ['+', '-'],
+    'min_number': 1,
+    'max_number': 99
+}
+
+def python_docx_worksheet(config, expressions):
+    """原 export_expressions 中基于 python-docx 的实现，作为对照"""
+    doc = Document()
+    doc.styles['Normal'].font.name = '宋体'
+    doc.styles['Normal']._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
+
+    title = doc.add_heading('口算练习', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    info = doc.add_paragraph()
+    info.add_run('练习配置：\n').bold = True
+    info.add_run(f'题目数量：{config["total_expressions"]} 道\n')
+    if config.get('bracket_expressions', 0) > 0:
+        info.add_run(f'括号题目：{config["bracket_expressions"]} 道\n')
+    info.add_run(f'运算符：{", ".join(config["operators"])}\n')
+    info.add_run(f'数值范围：{config["min_number"]} - {config["max_number"]}\n')
+
+    doc.add_paragraph()
+
+    for i in range(0, len(expressions), 2):
+        p = doc.add_paragraph()
+        p.add_run(f'{i+1}. {expressions[i]["expression_text"]} = ').bold = True
+        p.add_run('_' * 8)
+        if i + 1 < len(expressions):
+            p.add_run('\t\t')
+            p.add_run(f'{i+2}. {expressions[i+1]["expression_text"]} = ').bold = True
+            p.add_run('_' * 8)
+
+    doc.add_page_break()
+    answer_title = doc.add_heading('参考答案', 0)
+    answer_title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    for i in range(0, len(expressions), 4):
+        p = doc.add_paragraph()
+        for j in range(4):
+            if i + j < len(expressions):
+                p.add_run(f'{i+j+1}. {round(expressions[i+j]["answer"], 2)}\t\t')
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def template_worksheet(config, expressions):
+    return b''.join(worksheet_docx(config, expressions))
+
+def measure(build, config, expressions):
+    """返回 (耗时秒数, 内存峰值MB, 文件大小KB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = build(config, expressions)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, len(data) / 1024
+
+def benchmark(sizes=(100, 1000, 10000)):
+    print(f"{'题目数':>8} {'实现':<12} {'耗时(秒)':>10} {'内存峰值(MB)':>14} {'文件(KB)':>10}")
+    for size in sizes:
+        expressions = []
+        for _ in range(size):
+            left, right = random.randint(1, 99), random.randint(1, 99)
+            expressions.append({'expression_text': f'{left} + {right}', 'answer': left + right})
+        config = dict(CONFIG, total_expressions=size)
+        for name, build in (('python-docx', python_docx_worksheet), ('template', template_worksheet)):
+            elapsed, peak, kilobytes = measure(build, config, expressions)
+            print(f"{size:>8} {name:<12} {elapsed:>10.3f} {peak:>14.1f} {kilobytes:>10.1f}")
+
+if __name__ == "__main__":
+    # 用法: python benchmark_docx.py [题目数 ...]
+    # 只比较两种实现的耗时和内存（需安装 python-docx），版式由 tests/test_docx_writer.py 检查
+    benchmark([int(size) for size in sys.argv[1:]] or (100, 1000, 10000))
@@ -0,0 +1,38 @@
+import sys
+
+from app import create_app, db
+from app.models import PracticeRecord
+from app.tools.query_plans import full_scans, hot_queries, seed
+
+app = create_app()
+
+def check(user_id=None):
+    """检查所有热点查询的执行计划，返回出现全表扫描的查询数"""
+    with app.app_context():
+        if user_id is None:
+            user_id = db.session.query(PracticeRecord.user_id).order_by(PracticeRecord.record_id).limit(1).scalar()
+        if user_id is None:
+            print("数据库中没有练习记录，请先使用 --seed 写入测试数据")
+            return 1
+        queries = hot_queries(user_id)
+        failures = 0
+        for name, statement in queries:
+            scans = full_scans(statement)
+            if scans:
+                failures += 1
+                print(f"[全表扫描] {name}: {'; '.join(scans)}")
+            else:
+                print(f"[通过] {name}")
+        print(f"共检查 {len(queries)} 个查询，{failures} 个出现全表扫描")
+        return failures
+
+if __name__ == "__main__":
+    # 用法: python explain_queries.py [--seed] [user_id]
+    # --seed 先写入测试数据，只应在测试数据库上使用；有查询出现全表扫描时以状态码 1 退出
+    args = sys.argv[1:]
+    if '--seed' in args:
+        args.remove('--seed')
+        with app.app_context():
+            users = seed()
+            print(f"测试数据已写入：{len(users)} 个用户")
+    sys.exit(1 if check(args[0] if args else None) else 0)
@@ -1,5 +1,10 @@
+import sys
+
+from sqlalchemy import inspect
+
 from app import create_app, db
 from app.models import User, ExerciseSet, PracticeRecord, Expression, AnswerRecord, ErrorRecord
+from app.tools.schema import add_missing_columns
 
 app = create_app()
 
@@ -24,5 +29,54 @@ def init_db():
         db.session.commit()
         print("测试用户已创建！")
 
+def add_columns():
+    """在已有数据库上补加模型中新增的列（不删除数据，可重复执行）"""
+    with app.app_context():
+        added = add_missing_columns(db)
+        for column in added:
+            print(f"已添加列 {column}")
+        print(f"列检查完成，新增 {len(added)} 列")
+
+def create_indexes():
+    """在已有数据库上补建模型中声明的索引（不删除数据）
+
+    已有相同列的索引（如 MySQL 为外键自动创建的索引）时跳过。索引可能建在新增的列上，先补加缺少的列。
+    """
+    with app.app_context():
+        for column in add_missing_columns(db):
+            print(f"已添加列 {column}")
+
+        # 旧数据中的空手机号改为 NULL，否则无法建立唯一索引
+        User.query.filter(User.phone == '').update({User.phone: None}, synchronize_session=False)
+        db.session.commit()
+
+        inspector = inspect(db.engine)
+        existing_tables = set(inspector.get_table_names())
+        created = 0
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                table.create(db.engine)
+                print(f"已创建表 {table.name}")
+                continue
+            existing = inspector.get_indexes(table.name)
+            names = {index['name'] for index in existing}
+            columns = {(tuple(index['column_names']), bool(index['unique'])) for index in existing}
+            for index in table.indexes:
+                key = (tuple(column.name for column in index.columns), bool(index.unique))
+                if index.name in names or key in columns:
+                    continue
+                index.create(db.engine)
+                created += 1
+                print(f"已创建索引 {table.name}.{index.name}")
+        print(f"索引检查完成，新建 {created} 个索引")
+
 if __name__ == "__main__":
-    init_db() 
\ No newline at end of file
+    # 用法: python init_db.py           重建所有表
+    #       python init_db.py columns   只补加已有表中缺少的列
+    #       python init_db.py indexes   补加缺少的列后补建缺少的表和索引
+    if len(sys.argv) > 1 and sys.argv[1] == 'columns':
+        add_columns()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'indexes':
+        create_indexes()
+    else:
+        init_db()
@@ -0,0 +1,29 @@
+import sys
+
+from app import create_app, db
+from app.tools.mistakes import rebuild_mistake_frequency, rebuild_user_mistakes
+from app.tools.schema import add_missing_columns
+from app.tools.stats_rollup import backfill_expression_features, backfill_local_dates, rebuild_rollups
+
+app = create_app()
+
+def rebuild_stats(user_id=None):
+    with app.app_context():
+        # 旧数据库先补加新增的列（特征列、本地日期等），之后才能回填
+        added = add_missing_columns(db)
+        print(f"已补加 {len(added)} 列" + (f"：{', '.join(added)}" if added else ""))
+        # 汇总和错题都按算式的特征列分组，先补写旧算式缺少的特征
+        filled = backfill_expression_features()
+        print(f"算式特征已补写：共 {filled} 道算式")
+        practices, answers = backfill_local_dates()
+        print(f"本地日期已补写：练习记录 {practices} 条，答题记录 {answers} 条")
+        answer_rows, practice_rows = rebuild_rollups(user_id)
+        print(f"统计汇总表已重建：答题汇总 {answer_rows} 行，练习汇总 {practice_rows} 行")
+        mistakes = rebuild_user_mistakes()
+        print(f"用户错题表已补写：共 {mistakes} 道错题")
+        frequencies = rebuild_mistake_frequency()
+        print(f"错题频次表已重建：共 {frequencies} 个算式")
+
+if __name__ == "__main__":
+    # 用法: python rebuild_stats.py [user_id]
+    rebuild_stats(sys.argv[1] if len(sys.argv) > 1 else None)
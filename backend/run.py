@@ -1,7 +1,10 @@
 from app import create_app
 import logging
 
-app = create_app()
+# 并行生成的工作进程（forkserver/spawn）会以 __mp_main__ 的名字重新导入本文件，此时不创建应用，
+# 以免在工作进程中启动后台线程、整理答题日志
+if __name__ != '__mp_main__':
+    app = create_app()
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+
+import pytest
+from sqlalchemy import event
+
+# 统计按中国时区的日期汇总，测试进程使用相同的时区，避免跨日时本地日期与中国日期不一致
+os.environ['TZ'] = 'Asia/Shanghai'
+if hasattr(time, 'tzset'):
+    time.tzset()
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.config import Config  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """使用临时 SQLite 数据库的应用；题目池、导出任务和导出缓存的文件都放在临时目录中"""
+    base = tmp_path_factory.mktemp('app')
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{base / 'test.db'}"
+    Config.EXPRESSION_POOL_ENABLED = False
+    Config.EXPRESSION_POOL_SNAPSHOT = str(base / 'expression_pool.json')
+    Config.ANSWER_LOG_ENABLED = False
+    Config.EXPORT_JOB_DIR = str(base / 'export_jobs')
+    Config.EXPORT_CACHE_DIR = str(base / 'export_cache')
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def db(app):
+    """每个测试使用空的数据库和空的统计缓存"""
+    from app import db, stats_cache
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        stats_cache.init_app(app)
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(db):
+    from app.models import User
+    user = User(user_id='u1', name='测试用户', id_card='110101200001011234', grade=3, phone='13800138000')
+    user.password = '123456'
+    db.session.add(user)
+    db.session.commit()
+    return user.user_id
+
+
+@pytest.fixture
+def statements(db):
+    """记录执行的 SQL 语句"""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def create_exercise_set(client, user_id, total=10, **config):
+    """通过接口创建练习集，返回 (练习集ID, 题目列表)"""
+    payload = {'user_id': user_id, 'total_expressions': total, 'bracket_expressions': 0, 'time_limit': 10,
+               'operators': ['+'], 'operator_count': 1, 'min_number': 1, 'max_number': 50}
+    payload.update(config)
+    response = client.post('/api/exercise-set', json=payload)
+    assert response.status_code == 200, response.get_json()
+    set_id = response.get_json()['exercise_set_id']
+    return set_id, client.get(f'/api/exercise-set/{set_id}/expressions').get_json()
@@ -0,0 +1,71 @@
+from conftest import create_exercise_set
+
+from app.models import AnswerRecord, ErrorRecord, UserMistake, UserMistakeFrequency
+
+
+def submit(client, expressions, wrong):
+    """提交整套题目的答案，前 wrong 道答错"""
+    answers = [{'expression_id': expr['expression_id'],
+                'user_answer': expr['answer'] + (1 if index < wrong else 0),
+                'answer_time': 2}
+               for index, expr in enumerate(expressions)]
+    response = client.post('/api/answer-records/batch', json={'answers': answers})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['results']
+
+
+def test_wrong_answers_create_one_error_record_each(client, user):
+    _, expressions = create_exercise_set(client, user, total=10)
+    results = submit(client, expressions, wrong=4)
+
+    assert sum(not result['is_correct'] for result in results) == 4
+    wrong_ids = {expr['expression_id'] for expr in expressions[:4]}
+    error_answers = AnswerRecord.query.join(
+        ErrorRecord, ErrorRecord.answer_record_id == AnswerRecord.answer_record_id).all()
+    assert {answer.expression_id for answer in error_answers} == wrong_ids
+    assert all(not answer.is_correct for answer in error_answers)
+    assert UserMistake.query.count() == 4
+    assert {mistake.expression_id for mistake in UserMistake.query} == wrong_ids
+    assert sum(row.error_count for row in UserMistakeFrequency.query) == 4
+
+
+def test_error_records_only_cover_this_submission(client, user):
+    _, first = create_exercise_set(client, user, total=6)
+    _, second = create_exercise_set(client, user, total=6)
+    submit(client, first, wrong=2)
+    submit(client, second, wrong=3)
+
+    assert ErrorRecord.query.count() == 5
+    assert UserMistake.query.count() == 5
+    # 每条答错的答题记录恰好对应一条错题记录
+    assert ErrorRecord.query.with_entities(ErrorRecord.answer_record_id).distinct().count() == 5
+
+
+def test_statement_count_does_not_depend_on_batch_size(client, user, statements):
+    _, small = create_exercise_set(client, user, total=4)
+    _, large = create_exercise_set(client, user, total=40)
+
+    statements.clear()
+    submit(client, small, wrong=2)
+    small_count = len(statements)
+    statements.clear()
+    submit(client, large, wrong=20)
+    large_count = len(statements)
+
+    assert small_count == large_count
+    assert large_count <= 12
+
+
+def test_row_by_row_fallback_without_returning(client, user, db, monkeypatch):
+    # 不支持 RETURNING 的数据库逐行写入并取回ID
+    monkeypatch.setattr(db.engine.dialect, 'insert_returning', False)
+    _, first = create_exercise_set(client, user, total=5)
+    _, second = create_exercise_set(client, user, total=5)
+    submit(client, first, wrong=2)
+    submit(client, second, wrong=3)
+
+    assert AnswerRecord.query.count() == 10
+    assert ErrorRecord.query.count() == 5
+    assert UserMistake.query.count() == 5
+    assert {mistake.expression_id for mistake in UserMistake.query} == \
+        {expr['expression_id'] for expr in first[:2] + second[:3]}
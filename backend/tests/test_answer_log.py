@@ -0,0 +1,54 @@
+import json
+import time
+
+from flask import Flask
+
+from app.tools.answer_log import AnswerLog
+
+
+def make_app(path, **config):
+    app = Flask(__name__)
+    app.config.update(ANSWER_LOG_ENABLED=True, ANSWER_LOG_PATH=str(path), ANSWER_LOG_FLUSH_INTERVAL=3600, **config)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    return app
+
+
+def test_init_app_leaves_the_live_log_alone(tmp_path):
+    path = tmp_path / 'answer_log.jsonl'
+    path.write_bytes(json.dumps([{'expression_id': 1}]).encode() + b'\n')
+    applied = []
+    log = AnswerLog(make_app(path), lambda segment_id, rows: applied.append(rows))
+
+    # 脚本创建应用时不切分、不重放正在使用的日志
+    assert log.thread is None
+    assert [p.name for p in tmp_path.iterdir()] == ['answer_log.jsonl']
+    assert applied == []
+
+
+def test_first_request_replays_the_leftover_log(tmp_path):
+    path = tmp_path / 'answer_log.jsonl'
+    path.write_bytes(json.dumps([{'expression_id': 1}]).encode() + b'\n')
+    applied = []
+    app = make_app(path)
+    log = AnswerLog(app, lambda segment_id, rows: applied.append(rows))
+
+    app.test_client().get('/ping')
+    assert log.thread is not None
+    log.append([{'expression_id': 2}])
+    # 由后台线程写入
+    log.wakeup.set()
+    for _ in range(100):
+        if sum(len(rows) for rows in applied) == 2:
+            break
+        time.sleep(0.05)
+    assert sorted(row['expression_id'] for rows in applied for row in rows) == [1, 2]
+
+
+def test_answer_log_is_disabled_with_several_workers(tmp_path):
+    log = AnswerLog(make_app(tmp_path / 'answer_log.jsonl', WEB_WORKERS=4), lambda segment_id, rows: None)
+
+    assert not log.enabled
@@ -0,0 +1,41 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from app.tools.docx_writer import _ChunkSink, mistakes_docx, stream_docx, worksheet_body
+
+docx = pytest.importorskip('docx')
+
+CONFIG = {'total_expressions': 5, 'bracket_expressions': 0, 'operators': ['+'], 'min_number': 1, 'max_number': 9}
+EXPRESSIONS = [{'expression_text': f'{i} + 1', 'answer': i + 1} for i in range(5)]
+
+
+def test_worksheet_layout():
+    # 压缩包经由不可 seek 的输出逐块写出，各文件的大小和校验值写在数据描述符中
+    data = b''.join(stream_docx(worksheet_body(CONFIG, EXPRESSIONS), chunk_size=64))
+
+    assert not _ChunkSink().seekable()
+    with zipfile.ZipFile(BytesIO(data)) as package:
+        assert package.testzip() is None
+        assert '[Content_Types].xml' in package.namelist()
+        assert all(info.flag_bits & 0x08 for info in package.infolist())
+    paragraphs = [(p.style.name, p.text) for p in docx.Document(BytesIO(data)).paragraphs]
+    assert paragraphs[0] == ('Title', '口算练习')
+    assert paragraphs[1][1].startswith('练习配置：\n题目数量：5 道\n')
+    assert paragraphs[3:6] == [
+        ('Normal', '1. 0 + 1 = ________\t\t2. 1 + 1 = ________'),
+        ('Normal', '3. 2 + 1 = ________\t\t4. 3 + 1 = ________'),
+        ('Normal', '5. 4 + 1 = ________'),
+    ]
+    assert ('Title', '参考答案') in paragraphs
+    assert paragraphs[-2:] == [('Normal', '1. 1\t\t2. 2\t\t3. 3\t\t4. 4\t\t'), ('Normal', '5. 5\t\t')]
+
+
+def test_mistakes_layout():
+    mistakes = [{'expression': '3 × 4', 'correct_answer': 12, 'user_answer': 11, 'error_count': 2}]
+    document = docx.Document(BytesIO(b''.join(mistakes_docx(mistakes, '2024-01-01'))))
+
+    assert (document.paragraphs[0].style.name, document.paragraphs[0].text) == ('Title', '错题记录')
+    assert any('3 × 4' in p.text for p in document.paragraphs)
+    assert document.styles['Normal'].font.size.pt == 10
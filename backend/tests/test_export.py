@@ -0,0 +1,94 @@
+import csv
+import io
+import os
+import time
+
+from conftest import create_exercise_set
+from test_answer_batch import submit
+
+from app.models import ErrorRecord, UserMistake
+
+
+def add_mistakes(client, user_id, count):
+    _, expressions = create_exercise_set(client, user_id, total=count)
+    submit(client, expressions, wrong=count)
+    return [mistake.error_record_id for mistake in
+            UserMistake.query.order_by(UserMistake.created_at, UserMistake.error_record_id)]
+
+
+def export(client, user_id, **payload):
+    response = client.post(f'/api/error-records/{user_id}/export', json=dict({'type': 'csv'}, **payload))
+    assert response.status_code == 200, response.data
+    rows = list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+    return [row[1] for row in rows[1:]]
+
+
+def exported_ids():
+    return {mistake.error_record_id for mistake in UserMistake.query.filter_by(is_exported=True)}
+
+
+def test_aborted_download_keeps_mistakes_unexported(app, client, user, db):
+    add_mistakes(client, user, 5)
+    app.config['EXPORT_CSV_CHUNK_SIZE'] = 1
+    try:
+        response = client.post(f'/api/error-records/{user}/export', json={'type': 'csv', 'all': True},
+                               buffered=False)
+        next(response.response)
+        response.close()
+    finally:
+        app.config['EXPORT_CSV_CHUNK_SIZE'] = 65536
+
+    assert exported_ids() == set()
+    assert len(export(client, user, all=True)) == 5
+    assert len(exported_ids()) == 5
+    assert ErrorRecord.query.filter_by(is_exported=True).count() == 5
+
+
+def test_export_all_only_contains_mistakes_not_exported_before(client, user, db):
+    mistake_ids = add_mistakes(client, user, 6)
+    first = export(client, user, mistakes=[{'id': mistake_id} for mistake_id in mistake_ids[:2]])
+    rest = export(client, user, all=True)
+
+    assert len(first) == 2
+    assert len(rest) == 4
+    assert exported_ids() == set(mistake_ids)
+    assert export(client, user, all=True) == []
+
+
+def test_async_export_marks_mistakes_when_the_job_completes(client, user, db):
+    add_mistakes(client, user, 3)
+    response = client.post(f'/api/error-records/{user}/export', json={'type': 'xlsx', 'all': True, 'async': True})
+    assert response.status_code == 202
+    assert response.get_json()['total'] == 3
+    status_url = response.get_json()['status_url']
+    for _ in range(100):
+        result = client.get(status_url)
+        if result.status_code != 202:
+            break
+        time.sleep(0.05)
+
+    # 任务完成后直接下载结果文件
+    assert result.status_code == 200, result.get_json()
+    db.session.remove()
+    assert len(exported_ids()) == 3
+
+
+def test_only_seeded_worksheets_are_cached(app, client, db):
+    directory = app.config['EXPORT_CACHE_DIR']
+    config = {'operators': ['+'], 'operator_count': 1, 'min_number': 1, 'max_number': 50,
+              'total_expressions': 20, 'bracket_expressions': 0}
+
+    def export_worksheet(**extra):
+        response = client.post('/api/expressions/export', json={'format': 'csv', 'config': dict(config, **extra)})
+        assert response.status_code == 200, response.data
+        return response.get_data()
+
+    before = set(os.listdir(directory))
+    export_worksheet()
+    export_worksheet()
+    assert set(os.listdir(directory)) == before
+
+    first = export_worksheet(seed=7)
+    assert len(set(os.listdir(directory)) - before) == 1
+    assert export_worksheet(seed=7) == first
+    assert len(set(os.listdir(directory)) - before) == 1
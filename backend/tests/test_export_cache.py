@@ -0,0 +1,45 @@
+import os
+import time
+
+from flask import Flask
+
+from app.tools.export_cache import ExportCache
+
+
+def make_cache(directory):
+    app = Flask(__name__)
+    app.config.update(EXPORT_CACHE_DIR=str(directory), EXPORT_CACHE_STALE_PART_AGE=60)
+    return ExportCache(app)
+
+
+def test_init_app_only_removes_stale_partial_files(tmp_path):
+    (tmp_path / 'stale.part').write_bytes(b'')
+    (tmp_path / 'active.part').write_bytes(b'')
+    old = time.time() - 120
+    os.utime(tmp_path / 'stale.part', (old, old))
+    make_cache(tmp_path)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['active.part']
+
+
+def test_removed_temp_file_is_a_cache_miss(tmp_path):
+    cache = make_cache(tmp_path)
+
+    def chunks():
+        yield b'first'
+        # 其他进程启动时删除了写入中的临时文件
+        for path in tmp_path.glob('*.part'):
+            path.unlink()
+        yield b'second'
+
+    assert b''.join(cache.store('key', chunks())) == b'firstsecond'
+    assert cache.get('key') is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_completed_store_is_served_from_disk(tmp_path):
+    cache = make_cache(tmp_path)
+
+    assert b''.join(cache.store('key', iter([b'data']))) == b'data'
+    with open(cache.get('key'), 'rb') as f:
+        assert f.read() == b'data'
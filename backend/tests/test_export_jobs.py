@@ -0,0 +1,44 @@
+import os
+import time
+
+from flask import Flask
+
+from app.tools.export_jobs import ExportJobs
+
+
+def make_jobs(directory):
+    app = Flask(__name__)
+    app.config.update(EXPORT_JOB_DIR=str(directory), EXPORT_JOB_TTL=60)
+    return ExportJobs(app)
+
+
+def test_init_app_keeps_partial_results_and_starts_no_threads(tmp_path):
+    (tmp_path / 'other.part').write_bytes(b'written by another process')
+    jobs = make_jobs(tmp_path)
+
+    assert jobs.executor is None and jobs.thread is None
+    assert (tmp_path / 'other.part').exists()
+
+
+def test_sweep_only_removes_stale_partial_results(tmp_path):
+    jobs = make_jobs(tmp_path)
+    (tmp_path / 'stale.part').write_bytes(b'')
+    (tmp_path / 'active.part').write_bytes(b'')
+    old = time.time() - 120
+    os.utime(tmp_path / 'stale.part', (old, old))
+    jobs.sweep()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['active.part']
+
+
+def test_first_submit_starts_the_workers(tmp_path):
+    jobs = make_jobs(tmp_path)
+    job = jobs.submit(lambda job: ([b'data'], 'text/plain', 'data.txt'))
+    for _ in range(100):
+        if job.status == 'done':
+            break
+        time.sleep(0.05)
+
+    assert jobs.thread is not None
+    assert job.status == 'done'
+    assert (tmp_path / job.job_id).read_bytes() == b'data'
@@ -0,0 +1,16 @@
+import pytest
+
+from app.tools.query_plans import full_scans, hot_queries, seed
+
+
+@pytest.fixture
+def seeded_user(db):
+    return seed(users=5, sets_per_user=6, expressions_per_set=5)[0]
+
+
+def test_hot_queries_do_not_scan_whole_tables(seeded_user):
+    queries = hot_queries(seeded_user)
+    scans = {name: full_scans(statement) for name, statement in queries}
+
+    assert len(queries) == 17
+    assert {name: steps for name, steps in scans.items() if steps} == {}
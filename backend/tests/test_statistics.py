@@ -0,0 +1,55 @@
+from conftest import create_exercise_set
+from test_answer_batch import submit
+
+
+def practice(client, user_id, total, wrong):
+    """创建练习集、提交答案并完成练习"""
+    set_id, expressions = create_exercise_set(client, user_id, total=total)
+    submit(client, expressions, wrong=wrong)
+    response = client.post(f'/api/exercise-set/{set_id}/complete', json={'user_id': user_id, 'duration': 120})
+    assert response.status_code == 200, response.get_json()
+
+
+def statistics(client, user_id, statements):
+    statements.clear()
+    response = client.get(f'/api/user/{user_id}/statistics')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), len(statements)
+
+
+def test_statement_count_does_not_depend_on_history(client, user, statements):
+    practice(client, user, total=4, wrong=1)
+    small, small_count = statistics(client, user, statements)
+    for _ in range(4):
+        practice(client, user, total=20, wrong=5)
+    large, large_count = statistics(client, user, statements)
+
+    assert small_count == large_count
+    assert large_count <= 3
+    assert small['total_practices'] == 1
+    assert large['total_practices'] == 5
+    assert large['total_time'] == 10
+    assert large['week_trend'][-1]['count'] == 84
+    assert large['average_accuracy'] == round(63 / 84 * 100, 1)
+    assert large['operator_accuracy'] == [{'name': '+', 'value': round(63 / 84 * 100, 1)}]
+    assert sum(sum(counts) for counts in large['time_distribution'].values()) == 84
+
+
+def test_unchanged_statistics_are_served_from_cache(client, user, statements):
+    practice(client, user, total=4, wrong=1)
+    first, _ = statistics(client, user, statements)
+    second, count = statistics(client, user, statements)
+
+    assert second == first
+    assert count == 0
+
+
+def test_expressions_without_features_fall_back_to_their_text(client, user, db):
+    from app.models import Expression, UserAnswerRollup
+    _, expressions = create_exercise_set(client, user, total=4)
+    Expression.query.update({Expression.difficulty: None, Expression.operator_mask: None})
+    db.session.commit()
+    submit(client, expressions, wrong=1)
+
+    rows = UserAnswerRollup.query.all()
+    assert [(row.operators, row.difficulty, row.total_count) for row in rows] == [('+', 'simple', 4)]
@@ -0,0 +1,35 @@
+from flask import Flask
+
+from app.tools.stats_cache import MemoryBackend, StatsCache
+
+
+def test_version_map_is_bounded_and_never_reuses_an_old_version():
+    backend = MemoryBackend(max_entries=10, ttl=60, max_versions=2)
+    issued = {user_id: {backend.version(user_id)} for user_id in ('a', 'b', 'c')}
+    for user_id in ('a', 'b', 'a', 'c', 'b'):
+        before = backend.version(user_id)
+        backend.bump(user_id)
+        after = backend.version(user_id)
+        assert after not in issued[user_id], (user_id, before, after)
+        issued[user_id].add(after)
+
+    assert len(backend.versions) == 2
+    # 被淘汰的用户的版本号不会回到之前签发过的、对应旧数据的值
+    evicted = backend.version('a')
+    assert 'a' not in backend.versions
+    assert evicted == f"{backend.epoch}.{backend.evicted}"
+    assert backend.evicted >= 3
+
+
+def test_memory_cache_is_disabled_with_several_workers():
+    app = Flask(__name__)
+    app.config.update(STATS_CACHE_ENABLED=True, WEB_WORKERS=4)
+    cache = StatsCache(app)
+
+    assert not cache.enabled
+    assert cache.etag('u1', 'window') is None
+
+    app.config['WEB_WORKERS'] = 1
+    cache.init_app(app)
+    assert cache.enabled
+    assert cache.etag('u1', 'window') is not None
@@ -0,0 +1,56 @@
+from sqlalchemy import inspect, text
+
+from conftest import create_exercise_set
+from test_answer_batch import submit
+from test_statistics import practice
+
+from app.models import AnswerRecord, Expression, PracticeRecord, UserAnswerRollup
+from app.tools.schema import add_missing_columns
+from app.tools.stats_rollup import backfill_expression_features, backfill_local_dates, rebuild_rollups, today
+
+
+def drop_columns(db, table, *columns):
+    """把表改回没有这些列的旧结构（先删除用到这些列的索引）"""
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for index in inspector.get_indexes(table):
+            if set(index['column_names']) & set(columns):
+                connection.execute(text(f'DROP INDEX "{index["name"]}"'))
+        for column in columns:
+            connection.execute(text(f'ALTER TABLE "{table}" DROP COLUMN "{column}"'))
+    # 连接池中的其他 SQLite 连接可能仍按旧的表结构检查 ALTER TABLE，模拟升级时使用新的连接
+    db.engine.dispose()
+
+
+def test_expression_features_are_added_and_backfilled(client, user, db):
+    _, expressions = create_exercise_set(client, user, total=4)
+    db.session.remove()
+    drop_columns(db, 'expression', 'difficulty', 'operator_mask', 'digit_count')
+
+    added = add_missing_columns(db)
+    assert added == ['expression.difficulty', 'expression.operator_mask', 'expression.digit_count']
+    assert add_missing_columns(db) == []
+    assert backfill_expression_features() == 4
+    assert {(row.difficulty, row.operator_mask) for row in Expression.query} == {('simple', 1)}
+
+    submit(client, expressions, wrong=1)
+    assert [(row.operators, row.difficulty) for row in UserAnswerRollup.query] == [('+', 'simple')]
+
+
+def test_local_dates_are_added_and_backfilled(client, user, db):
+    practice(client, user, total=4, wrong=1)
+    db.session.remove()
+    drop_columns(db, 'practice_record', 'local_date')
+    drop_columns(db, 'answer_record', 'local_date')
+
+    assert add_missing_columns(db) == ['practice_record.local_date', 'answer_record.local_date']
+    assert backfill_local_dates() == (1, 4)
+    assert {row.local_date for row in PracticeRecord.query} == {today()}
+    assert {row.local_date for row in AnswerRecord.query} == {today()}
+    rebuild_rollups()
+
+    practice(client, user, total=6, wrong=2)
+    statistics = client.get(f'/api/user/{user}/statistics').get_json()
+    assert statistics['total_practices'] == 2
+    assert statistics['week_trend'][-1]['count'] == 10
+    assert statistics['average_accuracy'] == 70.0